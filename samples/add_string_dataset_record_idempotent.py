@@ -15,6 +15,9 @@ from vbase import (
     VBaseStringObject,
 )
 
+from receipt_cache_utils import ReceiptCache, init_cached_indexing_service
+from utils import add_records_idempotent
+
 
 # Name for the test dataset to create.
 DATASET_NAME = "TestDataset"
@@ -25,25 +28,35 @@ RECORD_DATA = "TestRecord"
 # Initialize vBase using environment variables.
 vbc = VBaseClient.create_instance_from_env()
 
+# Cache commitment receipts locally so that reruns are served from local disk.
+receipt_cache = ReceiptCache()
+
 # Create the dataset of strings, if necessary.
 # The constructor will not make a duplicate dataset commitment if one already exists.
 ds = VBaseDataset(vbc, DATASET_NAME, VBaseStringObject)
 
 # Idempotent record addition that will ignore duplicates.
 # You can rerun this section of code without adding duplicate records.
-if any(
-    r["objectCid"] == VBaseStringObject.get_cid_for_data(RECORD_DATA)
-    for r in ds.get_commitment_receipts()
-):
+# The existing commitments are fetched once and indexed by CID,
+# so the same call back-fills many records efficiently.
+# The commitments are fetched from the indexer rather than the receipt cache,
+# which may not yet include a record committed by a recent run.
+l_receipts = add_records_idempotent(ds, [RECORD_DATA])
+if len(l_receipts) == 0:
     print("Record exists.")
 else:
     print("Record does not exist.")
-    receipt = ds.add_record(RECORD_DATA)
-    print(f"add_record() receipt:\n{pprint.pformat(receipt)}")
+    print(f"Commitment receipt:\n{pprint.pformat(l_receipts[0])}")
+    # The cached receipts do not include the new record.
+    receipt_cache.invalidate_set(ds.owner, ds.cid)
+
+# Serve the commitment receipts for reads from the local receipt cache.
+ds = init_cached_indexing_service(ds, receipt_cache)
 
 # Validate the dataset commitments.
 assert ds.verify_commitments()[0]
 
 # Print dataset commitment receipts.
+# These are served from the receipt cache unless a record has just been added.
 receipts = ds.get_commitment_receipts()
 print(f"receipts = {pprint.pformat(receipts)}")
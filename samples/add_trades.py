@@ -10,11 +10,16 @@ import pprint
 import time
 
 from vbase import (
-    VBaseClient,
     VBaseDataset,
     VBaseJsonObject,
 )
 
+from local_commitment_service import (
+    create_vbase_client_from_env,
+    init_local_indexing_service,
+)
+from utils import add_records_in_batches
+
 
 # ## Configuration
 
@@ -22,11 +27,16 @@ from vbase import (
 # Use a test dataset name that is unique and will not collide with other tests.
 STRATEGY_NAME = "strategy_" + datetime.now().strftime("%Y%m%d%H%M%S")
 
+# The number of trades committed per request.
+# Set to 1 to commit each trade in its own request.
+BATCH_SIZE = 10
+
 
 # ## Setup
 
 # Initialize vBase using environment variables.
-vbc = VBaseClient.create_instance_from_env()
+# Set VBASE_COMMITMENT_SERVICE_CLASS to LocalCommitmentService to run offline.
+vbc = create_vbase_client_from_env()
 
 # Create the vBase dataset object.
 ds = VBaseDataset(vbc, STRATEGY_NAME, VBaseJsonObject)
@@ -36,8 +46,6 @@ print(f"Created dataset: {STRATEGY_NAME}")
 # ## Post Trades
 
 trades = []
-receipts = []
-start_time = time.time()
 for i in range(10):
     trade = json.dumps(
         {
@@ -47,12 +55,16 @@ for i in range(10):
         }
     )
     trades.append(trade)
-    receipt = ds.add_record(trade)
+
+# Commit the trades in batches, each in a single request and transaction.
+# Each trade still gets its own receipt and timestamp.
+start_time = time.time()
+receipts = add_records_in_batches(ds, trades, BATCH_SIZE)
+for receipt in receipts:
     print(f"Posted trade: {pprint.pformat(receipt)}")
-    receipts.append(receipt)
 elapsed_time = time.time() - start_time
 print(f"Posting trades took {elapsed_time} seconds.")
-print(f"TPS: {10 / elapsed_time}")
+print(f"TPS: {len(trades) / elapsed_time}")
 
 
 # ## Validate Trades
@@ -68,7 +80,7 @@ print(
     f"Initialize validation strategy dataset using the following data:\n{pprint.pformat(ds_dict)}"
 )
 
-ds_copy = VBaseDataset(vbc, init_dict=ds_dict)
+ds_copy = init_local_indexing_service(VBaseDataset(vbc, init_dict=ds_dict))
 print(f"Copy dataset before timestamp validation:\n{pprint.pformat(ds_copy.to_dict())}")
 
 # Get commitment receipts for the dataset's records.
@@ -9,7 +9,6 @@ and verifies the strategy.
 
 from datetime import datetime
 import json
-import os
 import pprint
 import random
 import subprocess
@@ -20,25 +19,34 @@ from dotenv import load_dotenv
 import matplotlib.pyplot as plt
 
 from vbase import (
-    VBaseClient,
-    ForwarderCommitmentService,
     VBaseDataset,
     VBaseJsonObject,
 )
 
 from aws_utils import (
-    create_s3_client_from_env,
+    S3_MAX_WORKERS,
     create_s3_objects_from_dataset,
     init_vbase_dataset_from_s3_objects,
 )
+from local_commitment_service import (
+    create_vbase_client_from_env,
+    init_local_indexing_service,
+)
+from storage_utils import create_storage_client_from_env
+from utils import add_records_in_batches
 
 
 # ## Configuration
 
 # The sample uses 5 users with strategies and 10 trades per strategy.
+# Use load_test_add_trades.py to measure throughput and latency at scale.
 N_USERS = 5
 N_TRADES = 10
 
+# The number of trades committed per request.
+# Set to 1 to commit each trade in its own request.
+BATCH_SIZE = 10
+
 # Use hardcoded test accounts for the example.
 # Each account is defined by the private key that gives owners control of their data.
 l_accounts = [
@@ -85,12 +93,12 @@ if "ipykernel" not in sys.modules and "IPython" in sys.modules:
 # ## Setup
 
 # Load the information necessary to call vBase APIs.
+# Set VBASE_COMMITMENT_SERVICE_CLASS to LocalCommitmentService to run offline.
 load_dotenv(verbose=True, override=True)
-forwarder_url = os.environ.get("VBASE_FORWARDER_URL")
-api_key = os.environ.get("VBASE_API_KEY")
 
-# Create an AWS client using environment variables.
-boto_client = create_s3_client_from_env()
+# Connect to the object storage, S3 by default.
+# Set STORAGE_BACKEND to run against a local directory or memory.
+boto_client = create_storage_client_from_env()
 
 # Create strategy data.
 # This is the data users will be using to post trades.
@@ -98,13 +106,8 @@ boto_client = create_s3_client_from_env()
 # with each thread using a given strategy dataset.
 l_starts = []
 for i_user in range(N_USERS):
-    vbc = VBaseClient(
-        ForwarderCommitmentService(
-            forwarder_url,
-            api_key,
-            l_accounts[i_user]["pk"],
-        )
-    )
+    # Adapt to forwarder load instead of posting at a fixed concurrency.
+    vbc = create_vbase_client_from_env(l_accounts[i_user]["pk"], adaptive=True)
     strategy_data = {
         "name": (f"user{i_user}_strategy" + datetime.now().strftime("%Y%m%d%H%M%S")),
         "address": l_accounts[i_user]["address"],
@@ -147,7 +150,6 @@ def post_strategy_trades(i_strat):
     :param i_strat: Strategy index
     """
     trades = []
-    receipts = []
     # Create a set of pseudorandom trades with a reproducible seed.
     random.seed(i_strat)
     for i_trade in range(N_TRADES):
@@ -160,10 +162,10 @@ def post_strategy_trades(i_strat):
             }
         )
         trades.append(trade)
-        # Add trade to the vBase dataset object.
-        receipt = l_datasets[i_strat].add_record(trade)
+    # Add the trades to the vBase dataset object in batches.
+    receipts = add_records_in_batches(l_datasets[i_strat], trades, BATCH_SIZE)
+    for receipt in receipts:
         print(f"Posted trade: {pprint.pformat(receipt)}")
-        receipts.append(receipt)
     return trades, receipts
 
 
@@ -178,9 +180,12 @@ print(f"Time elapsed (sec.): {elapsed_time}")
 print(f"Throughput (trades/min.): {N_USERS * N_TRADES / elapsed_time * 60}")
 
 # Save all the posted trades.
+# Objects are written concurrently since upload time dominates large runs.
 for ds in l_datasets:
     print(f"Saving dataset: {ds.name}")
-    create_s3_objects_from_dataset(ds, boto_client, BUCKET_NAME, FOLDER_NAME)
+    create_s3_objects_from_dataset(
+        ds, boto_client, BUCKET_NAME, FOLDER_NAME, max_workers=S3_MAX_WORKERS
+    )
 
 # Display saved data using the shell.
 for ds in l_datasets:
@@ -199,14 +204,16 @@ for ds in l_datasets:
 # Create a strategy dataset to validate.
 # This is done on the consumer/validator machine
 # using data specified by the producer/prover.
-ds_consumer = VBaseDataset(
-    vbc=VBaseClient(ForwarderCommitmentService(forwarder_url, api_key)),
-    init_dict={
-        "name": l_datasets[0].name,
-        "owner": l_datasets[0].owner,
-        "record_type_name": "VBaseJsonObject",
-        "records": [],
-    },
+ds_consumer = init_local_indexing_service(
+    VBaseDataset(
+        vbc=create_vbase_client_from_env(),
+        init_dict={
+            "name": l_datasets[0].name,
+            "owner": l_datasets[0].owner,
+            "record_type_name": "VBaseJsonObject",
+            "records": [],
+        },
+    )
 )
 
 # Load dataset records from the bucket.
@@ -0,0 +1,112 @@
+# # add_trades_signer_pool
+
+"""This sample creates a high-frequency strategy whose trades
+are committed by a pool of signing accounts and verifies the strategy.
+
+A single account commits its records sequentially,
+so the strategy's throughput grows with the number of accounts in the pool.
+The consumer merges the accounts' commitments
+into one ordered, verifiable trade history.
+"""
+
+
+# ## Imports
+
+from datetime import datetime
+import json
+import pprint
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+
+from vbase import VBaseJsonObject
+
+from local_commitment_service import (
+    create_local_indexing_service,
+    create_vbase_client_from_env,
+)
+from signer_pool_utils import SIGNER_POOL_LEAST_LOADED, SignerPoolDataset
+from utils import create_test_private_key
+
+
+# ## Configuration
+
+# The number of signing accounts in the pool.
+N_SIGNERS = 5
+
+# The number of trades to post.
+N_TRADES = 50
+
+# Name for the strategy to create.
+STRATEGY_NAME = "strategy_" + datetime.now().strftime("%Y%m%d%H%M%S")
+
+
+# ## Setup
+
+# Load the information necessary to call vBase APIs.
+# Set VBASE_COMMITMENT_SERVICE_CLASS to LocalCommitmentService to run offline.
+load_dotenv(verbose=True, override=True)
+
+# Create the signer pool for the strategy.
+# Use deterministic test accounts for the example.
+# Each account is delegated to commit the strategy's trades.
+l_vbc = [
+    create_vbase_client_from_env(create_test_private_key(0, i_signer))
+    for i_signer in range(N_SIGNERS)
+]
+ds = SignerPoolDataset(
+    l_vbc, STRATEGY_NAME, VBaseJsonObject, strategy=SIGNER_POOL_LEAST_LOADED
+)
+print(f"Created dataset {ds.name} with signers:\n{pprint.pformat(ds.owners)}")
+
+
+# ## Post Trades
+
+random.seed(1234)
+trades = [
+    json.dumps(
+        {
+            "trade_id": i_trade,
+            "symbol": "ETHUSD",
+            "size": round(random.random() * 2 - 1, 2),
+        }
+    )
+    for i_trade in range(N_TRADES)
+]
+
+start_time = time.time()
+with ThreadPoolExecutor(max_workers=N_SIGNERS) as executor:
+    receipts = list(executor.map(ds.add_record, trades))
+elapsed_time = time.time() - start_time
+print(f"Trades: {N_TRADES}")
+print(f"Time elapsed (sec.): {elapsed_time}")
+print(f"Throughput (trades/min.): {N_TRADES / elapsed_time * 60}")
+
+
+# ## Validate Trades
+
+# Create a copy of the strategy to be validated by the consumer.
+# The consumer receives the records and the pool's signers.
+ds_dict = ds.to_dict()
+ds_dict = {k: ds_dict[k] for k in ["name", "owners", "record_type_name", "records"]}
+vbc_consumer = create_vbase_client_from_env()
+ds_consumer = SignerPoolDataset(
+    [vbc_consumer],
+    init_dict=ds_dict,
+    # Offline runs index the local commitments.
+    indexing_service=create_local_indexing_service(vbc_consumer),
+)
+
+# Merge the signers' commitments into one ordered history.
+success, l_log = ds_consumer.try_restore_timestamps_from_index()
+assert success, l_log
+success, l_log = ds_consumer.verify_commitments()
+assert success, l_log
+assert ds_consumer.timestamps == ds.timestamps
+
+print("num\ttimestamp\tsigner\ttrade")
+for i, record in enumerate(ds_consumer.records):
+    print(
+        f"{i}\t{ds_consumer.timestamps[i]}\t{ds_consumer.record_owners[i]}\t{record.data}"
+    )
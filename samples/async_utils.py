@@ -0,0 +1,302 @@
+"""
+Asyncio pipeline utilities
+
+Commits dataset records and writes them to object storage concurrently
+while preserving the record order within each dataset.
+"""
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Union
+import boto3
+
+from vbase import VBaseDatasetAsync
+
+from aws_utils import S3_MAX_WORKERS, write_s3_object
+from utils import RECORDS_BATCH_SIZE
+
+# The default maximum number of records in flight across all datasets.
+ASYNC_MAX_IN_FLIGHT = 256
+
+
+# pylint: disable-next=too-few-public-methods,too-many-instance-attributes
+class _DatasetLane:
+    """
+    The pending records, the commit task and the record counts for a dataset.
+    """
+
+    def __init__(self, ds: VBaseDatasetAsync, signer_lock: Union[asyncio.Lock, None]):
+        """
+        :param ds: The dataset.
+        :param signer_lock: The lock serializing the commits of the dataset signer,
+            if any.
+        """
+        self.ds = ds
+        self.signer_lock = signer_lock
+        self.queue = asyncio.Queue()
+        self.task = None
+        # The commit error that stopped the lane, if any.
+        self.error = None
+        self.n_records = 0
+        self.n_stored = 0
+        self.n_failed = 0
+        # The error of the first failed record, if any.
+        self.first_error = None
+
+    def get_summary(self) -> dict:
+        """
+        Summarize the records of the lane.
+
+        :return: The dataset name and owner, the numbers of submitted,
+            stored and failed records, and the first error, if any.
+        """
+        return {
+            "name": self.ds.name,
+            "owner": self.ds.owner,
+            "n_records": self.n_records,
+            "n_stored": self.n_stored,
+            "n_failed": self.n_failed,
+            "error": self.first_error,
+        }
+
+
+# pylint: disable-next=too-many-instance-attributes
+class AsyncRecordPipeline:
+    """
+    Commits records and writes them to object storage with many records in flight.
+
+    Records submitted for a dataset are committed in submission order
+    by a single commit task per dataset,
+    so the dataset records, their chain timestamps and their objects
+    keep the order in which the records were generated.
+    While a commit is in flight, newly submitted records queue up
+    and are committed together in the next batch request,
+    so a dataset keeps up to max_batch_size records in each request.
+    Datasets with different signers commit concurrently.
+    Commitment services such as ForwarderCommitmentService
+    keep a single nonce per service object,
+    so by default datasets sharing a signer commit one request at a time.
+    Datasets sharing a signer only commit concurrently
+    if concurrent_signers is True,
+    which requires a commitment service that sequences the signer's nonces,
+    e.g., SequencedForwarderCommitmentService.
+    Objects are written concurrently once their records are committed.
+    Submission blocks once max_in_flight records are pending,
+    which applies backpressure to the record producers.
+    The pipeline keeps only the records in flight and per-dataset counts,
+    so its memory is bounded however many records are submitted.
+    """
+
+    # The pipeline settings are independent knobs.
+    # pylint: disable=too-many-arguments,too-many-positional-arguments
+    def __init__(
+        self,
+        boto_client: boto3.client,
+        bucket_name: str,
+        max_in_flight: int = ASYNC_MAX_IN_FLIGHT,
+        max_batch_size: int = RECORDS_BATCH_SIZE,
+        max_storage_workers: int = S3_MAX_WORKERS,
+        concurrent_signers: bool = False,
+    ):
+        """
+        :param boto_client: The boto3.client object.
+        :param bucket_name: The bucket name.
+        :param max_in_flight: The maximum number of records in flight.
+        :param max_batch_size: The maximum number of records per commit request.
+        :param max_storage_workers: The maximum number of concurrent object writes.
+        :param concurrent_signers: If True, datasets sharing a signer
+            commit concurrently.
+            Set only if the commitment services support concurrent commitments
+            from a signer.
+        """
+        self.boto_client = boto_client
+        self.bucket_name = bucket_name
+        self.max_batch_size = max_batch_size
+        self.concurrent_signers = concurrent_signers
+        # Map signer addresses to the locks serializing their commits.
+        self._signer_locks = {}
+        self._semaphore = asyncio.BoundedSemaphore(max_in_flight)
+        self._storage_executor = ThreadPoolExecutor(max_workers=max_storage_workers)
+        self._lanes = {}
+        self._n_pending = 0
+        self._idle = asyncio.Event()
+        self._idle.set()
+
+    async def submit(
+        self,
+        ds: VBaseDatasetAsync,
+        record_data: any,
+        folder_name: str,
+        file_name: str,
+    ) -> asyncio.Future:
+        """
+        Submit a record to commit and write to object storage.
+        Waits while the maximum number of records is in flight.
+
+        :param ds: The dataset.
+        :param record_data: The record datum.
+        :param folder_name: The folder name within the bucket.
+        :param file_name: The object file name.
+        :return: A future for the commitment receipt,
+            which completes once the object is written.
+        """
+        await self._semaphore.acquire()
+        lane = self._lanes.get(id(ds))
+        if lane is None:
+            signer_lock = None
+            if not self.concurrent_signers:
+                signer_lock = self._signer_locks.setdefault(
+                    ds.owner.lower(), asyncio.Lock()
+                )
+            lane = _DatasetLane(ds, signer_lock)
+            lane.task = asyncio.create_task(self._run_lane(lane))
+            self._lanes[id(ds)] = lane
+        future = asyncio.get_running_loop().create_future()
+        future.add_done_callback(lambda f: self._complete_record(lane, f))
+        lane.n_records += 1
+        self._n_pending += 1
+        self._idle.clear()
+        lane.queue.put_nowait((record_data, folder_name, file_name, future))
+        return future
+
+    def _complete_record(self, lane: _DatasetLane, future: asyncio.Future):
+        """
+        Count a completed record and release its place in flight.
+        The pipeline does not keep the record future.
+
+        :param lane: The dataset lane.
+        :param future: The record future.
+        """
+        self._semaphore.release()
+        # Retrieve the exception, so unawaited failures are not reported as lost.
+        error = asyncio.CancelledError() if future.cancelled() else future.exception()
+        if error is None:
+            lane.n_stored += 1
+        else:
+            lane.n_failed += 1
+            if lane.first_error is None:
+                lane.first_error = error
+        self._n_pending -= 1
+        if self._n_pending == 0:
+            self._idle.set()
+
+    async def _write_object(
+        self, record_data: any, folder_name: str, file_name: str, receipt: dict
+    ) -> dict:
+        """
+        Write a committed record to object storage.
+
+        :param record_data: The record datum.
+        :param folder_name: The folder name within the bucket.
+        :param file_name: The object file name.
+        :param receipt: The commitment receipt.
+        :return: The commitment receipt.
+        """
+        await asyncio.get_running_loop().run_in_executor(
+            self._storage_executor,
+            write_s3_object,
+            self.boto_client,
+            self.bucket_name,
+            folder_name,
+            file_name,
+            record_data,
+        )
+        return receipt
+
+    @staticmethod
+    async def _add_records(
+        ds: VBaseDatasetAsync, l_record_data: List[any]
+    ) -> List[dict]:
+        """
+        Commit records to a dataset in a single request.
+
+        :param ds: The dataset.
+        :param l_record_data: The records' data.
+        :return: The commitment receipts.
+        """
+        if len(l_record_data) == 1:
+            return [await ds.add_record_async(l_record_data[0])]
+        return await ds.add_records_batch_async(l_record_data)
+
+    async def _commit_batch(self, lane: _DatasetLane, batch: List[tuple]):
+        """
+        Commit a batch of records and start writing their objects.
+
+        :param lane: The dataset lane.
+        :param batch: The queued records.
+        """
+        l_record_data = [item[0] for item in batch]
+        try:
+            if lane.signer_lock is None:
+                receipts = await self._add_records(lane.ds, l_record_data)
+            else:
+                async with lane.signer_lock:
+                    receipts = await self._add_records(lane.ds, l_record_data)
+        # Failures are reported through the record futures.
+        # pylint: disable-next=broad-exception-caught
+        except Exception as e:
+            # Later records must not be committed ahead of the failed records,
+            # so the lane stops and fails all its pending records.
+            lane.error = e
+            for _, _, _, future in batch:
+                future.set_exception(e)
+            return
+        for (record_data, folder_name, file_name, future), receipt in zip(
+            batch, receipts
+        ):
+            task = asyncio.create_task(
+                self._write_object(record_data, folder_name, file_name, receipt)
+            )
+            task.add_done_callback(
+                lambda t, f=future: (
+                    f.set_exception(t.exception())
+                    if t.exception() is not None
+                    else f.set_result(t.result())
+                )
+            )
+
+    async def _run_lane(self, lane: _DatasetLane):
+        """
+        Commit queued records for a dataset in order.
+
+        :param lane: The dataset lane.
+        """
+        while True:
+            batch = [await lane.queue.get()]
+            if batch[0] is None:
+                return
+            # Take all records queued while the previous commit was in flight.
+            while len(batch) < self.max_batch_size and not lane.queue.empty():
+                item = lane.queue.get_nowait()
+                if item is None:
+                    # Requeue the sentinel to stop after this batch.
+                    lane.queue.put_nowait(None)
+                    break
+                batch.append(item)
+            if lane.error is not None:
+                for _, _, _, future in batch:
+                    future.set_exception(lane.error)
+                continue
+            await self._commit_batch(lane, batch)
+
+    async def join(self) -> List[dict]:
+        """
+        Wait for all submitted records to be committed and written.
+        The receipts of the records are returned by their submit() futures.
+
+        :return: The summary of each dataset in submission order,
+            see _DatasetLane.get_summary().
+        """
+        for lane in self._lanes.values():
+            lane.queue.put_nowait(None)
+        await asyncio.gather(*[lane.task for lane in self._lanes.values()])
+        await self._idle.wait()
+        results = [lane.get_summary() for lane in self._lanes.values()]
+        self._lanes = {}
+        return results
+
+    def close(self):
+        """
+        Release the storage workers.
+        """
+        self._storage_executor.shutdown(wait=True)
@@ -2,55 +2,613 @@
 AWS utilities
 """
 
-from io import StringIO
+import codecs
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import csv
+import hashlib
+from io import BytesIO, StringIO
 import json
 import os
 import pprint
-from typing import List, Union
+import tempfile
+import threading
+import time
+from typing import IO, Callable, Dict, Iterable, Iterator, List, Tuple, Union
 import boto3
+from boto3.s3.transfer import TransferConfig
+from botocore.config import Config
+from botocore.exceptions import (
+    BotoCoreError,
+    ClientError,
+    ConnectionError as BotoConnectionError,
+    ReadTimeoutError,
+    ResponseStreamingError,
+)
 from dotenv import load_dotenv
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
 
-from vbase import VBaseDataset
+from vbase import VBaseDataset, VBaseJsonObject, VBaseObject, VBaseStringObject
 
+# S3 helpers take the client, bucket and folder in addition to operation options.
+# pylint: disable=too-many-arguments,too-many-positional-arguments
+# The module collects all S3 helpers used by the samples.
+# pylint: disable=too-many-lines
 
-def create_s3_client_from_env() -> boto3.client:
+# Default number of concurrent S3 requests.
+# Must not exceed S3_MAX_POOL_CONNECTIONS,
+# so that concurrent requests do not discard pooled connections.
+S3_MAX_WORKERS = 32
+
+# Default S3 client configuration.
+# The connection pool leaves room for the concurrent part copies
+# of managed transfers running alongside S3_MAX_WORKERS requests.
+S3_MAX_POOL_CONNECTIONS = 64
+S3_RETRY_MODE = "standard"
+S3_CLIENT_MAX_ATTEMPTS = 3
+S3_CONNECT_TIMEOUT = 10
+S3_READ_TIMEOUT = 60
+
+# Default number of retries for transient S3 errors.
+S3_MAX_RETRIES = 5
+
+# Objects at least this large are copied using concurrent multipart copies.
+S3_MULTIPART_COPY_THRESHOLD = 64 * (1 << 20)
+
+# Default chunk size for streaming S3 object reads.
+S3_STREAM_CHUNK_SIZE = 1 << 20
+
+# Default number of rows parsed at a time when inferring long CSV column types.
+S3_STREAM_CHUNK_ROWS = 1 << 16
+
+# Default directory and size limit for the local S3 object cache.
+S3_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "vbase_samples", "s3")
+S3_CACHE_MAX_SIZE_BYTES = 1 << 30
+
+# S3 error codes that signal transient failures that can be retried.
+_S3_TRANSIENT_ERROR_CODES = {
+    "InternalError",
+    "RequestTimeout",
+    "ServiceUnavailable",
+    "SlowDown",
+    "Throttling",
+}
+
+# Process-wide S3 clients keyed by their configuration.
+_s3_clients = {}
+_s3_clients_lock = threading.Lock()
+
+
+class S3ObjectCache:
+    """
+    Local on-disk cache of S3 object data.
+
+    Entries are keyed by bucket, key and ETag.
+    S3 assigns a new ETag whenever an object is overwritten,
+    so a listing or a HeadObject response tells whether a cached entry is fresh
+    without downloading the object.
+    The cache is bounded by size and evicts the least recently used entries.
+    It is safe to share across threads and processes.
+    """
+
+    def __init__(
+        self,
+        cache_dir: str = S3_CACHE_DIR,
+        max_size_bytes: int = S3_CACHE_MAX_SIZE_BYTES,
+    ):
+        """
+        Create the cache object.
+
+        :param cache_dir: The cache directory.
+        :param max_size_bytes: The maximum total size of cached entries.
+        """
+        self.cache_dir = cache_dir
+        self.max_size_bytes = max_size_bytes
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        # Track the total size in memory to avoid scanning the directory on each put.
+        self._size_bytes = sum(size for _, size, _ in self._scan_entries())
+
+    def _scan_entries(self) -> List[tuple]:
+        """
+        List the cache entries.
+
+        :return: The list of (path, size, last used time) tuples.
+        """
+        entries = []
+        with os.scandir(self.cache_dir) as it:
+            for entry in it:
+                if entry.is_file() and not entry.name.startswith("."):
+                    stat = entry.stat()
+                    entries.append((entry.path, stat.st_size, stat.st_mtime))
+        return entries
+
+    def _get_path(self, bucket_name: str, key: str, etag: str) -> str:
+        """
+        Get the cache entry path for an object version.
+
+        :param bucket_name: The bucket name.
+        :param key: The object key.
+        :param etag: The object ETag.
+        :return: The cache entry path.
+        """
+        entry_id = hashlib.sha256(f"{bucket_name}\n{key}\n{etag}".encode("utf-8"))
+        return os.path.join(self.cache_dir, entry_id.hexdigest())
+
+    def get(self, bucket_name: str, key: str, etag: str) -> Union[bytes, None]:
+        """
+        Get cached object data.
+
+        :param bucket_name: The bucket name.
+        :param key: The object key.
+        :param etag: The current object ETag.
+        :return: The object data if a fresh entry is cached; None otherwise.
+        """
+        path = self._get_path(bucket_name, key, etag)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            # Mark the entry as recently used.
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return data
+
+    def put(self, bucket_name: str, key: str, etag: str, data: bytes):
+        """
+        Cache object data.
+
+        :param bucket_name: The bucket name.
+        :param key: The object key.
+        :param etag: The object ETag.
+        :param data: The object data.
+        """
+        if len(data) > self.max_size_bytes:
+            return
+        path = self._get_path(bucket_name, key, etag)
+        # Write to a temporary file and rename it
+        # so that readers never see a partial entry.
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, prefix=".")
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        with self._lock:
+            # Replacing an existing entry only adds the size difference.
+            try:
+                old_size = os.path.getsize(path)
+            except FileNotFoundError:
+                old_size = 0
+            os.replace(tmp_path, path)
+            self._size_bytes += len(data) - old_size
+            if self._size_bytes > self.max_size_bytes:
+                self._evict()
+
+    def _evict(self):
+        """
+        Evict the least recently used entries.
+        Evicts down to 90% of the size limit so that the scan is amortized
+        over many subsequent puts.
+        """
+        entries = sorted(self._scan_entries(), key=lambda entry: entry[2])
+        self._size_bytes = sum(size for _, size, _ in entries)
+        for path, size, _ in entries:
+            if self._size_bytes <= 0.9 * self.max_size_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                # Another process has evicted the entry.
+                pass
+            self._size_bytes -= size
+
+
+def create_s3_client_from_env(
+    max_pool_connections: int = S3_MAX_POOL_CONNECTIONS,
+    retry_mode: str = S3_RETRY_MODE,
+    max_attempts: int = S3_CLIENT_MAX_ATTEMPTS,
+    connect_timeout: float = S3_CONNECT_TIMEOUT,
+    read_timeout: float = S3_READ_TIMEOUT,
+    cached: bool = True,
+) -> boto3.client:
     """
     Create a boto3.client object using the environment variables.
 
+    Clients are cached per process and configuration,
+    so repeated calls reuse the client along with its pooled connections
+    instead of loading the environment and creating a new session each time.
+    boto3 clients are thread-safe, so a cached client can be shared across threads.
+
+    :param max_pool_connections: The maximum number of pooled connections.
+        Should be at least the number of threads sharing the client.
+    :param retry_mode: The botocore retry mode: "legacy", "standard" or "adaptive".
+    :param max_attempts: The maximum number of botocore attempts per request.
+    :param connect_timeout: The connection timeout in seconds.
+    :param read_timeout: The read timeout in seconds.
+    :param cached: If True, the process-wide client for the configuration is returned.
+        If False, a new client is created.
     :return: The boto3.client object.
     """
-    load_dotenv(verbose=True, override=True)
-    # Initialize the AWS session and the S3 client.
-    aws_session = boto3.Session(
-        aws_access_key_id=os.getenv("AWS_ACCESS_KEY_ID"),
-        aws_secret_access_key=os.getenv("AWS_SECRET_ACCESS_KEY"),
+    config_key = (
+        max_pool_connections,
+        retry_mode,
+        max_attempts,
+        connect_timeout,
+        read_timeout,
     )
-    # Create an S3 client
-    boto3_client = aws_session.client("s3")
+    if cached and config_key in _s3_clients:
+        return _s3_clients[config_key]
+    # boto3 sessions are not thread-safe, so create clients under the lock.
+    with _s3_clients_lock:
+        if cached and config_key in _s3_clients:
+            return _s3_clients[config_key]
+        load_dotenv(verbose=True, override=True)
+        # Initialize the AWS session and the S3 client.
+        aws_session = boto3.Session(
+            aws_access_key_id=os.getenv("AWS_ACCESS_KEY_ID"),
+            aws_secret_access_key=os.getenv("AWS_SECRET_ACCESS_KEY"),
+        )
+        # Create an S3 client
+        boto3_client = aws_session.client(
+            "s3",
+            config=Config(
+                max_pool_connections=max_pool_connections,
+                retries={"mode": retry_mode, "total_max_attempts": max_attempts},
+                connect_timeout=connect_timeout,
+                read_timeout=read_timeout,
+            ),
+        )
+        if cached:
+            _s3_clients[config_key] = boto3_client
     return boto3_client
 
 
+def iter_s3_object_pages(
+    boto_client: boto3.client,
+    bucket_name: str,
+    folder_name: str,
+    start_after: Union[str, None] = None,
+    continuation_token: Union[str, None] = None,
+    page_size: int = 1000,
+) -> Iterator[dict]:
+    """
+    Iterate over S3 listing pages.
+
+    Pages are fetched lazily using the list_objects_v2 paginator.
+    Each page is the raw list_objects_v2 response;
+    its "NextContinuationToken" field, if present,
+    can be passed as continuation_token to resume the listing later.
+
+    :param boto_client: The boto3.client object.
+    :param bucket_name: The bucket name.
+    :param folder_name: The folder name within the bucket.
+    :param start_after: The key after which to start listing, if any.
+        S3 ignores start_after when continuation_token is specified.
+    :param continuation_token: The continuation token to resume listing from, if any.
+    :param page_size: The maximum number of objects per page.
+    :return: The iterator over listing pages.
+    """
+    # Ensure the folder names end with a "/".
+    if not folder_name.endswith("/"):
+        folder_name += "/"
+    paginate_args = {"Bucket": bucket_name, "Prefix": folder_name}
+    if start_after is not None:
+        paginate_args["StartAfter"] = start_after
+    pagination_config = {"PageSize": page_size}
+    if continuation_token is not None:
+        pagination_config["StartingToken"] = continuation_token
+    paginator = boto_client.get_paginator("list_objects_v2")
+    yield from paginator.paginate(**paginate_args, PaginationConfig=pagination_config)
+
+
+def iter_s3_objects(
+    boto_client: boto3.client,
+    bucket_name: str,
+    folder_name: str,
+    start_after: Union[str, None] = None,
+    end_before: Union[str, None] = None,
+    continuation_token: Union[str, None] = None,
+    page_size: int = 1000,
+) -> Iterator[dict]:
+    """
+    Iterate over S3 objects.
+
+    Objects are listed lazily one page at a time,
+    so the full listing is never held in memory.
+    S3 lists keys in lexicographic (UTF-8 binary) order,
+    so the key range (start_after, end_before) is filtered
+    without listing keys past end_before.
+
+    :param boto_client: The boto3.client object.
+    :param bucket_name: The bucket name.
+    :param folder_name: The folder name within the bucket.
+    :param start_after: The exclusive lower bound of the key range, if any.
+    :param end_before: The exclusive upper bound of the key range, if any.
+    :param continuation_token: The continuation token to resume listing from, if any.
+    :param page_size: The maximum number of objects per listing page.
+    :return: The iterator over object metadata dictionaries
+        as returned by list_objects_v2, e.g. Key, LastModified, ETag, Size.
+    """
+    for page in iter_s3_object_pages(
+        boto_client,
+        bucket_name,
+        folder_name,
+        start_after=start_after,
+        continuation_token=continuation_token,
+        page_size=page_size,
+    ):
+        # See if any contents were returned for the page.
+        for s3_obj in page.get("Contents", []):
+            if end_before is not None and s3_obj["Key"] >= end_before:
+                return
+            yield s3_obj
+
+
 def get_s3_objects(
     boto_client: boto3.client, bucket_name: str, folder_name: str
 ) -> Union[List[dict], None]:
     """
     Get S3 objects.
 
+    Collects the complete paginated listing.
+    Use iter_s3_objects() to process large folders
+    without holding the listing in memory.
+
     :param boto_client: The boto3.client object.
     :param bucket_name: The bucket name.
     :param folder_name: The folder name within the bucket.
     """
-    # Ensure the folder names end with a "/".
-    if not folder_name.endswith("/"):
-        folder_name += "/"
-    # Note that this assumes small datasets and does not implement paging.
-    s3_objs = boto_client.list_objects_v2(Bucket=bucket_name, Prefix=folder_name)
-    if "Contents" in s3_objs:
-        return s3_objs["Contents"]
+    s3_objs = list(iter_s3_objects(boto_client, bucket_name, folder_name))
+    if len(s3_objs) > 0:
+        return s3_objs
     return None
 
 
+def _is_transient_s3_error(err: Exception) -> bool:
+    """
+    Check whether an S3 error is transient and the request can be retried.
+
+    :param err: The exception raised by the boto3.client call.
+    :return: True if the error is transient; False otherwise.
+    """
+    if isinstance(err, (BotoConnectionError, ReadTimeoutError, ResponseStreamingError)):
+        return True
+    if isinstance(err, ClientError):
+        error_code = err.response.get("Error", {}).get("Code")
+        status_code = err.response.get("ResponseMetadata", {}).get("HTTPStatusCode", 0)
+        return error_code in _S3_TRANSIENT_ERROR_CODES or status_code >= 500
+    return False
+
+
+def _map_ordered(func: Callable, items: Iterable, max_workers: int) -> Iterator[tuple]:
+    """
+    Apply a function to items concurrently and yield the results in item order.
+
+    At most 2 * max_workers items are in flight or buffered at a time,
+    so items can be a lazy iterator over an arbitrarily large listing.
+    Queued items are cancelled if an item fails or the consumer stops early.
+
+    :param func: The function to apply to each item.
+    :param items: The items to process.
+    :param max_workers: The maximum number of concurrent calls.
+    :return: The iterator over (item, result) tuples.
+    """
+    pending = deque()
+    items = iter(items)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        try:
+            while True:
+                # Keep the pipeline full without buffering all the items.
+                while len(pending) < 2 * max_workers:
+                    item = next(items, None)
+                    if item is None:
+                        break
+                    pending.append((item, executor.submit(func, item)))
+                if len(pending) == 0:
+                    return
+                # Yield the oldest result to preserve item order.
+                item, future = pending.popleft()
+                yield item, future.result()
+        finally:
+            for _, future in pending:
+                future.cancel()
+
+
+def _call_s3_with_retry(s3_call: Callable, max_retries: int = S3_MAX_RETRIES):
+    """
+    Call an S3 operation, retrying transient errors.
+
+    :param s3_call: The function making the S3 calls.
+    :param max_retries: The maximum number of retries for transient errors.
+    :return: The value returned by s3_call.
+    """
+    i_attempt = 0
+    while True:
+        try:
+            return s3_call()
+        except (BotoCoreError, ClientError) as err:
+            if i_attempt >= max_retries or not _is_transient_s3_error(err):
+                raise
+            # Back off exponentially before retrying.
+            time.sleep(0.1 * 2**i_attempt)
+            i_attempt += 1
+
+
+def get_s3_object_with_retry(
+    boto_client: boto3.client,
+    bucket_name: str,
+    key: str,
+    max_retries: int = S3_MAX_RETRIES,
+) -> dict:
+    """
+    Get an S3 object and read its body, retrying transient errors.
+
+    :param boto_client: The boto3.client object.
+    :param bucket_name: The bucket name.
+    :param key: The object key.
+    :param max_retries: The maximum number of retries for transient errors.
+    :return: The get_object response with "Body" replaced by the object bytes.
+    """
+
+    def get_object() -> dict:
+        response = boto_client.get_object(Bucket=bucket_name, Key=key)
+        # Read the body within the retry loop since the stream can fail mid-read.
+        response["Body"] = response["Body"].read()
+        return response
+
+    return _call_s3_with_retry(get_object, max_retries)
+
+
+def get_s3_object_cached(
+    boto_client: boto3.client,
+    bucket_name: str,
+    s3_obj: Union[str, dict],
+    cache: Union[S3ObjectCache, None] = None,
+    max_retries: int = S3_MAX_RETRIES,
+) -> dict:
+    """
+    Get an S3 object using the local cache, if any.
+
+    Freshness of the cached entry is checked using the object ETag.
+    The ETag is taken from the listing metadata, if available,
+    or from a HeadObject request otherwise.
+
+    :param boto_client: The boto3.client object.
+    :param bucket_name: The bucket name.
+    :param s3_obj: The object key or the listing metadata dictionary for the object.
+    :param cache: The local object cache, if any.
+    :param max_retries: The maximum number of retries for transient errors.
+    :return: A dictionary with the object "Body" bytes, "ETag" and "LastModified".
+    """
+    if isinstance(s3_obj, str):
+        key = s3_obj
+        if cache is None:
+            return get_s3_object_with_retry(boto_client, bucket_name, key, max_retries)
+        s3_obj = _call_s3_with_retry(
+            lambda: boto_client.head_object(Bucket=bucket_name, Key=key),
+            max_retries,
+        )
+    else:
+        key = s3_obj["Key"]
+    if cache is not None:
+        data = cache.get(bucket_name, key, s3_obj["ETag"])
+        if data is not None:
+            return {
+                "Body": data,
+                "ETag": s3_obj["ETag"],
+                "LastModified": s3_obj["LastModified"],
+            }
+    response = get_s3_object_with_retry(boto_client, bucket_name, key, max_retries)
+    if cache is not None:
+        cache.put(bucket_name, key, response["ETag"], response["Body"])
+    return response
+
+
+def hash_s3_object(
+    boto_client: boto3.client,
+    bucket_name: str,
+    key: str,
+    keep_data: bool = False,
+    chunk_size: int = S3_STREAM_CHUNK_SIZE,
+    max_retries: int = S3_MAX_RETRIES,
+) -> dict:
+    """
+    Compute the CID of a string S3 object as its body is downloaded.
+
+    The CID of a string or JSON record is the SHA3-256 hash
+    of its UTF-8 encoding, which is the object body,
+    so body chunks are hashed as they arrive.
+    The body is also decoded incrementally to validate that it is UTF-8
+    as a record would be decoded.
+    Unless keep_data is True, chunks are discarded once hashed,
+    so memory does not grow with the object size.
+
+    :param boto_client: The boto3.client object.
+    :param bucket_name: The bucket name.
+    :param key: The object key.
+    :param keep_data: If True, the decoded object string is returned.
+    :param chunk_size: The size of the chunks read from S3.
+    :param max_retries: The maximum number of retries for transient errors.
+    :return: A dictionary with the object "CID", "Body" string or None,
+        "ETag" and "LastModified".
+    """
+
+    def hash_object() -> dict:
+        response = boto_client.get_object(Bucket=bucket_name, Key=key)
+        hash_obj = hashlib.sha3_256()
+        decoder = codecs.getincrementaldecoder("utf-8")()
+        l_str_chunks = []
+        # Hash the body within the retry loop since the stream can fail mid-read.
+        for chunk in response["Body"].iter_chunks(chunk_size):
+            hash_obj.update(chunk)
+            str_chunk = decoder.decode(chunk)
+            if keep_data:
+                l_str_chunks.append(str_chunk)
+        str_chunk = decoder.decode(b"", final=True)
+        if keep_data:
+            l_str_chunks.append(str_chunk)
+        return {
+            "CID": "0x" + hash_obj.hexdigest(),
+            "Body": "".join(l_str_chunks) if keep_data else None,
+            "ETag": response["ETag"],
+            "LastModified": response["LastModified"],
+        }
+
+    return _call_s3_with_retry(hash_object, max_retries)
+
+
+def fetch_s3_objects(
+    boto_client: boto3.client,
+    bucket_name: str,
+    s3_objs: Iterable[Union[str, dict]],
+    max_workers: int = S3_MAX_WORKERS,
+    max_retries: int = S3_MAX_RETRIES,
+    progress_interval: Union[int, None] = 1000,
+    cache: Union[S3ObjectCache, None] = None,
+) -> Iterator[dict]:
+    """
+    Download S3 objects concurrently.
+
+    Objects are downloaded using a bounded thread pool
+    and yielded in the order of the keys.
+    At most 2 * max_workers objects are in flight or buffered at a time,
+    so s3_objs can be a lazy iterator over an arbitrarily large listing.
+
+    :param boto_client: The boto3.client object.
+        boto3 clients are thread-safe and are shared by the workers.
+    :param bucket_name: The bucket name.
+    :param s3_objs: The object keys or listing metadata dictionaries to download.
+        Listing metadata allows serving fresh objects from the cache
+        without a HeadObject request.
+    :param max_workers: The maximum number of concurrent downloads.
+    :param max_retries: The maximum number of retries for transient errors.
+    :param progress_interval: The number of objects between progress reports.
+        If None, progress is not reported.
+    :param cache: The local object cache, if any.
+    :return: The iterator over dictionaries
+        with the object "Key", "Body" bytes, "ETag" and "LastModified".
+    """
+    start_time = time.time()
+    n_objs = 0
+    for s3_obj, response in _map_ordered(
+        lambda s3_obj: get_s3_object_cached(
+            boto_client, bucket_name, s3_obj, cache, max_retries
+        ),
+        s3_objs,
+        max_workers,
+    ):
+        response["Key"] = s3_obj if isinstance(s3_obj, str) else s3_obj["Key"]
+        yield response
+        n_objs += 1
+        if progress_interval is not None and n_objs % progress_interval == 0:
+            elapsed_time = time.time() - start_time
+            print(
+                f"Downloaded {n_objs} objects "
+                f"({n_objs / elapsed_time:.1f} objects/sec.)"
+            )
+
+
 def print_s3_objects(boto_client: boto3.client, bucket_name: str, folder_name: str):
     """
     Print S3 objects.
@@ -59,15 +617,61 @@ def print_s3_objects(boto_client: boto3.client, bucket_name: str, folder_name: s
     :param bucket_name: The bucket name.
     :param folder_name: The folder name within the bucket.
     """
-    s3_objs = get_s3_objects(boto_client, bucket_name, folder_name)
-    if s3_objs is None:
+    n_objs = 0
+    for s3_obj in iter_s3_objects(boto_client, bucket_name, folder_name):
+        pprint.pprint(
+            {"object": s3_obj["Key"], "timestamp": str(s3_obj["LastModified"])}
+        )
+        n_objs += 1
+    if n_objs == 0:
         print("No objects")
+
+
+def copy_s3_object(
+    boto_client: boto3.client,
+    source_bucket_name: str,
+    source_key: str,
+    destination_bucket_name: str,
+    destination_key: str,
+    size: int,
+    multipart_threshold: int = S3_MULTIPART_COPY_THRESHOLD,
+    max_retries: int = S3_MAX_RETRIES,
+):
+    """
+    Copy an S3 object server-side.
+
+    Small objects are copied with a single CopyObject request.
+    Large objects are copied with concurrent UploadPartCopy requests.
+
+    :param boto_client: The boto3.client object.
+    :param source_bucket_name: The source bucket name.
+    :param source_key: The source object key.
+    :param destination_bucket_name: The destination bucket name.
+    :param destination_key: The destination object key.
+    :param size: The object size in bytes.
+    :param multipart_threshold: The minimum object size for multipart copies.
+    :param max_retries: The maximum number of retries for transient errors.
+    """
+    copy_source = {"Bucket": source_bucket_name, "Key": source_key}
+    if size < multipart_threshold:
+        _call_s3_with_retry(
+            lambda: boto_client.copy_object(
+                CopySource=copy_source,
+                Bucket=destination_bucket_name,
+                Key=destination_key,
+            ),
+            max_retries,
+        )
     else:
-        pprint.pprint(
-            [
-                {"object": s3_obj["Key"], "timestamp": str(s3_obj["LastModified"])}
-                for s3_obj in s3_objs
-            ]
+        # The managed transfer splits the copy into parts and copies them concurrently.
+        boto_client.copy(
+            copy_source,
+            destination_bucket_name,
+            destination_key,
+            Config=TransferConfig(
+                multipart_threshold=multipart_threshold,
+                multipart_chunksize=multipart_threshold,
+            ),
         )
 
 
@@ -77,15 +681,29 @@ def copy_s3_bucket(
     source_folder_name: str,
     destination_bucket_name: str,
     destination_folder_name: str,
-):
+    max_workers: int = 1,
+    start_after: Union[str, None] = None,
+    multipart_threshold: int = S3_MULTIPART_COPY_THRESHOLD,
+) -> dict:
     """
     Copy an S3 bucket.
 
+    By default, objects are copied one at a time and each copy is printed.
+    If max_workers is greater than 1, objects are copied concurrently
+    using server-side copies and only a throughput summary is printed.
+    If a copy fails, the key to resume from is printed
+    and can be passed as start_after to continue the copy.
+
     :param boto_client: The boto3.client object.
     :param source_bucket_name: The source bucket name.
     :param source_folder_name: The folder name within the source bucket.
     :param destination_bucket_name: The destination bucket name.
     :param destination_folder_name: The folder name within the destination bucket.
+    :param max_workers: The maximum number of concurrent copies.
+    :param start_after: The source key after which to start copying, if any.
+    :param multipart_threshold: The minimum object size for multipart copies.
+    :return: The copy summary with the number of objects and bytes copied,
+        the elapsed time, and the last source key copied.
     """
     # Ensure the folder names end with a "/".
     if not source_folder_name.endswith("/"):
@@ -93,30 +711,65 @@ def copy_s3_bucket(
     if not destination_folder_name.endswith("/"):
         destination_folder_name += "/"
 
-    # Let exceptions propagate to the caller.
-    # Create a paginator to handle pagination.
-    paginator = boto_client.get_paginator("list_objects_v2")
-    for page in paginator.paginate(
-        Bucket=source_bucket_name, Prefix=source_folder_name
-    ):
-        # See if any contents were returned for the page.
-        if "Contents" in page:
-            for obj in page["Contents"]:
-                # Adjust the destination key to include the destination folder
-                destination_key = obj["Key"].replace(
-                    source_folder_name, destination_folder_name, 1
-                )
-                copy_source = {"Bucket": source_bucket_name, "Key": obj["Key"]}
-                # Copy the object to the new destination key in the destination bucket.
-                boto_client.copy(copy_source, destination_bucket_name, destination_key)
-                print(
-                    f"Copied {obj['Key']} from {source_bucket_name} to "
-                    f"{destination_bucket_name}/{destination_key}"
-                )
+    def copy_worker(obj: dict):
+        # Adjust the destination key to include the destination folder
+        destination_key = obj["Key"].replace(
+            source_folder_name, destination_folder_name, 1
+        )
+        # Copy the object to the new destination key in the destination bucket.
+        copy_s3_object(
+            boto_client,
+            source_bucket_name,
+            obj["Key"],
+            destination_bucket_name,
+            destination_key,
+            obj["Size"],
+            multipart_threshold,
+        )
+        if max_workers == 1:
+            print(
+                f"Copied {obj['Key']} from {source_bucket_name} to "
+                f"{destination_bucket_name}/{destination_key}"
+            )
+
+    summary = {"n_objects": 0, "n_bytes": 0, "elapsed_time": 0.0, "last_key": None}
+    start_time = time.time()
+    # Objects complete in listing order,
+    # so all keys up to last_key have been copied.
+    s3_objs = iter_s3_objects(
+        boto_client, source_bucket_name, source_folder_name, start_after=start_after
+    )
+    try:
+        for obj, _ in _map_ordered(copy_worker, s3_objs, max_workers):
+            summary["n_objects"] += 1
+            summary["n_bytes"] += obj["Size"]
+            summary["last_key"] = obj["Key"]
+    except Exception:
+        print(f"Copy failed. Resume the copy with start_after = {summary['last_key']}")
+        raise
+    summary["elapsed_time"] = time.time() - start_time
+
+    elapsed_time = max(summary["elapsed_time"], 1e-9)
+    print(
+        f"Copied {summary['n_objects']} objects "
+        f"({summary['n_bytes'] / (1 << 20):.1f} MiB) "
+        f"in {summary['elapsed_time']:.1f} sec.: "
+        f"{summary['n_objects'] / elapsed_time:.1f} objects/sec., "
+        f"{summary['n_bytes'] / (1 << 20) / elapsed_time:.1f} MiB/sec."
+    )
+    return summary
 
 
 def init_vbase_dataset_from_s3_objects(
-    ds: VBaseDataset, boto_client: boto3.client, bucket_name: str, folder_name: str
+    ds: VBaseDataset,
+    boto_client: boto3.client,
+    bucket_name: str,
+    folder_name: str,
+    max_workers: int = S3_MAX_WORKERS,
+    progress_interval: Union[int, None] = 1000,
+    cache: Union[S3ObjectCache, None] = None,
+    bundled: bool = False,
+    record_keys: Union[List[str], None] = None,
 ) -> VBaseDataset:
     """
     Get S3 objects and add them to a dataset.
@@ -125,23 +778,117 @@ def init_vbase_dataset_from_s3_objects(
     :param boto_client: The boto3.client object.
     :param bucket_name: The bucket name.
     :param folder_name: The folder name within the bucket.
+    :param max_workers: The maximum number of concurrent downloads.
+    :param progress_interval: The number of objects between progress reports.
+        If None, progress is not reported.
+    :param cache: The local object cache, if any.
+        Only new or changed objects are downloaded if a cache is specified.
+    :param bundled: If True, each object holds a JSON list of records
+        as written by create_s3_objects_from_dataset(bundle_size=...).
+        All records in a bundle get the object timestamp.
+    :param record_keys: The list to which the key of the object holding each record
+        is appended, if any.
+        The keys come from the same listing as the records,
+        so they identify the records, e.g., for verify_dataset_with_checkpoint().
     """
     # Get all the objects to add to the dataset.
-    # Note that this assumes small datasets and does not implement paging.
-    s3_objs = get_s3_objects(boto_client, bucket_name, folder_name)
-    if s3_objs is None:
+    # The listing is paged lazily, so only the records are held in memory.
+    records = []
+    l_last_modified = []
+    l_keys = []
+    for response in fetch_s3_objects(
+        boto_client,
+        bucket_name,
+        iter_s3_objects(boto_client, bucket_name, folder_name),
+        max_workers=max_workers,
+        progress_interval=progress_interval,
+        cache=cache,
+    ):
+        str_data = response["Body"].decode("utf-8")
+        if bundled:
+            # Serialize each record as it would be serialized in its own object.
+            l_str_data = [json.dumps(record) for record in json.loads(str_data)]
+        else:
+            l_str_data = [str_data]
+        for str_data in l_str_data:
+            records.append(ds.record_type(str_data))
+            l_last_modified.append(response["LastModified"])
+            l_keys.append(response["Key"])
+    if record_keys is not None:
+        record_keys.extend(l_keys)
+    if len(records) == 0:
         print("No objects")
         return ds
-    # Append object data and records to the dataset.
-    ds.records = []
-    ds.timestamps = []
-    for s3_obj in s3_objs:
-        response = boto_client.get_object(Bucket=bucket_name, Key=s3_obj["Key"])
-        str_data = response["Body"].read().decode("utf-8")
-        ds.records.append(ds.record_type(str_data))
-        ds.timestamps.append(
-            str(pd.Timestamp(response["LastModified"]).tz_convert("UTC"))
+    # Replace the dataset records and timestamps.
+    # Convert the timestamps in one vectorized call.
+    ds.records = records
+    ds.timestamps = [str(t) for t in pd.to_datetime(l_last_modified, utc=True)]
+    return ds
+
+
+def init_vbase_dataset_from_s3_objects_streaming(
+    ds: VBaseDataset,
+    boto_client: boto3.client,
+    bucket_name: str,
+    folder_name: str,
+    keep_data: bool = False,
+    max_workers: int = S3_MAX_WORKERS,
+    progress_interval: Union[int, None] = 1000,
+) -> VBaseDataset:
+    """
+    Get S3 objects and add them to a dataset,
+    computing record CIDs from the S3 byte streams.
+
+    Record CIDs are computed as the objects are downloaded using hash_s3_object().
+    Unless keep_data is True, the records are verify-only:
+    their data is None and their CIDs are preset,
+    so memory is near-constant per object regardless of the object size.
+    Verify-only records support commitment verification and timestamp restoration,
+    but not data access, e.g., get_pd_data_frame().
+    Only string and JSON datasets are supported.
+
+    :param ds: The vBaseDataset object to initialize.
+    :param boto_client: The boto3.client object.
+    :param bucket_name: The bucket name.
+    :param folder_name: The folder name within the bucket.
+    :param keep_data: If True, the records keep their data.
+    :param max_workers: The maximum number of concurrent downloads.
+    :param progress_interval: The number of objects between progress reports.
+        If None, progress is not reported.
+    """
+    if not issubclass(ds.record_type, (VBaseStringObject, VBaseJsonObject)):
+        raise ValueError(
+            "CIDs cannot be computed from S3 byte streams "
+            f"for {ds.record_type.__name__} records."
         )
+    records = []
+    l_last_modified = []
+    start_time = time.time()
+    for _, response in _map_ordered(
+        lambda s3_obj: hash_s3_object(
+            boto_client, bucket_name, s3_obj["Key"], keep_data=keep_data
+        ),
+        iter_s3_objects(boto_client, bucket_name, folder_name),
+        max_workers,
+    ):
+        # Records cannot be created without data, so clear the data after creation.
+        record = ds.record_type(response["Body"] if keep_data else "")
+        record.data = response["Body"]
+        record.cid = response["CID"]
+        records.append(record)
+        l_last_modified.append(response["LastModified"])
+        if progress_interval is not None and len(records) % progress_interval == 0:
+            elapsed_time = time.time() - start_time
+            print(
+                f"Hashed {len(records)} objects "
+                f"({len(records) / elapsed_time:.1f} objects/sec.)"
+            )
+    if len(records) == 0:
+        print("No objects")
+        return ds
+    # Replace the dataset records and timestamps.
+    ds.records = records
+    ds.timestamps = [str(t) for t in pd.to_datetime(l_last_modified, utc=True)]
     return ds
 
 
@@ -175,33 +922,347 @@ def init_vbase_dataset_from_long_csv(ds: VBaseDataset, csv_long: str) -> VBaseDa
     """
     df_ds = pd.read_csv(StringIO(csv_long))
 
-    # Extract the unique timestamps from the first column.
-    timestamps = df_ds.iloc[:, 0].unique()
-
-    # Iterate over the timestamps and add the records to the dataset.
-    for timestamp in timestamps:
-        df_record = df_ds[df_ds.iloc[:, 0] == timestamp]
-        # Drop the timestamp column.
-        df_record = df_record.iloc[:, 1:]
+    # Split the rows by the timestamp in the first column in a single pass.
+    # Groups are ordered by the first appearance of their timestamp,
+    # and rows keep their order within a group,
+    # so the records are identical to filtering the rows for each timestamp.
+    # The timestamp column is dropped from the records.
+    l_timestamps = []
+    for timestamp, df_record in df_ds.iloc[:, 1:].groupby(df_ds.iloc[:, 0], sort=False):
         # Convert the record to a CSV string.
         csv_record = df_record.to_csv(index=False)
         # Append the record to the dataset.
         ds.records.append(ds.record_type(csv_record))
-        ds.timestamps.append(str(pd.Timestamp(timestamp).tz_convert("UTC")))
+        l_timestamps.append(timestamp)
+
+    # Convert the timestamps in one vectorized call.
+    # Parse each timestamp as ISO 8601 rather than inferring a single format
+    # from the first one, since the precision may vary, e.g., with fractional seconds.
+    ds.timestamps += [
+        str(t) for t in pd.to_datetime(l_timestamps, utc=True, format="ISO8601")
+    ]
+    return ds
+
+
+def iter_lines(chunks: Iterable[bytes]) -> Iterator[str]:
+    """
+    Split a stream of UTF-8 byte chunks into lines.
+    Lines keep their line endings, so quoted CSV fields spanning lines
+    can be parsed by the csv module.
+
+    :param chunks: The byte chunks.
+    :return: The iterator over lines.
+    """
+    pending = b""
+    for chunk in chunks:
+        lines = (pending + chunk).split(b"\n")
+        # The last piece is an incomplete line or an empty string.
+        pending = lines.pop()
+        for line in lines:
+            # A newline never occurs within a multibyte UTF-8 sequence,
+            # so each line can be decoded separately.
+            yield (line + b"\n").decode("utf-8")
+    if pending:
+        yield pending.decode("utf-8")
+
+
+def infer_long_csv_dtypes(
+    csv_file: Union[str, IO], chunk_rows: int = S3_STREAM_CHUNK_ROWS
+) -> Dict[str, object]:
+    """
+    Infer the column types of a long format CSV without loading it into memory.
+
+    The long CSV is parsed in chunks of rows and the chunk types are merged:
+    numeric columns are widened, e.g., from integer to float,
+    and columns with other mixed types are read as strings.
+    These are the types pandas infers when parsing the whole long CSV
+    in init_vbase_dataset_from_long_csv(),
+    except for columns that pandas itself parses with mixed types
+    and reports with a DtypeWarning.
+
+    :param csv_file: The long CSV path or file-like object.
+    :param chunk_rows: The number of rows parsed at a time.
+    :return: The column types keyed by column name.
+    """
+    dtypes = {}
+    for df_chunk in pd.read_csv(csv_file, chunksize=chunk_rows):
+        for column, dtype in df_chunk.dtypes.items():
+            prev_dtype = dtypes.get(column)
+            if prev_dtype is None or prev_dtype == dtype:
+                dtypes[column] = dtype
+            elif prev_dtype.kind in "iuf" and dtype.kind in "iuf":
+                # The parser infers 64-bit numbers,
+                # so mixed numeric chunks widen to float as in a single parse.
+                dtypes[column] = np.dtype("float64")
+            else:
+                dtypes[column] = np.dtype(object)
+    return dtypes
+
+
+def _create_long_csv_record(
+    header: List[str], rows: List[List[str]], dtypes: Dict[str, object]
+) -> str:
+    """
+    Create a record CSV string from the rows of a long CSV for one timestamp.
+
+    :param header: The long CSV header without the timestamp column.
+    :param rows: The long CSV rows without the timestamp column.
+    :param dtypes: The long CSV column types.
+    :return: The record CSV string.
+    """
+    csv_rows = StringIO()
+    writer = csv.writer(csv_rows)
+    writer.writerow(header)
+    writer.writerows(rows)
+    # Parse the rows with the column types of the whole long CSV
+    # rather than types guessed from this record alone,
+    # so that values are formatted as init_vbase_dataset_from_long_csv() formats them,
+    # e.g., integer weights as floats and numeric-looking symbols as strings.
+    return pd.read_csv(
+        StringIO(csv_rows.getvalue()),
+        dtype={column: dtypes[column] for column in header if column in dtypes},
+    ).to_csv(index=False)
+
+
+def iter_long_csv_records(
+    lines: Iterable[str], dtypes: Dict[str, object]
+) -> Iterator[Tuple[str, str]]:
+    """
+    Split a long format CSV into records lazily.
+
+    The long CSV is parsed one line at a time
+    and a record is emitted at each timestamp boundary,
+    so memory is bounded by the largest single record
+    rather than the whole history.
+    Rows for a timestamp must be contiguous,
+    as written by the producer samples.
+    See init_vbase_dataset_from_long_csv() for the long CSV format.
+
+    :param lines: The long CSV lines.
+    :param dtypes: The long CSV column types from infer_long_csv_dtypes().
+    :return: The iterator over (timestamp, CSV record string) tuples
+        with timestamps normalized to UTC.
+    """
+    reader = csv.reader(lines)
+    header = next(reader, None)
+    if header is None:
+        return
+    timestamp = None
+    rows = []
+    for row in reader:
+        # Skip blank lines.
+        if len(row) == 0:
+            continue
+        if row[0] != timestamp and len(rows) > 0:
+            yield (
+                str(pd.Timestamp(timestamp).tz_convert("UTC")),
+                _create_long_csv_record(header[1:], rows, dtypes),
+            )
+            rows = []
+        timestamp = row[0]
+        rows.append(row[1:])
+    if len(rows) > 0:
+        yield (
+            str(pd.Timestamp(timestamp).tz_convert("UTC")),
+            _create_long_csv_record(header[1:], rows, dtypes),
+        )
+
+
+def init_vbase_dataset_from_s3_long_csv(
+    ds: VBaseDataset,
+    boto_client: boto3.client,
+    bucket_name: str,
+    folder_name: str,
+    file_name: str,
+    on_record: Union[Callable[[VBaseObject, str], None], None] = None,
+    chunk_size: int = S3_STREAM_CHUNK_SIZE,
+) -> VBaseDataset:
+    """
+    Initialize a dataset by streaming a long format CSV object from S3.
+
+    The object is read in chunks and split into records at timestamp boundaries,
+    so the long CSV is never held in memory.
+    The object is read twice: first to infer the column types of the whole history,
+    then to parse the records with these types,
+    so that the records are identical to those built by
+    init_vbase_dataset_from_long_csv() and hash to the same CIDs.
+    If on_record is specified, records are passed to it one at a time
+    instead of being added to the dataset,
+    which bounds memory by the largest single record.
+    See init_vbase_dataset_from_long_csv() for the long CSV format.
+
+    :param ds: The vBaseDataset object to initialize.
+    :param boto_client: The boto3.client object.
+    :param bucket_name: The bucket name.
+    :param folder_name: The folder name within the bucket.
+    :param file_name: The long CSV object name.
+    :param on_record: The function called with each record and its timestamp, if any.
+        For example, a verifier that checks each record commitment.
+    :param chunk_size: The size of the chunks read from S3.
+    :return: The dataset.
+    """
+    if not folder_name.endswith("/"):
+        folder_name += "/"
+    key = folder_name + file_name
+    response = boto_client.get_object(Bucket=bucket_name, Key=key)
+    dtypes = infer_long_csv_dtypes(response["Body"])
+    etag = response["ETag"]
+    response = boto_client.get_object(Bucket=bucket_name, Key=key)
+    if response["ETag"] != etag:
+        raise ValueError(f"Object {key} changed while it was being read.")
+    lines = iter_lines(response["Body"].iter_chunks(chunk_size))
+    for timestamp, csv_record in iter_long_csv_records(lines, dtypes):
+        record = ds.record_type(csv_record)
+        if on_record is None:
+            ds.records.append(record)
+            ds.timestamps.append(timestamp)
+        else:
+            on_record(record, timestamp)
+    return ds
+
+
+def convert_long_csv_to_parquet(csv_long: str) -> bytes:
+    """
+    Convert a long format CSV string to a long format Parquet file.
+
+    Parquet stores the long history in a compact columnar layout
+    that is much faster to parse than text CSV:
+    - String columns, such as symbols, are dictionary-encoded.
+    - The timestamp column is stored as a UTC timestamp.
+    - Each timestamp is stored as a separate row group
+      in the order of the first appearance of the timestamp,
+      so records can be read one row group at a time.
+    Column types are those inferred when parsing the long CSV,
+    so records rebuilt from the Parquet file by init_vbase_dataset_from_long_parquet()
+    are identical to those built from the CSV by init_vbase_dataset_from_long_csv()
+    and hash to the same CIDs.
+
+    :param csv_long: The long CSV string.
+    :return: The long Parquet file bytes.
+    """
+    df_ds = pd.read_csv(StringIO(csv_long))
+    # Parse the timestamps as ISO 8601, as init_vbase_dataset_from_long_csv() does,
+    # since their precision may vary.
+    df_ds[df_ds.columns[0]] = pd.to_datetime(
+        df_ds.iloc[:, 0], utc=True, format="ISO8601"
+    )
+
+    # Build the schema from the full history so that all row groups share it.
+    fields = []
+    for field in pa.Schema.from_pandas(df_ds, preserve_index=False):
+        if pa.types.is_string(field.type) or pa.types.is_large_string(field.type):
+            field = field.with_type(pa.dictionary(pa.int32(), pa.string()))
+        elif pa.types.is_timestamp(field.type):
+            field = field.with_type(pa.timestamp("ns", tz="UTC"))
+        fields.append(field)
+    schema = pa.schema(fields)
+
+    sink = BytesIO()
+    with pq.ParquetWriter(sink, schema) as writer:
+        for _, df_record in df_ds.groupby(df_ds.iloc[:, 0], sort=False):
+            table = pa.Table.from_pandas(df_record, schema=schema, preserve_index=False)
+            # Write each timestamp as a single row group.
+            writer.write_table(table, row_group_size=len(df_record))
+    return sink.getvalue()
+
+
+def iter_long_parquet_records(
+    parquet_long: bytes, batch_rows: int = 1 << 20
+) -> Iterator[Tuple[str, str]]:
+    """
+    Split a long format Parquet file into records lazily.
+
+    The file is read in batches of whole row groups, and thus whole timestamps,
+    so memory is bounded by the batch size or the largest single record.
+    See convert_long_csv_to_parquet() for the long Parquet format.
+
+    :param parquet_long: The long Parquet file bytes.
+    :param batch_rows: The approximate number of rows to read at a time.
+        Reading several row groups at a time amortizes the conversion overhead.
+    :return: The iterator over (timestamp, CSV record string) tuples
+        with timestamps normalized to UTC.
+    """
+    parquet_file = pq.ParquetFile(BytesIO(parquet_long))
+    # Decode dictionary-encoded columns
+    # so that the record columns have the types inferred when parsing CSV.
+    schema = pa.schema(
+        [
+            (
+                field.with_type(field.type.value_type)
+                if pa.types.is_dictionary(field.type)
+                else field
+            )
+            for field in parquet_file.schema_arrow
+        ]
+    )
+    l_row_group_rows = [
+        parquet_file.metadata.row_group(i).num_rows
+        for i in range(parquet_file.num_row_groups)
+    ]
+    i_row_group = 0
+    while i_row_group < len(l_row_group_rows):
+        # Select the row groups for the next batch.
+        l_batch = [i_row_group]
+        n_rows = l_row_group_rows[i_row_group]
+        while l_batch[-1] + 1 < len(l_row_group_rows) and n_rows < batch_rows:
+            l_batch.append(l_batch[-1] + 1)
+            n_rows += l_row_group_rows[l_batch[-1]]
+        i_row_group = l_batch[-1] + 1
+
+        df_batch = parquet_file.read_row_groups(l_batch).cast(schema).to_pandas()
+        # Split the batch into records at the row group boundaries.
+        i_row = 0
+        for i in l_batch:
+            df_record = df_batch.iloc[i_row : i_row + l_row_group_rows[i]]
+            i_row += l_row_group_rows[i]
+            yield (
+                str(df_record.iloc[0, 0].tz_convert("UTC")),
+                df_record.iloc[:, 1:].to_csv(index=False),
+            )
+
+
+def init_vbase_dataset_from_long_parquet(
+    ds: VBaseDataset, parquet_long: bytes
+) -> VBaseDataset:
+    """
+    Initialize a dataset using a long format Parquet file.
+    See convert_long_csv_to_parquet() for the long Parquet format.
+
+    :param ds: The vBaseDataset object to initialize.
+    :param parquet_long: The long Parquet file bytes.
+    :return: The dataset.
+    """
+    for timestamp, csv_record in iter_long_parquet_records(parquet_long):
+        ds.records.append(ds.record_type(csv_record))
+        ds.timestamps.append(timestamp)
     return ds
 
 
 def create_s3_objects_from_dataset(
-    ds: VBaseDataset, boto_client: boto3.client, bucket_name: str, folder_name: str
-) -> dict:
+    ds: VBaseDataset,
+    boto_client: boto3.client,
+    bucket_name: str,
+    folder_name: str,
+    max_workers: int = 1,
+    bundle_size: Union[int, None] = None,
+) -> List[dict]:
     """
     Create S3 objects for dataset records.
 
+    By default, each record is written to its own object.
+    In bundle mode, every bundle_size consecutive records are written
+    to a single object holding a JSON list of records,
+    which amortizes the per-request overhead for small records.
+    Bundles can be loaded using init_vbase_dataset_from_s3_objects(bundled=True).
+
     :param ds: The vBaseDataset object.
     :param boto_client: The boto3.client object.
     :param bucket_name: The bucket name.
     :param folder_name: The folder name within the bucket.
-    :return: The operation receipts.
+    :param max_workers: The maximum number of concurrent writes.
+        If greater than 1, a summary is printed instead of each object name.
+    :param bundle_size: The number of records per object, if any.
+    :return: The operation receipts, one per object, in record order.
     """
     if not folder_name.endswith("/"):
         folder_name += "/"
@@ -209,17 +1270,44 @@ def create_s3_objects_from_dataset(
     if not folder_name.endswith(f"{ds.name}/"):
         folder_name += f"{ds.name}/"
 
+    # Build the objects lazily to avoid serializing all records upfront.
+    if bundle_size is None:
+        s3_objs = (
+            (f"{folder_name}obj_{i}.json", [record])
+            for i, record in enumerate(ds.records)
+        )
+    else:
+        s3_objs = (
+            (f"{folder_name}bundle_{i}.json", ds.records[j : j + bundle_size])
+            for i, j in enumerate(range(0, len(ds.records), bundle_size))
+        )
+
+    def put_worker(s3_obj: tuple) -> dict:
+        s3_obj_name, records = s3_obj
+        if bundle_size is None:
+            body = json.dumps(records[0].get_dict())
+        else:
+            body = json.dumps([record.get_dict() for record in records])
+        return _call_s3_with_retry(
+            lambda: boto_client.put_object(
+                Bucket=bucket_name, Key=s3_obj_name, Body=body
+            )
+        )
+
     # Loop over the dataset records,
     # creating S3 objects for them.
+    start_time = time.time()
     l_s3_receipts = []
-    for i, record in enumerate(ds.records):
-        record_json = json.dumps(record.get_dict())
-        s3_obj_name = f"{folder_name}obj_{i}.json"
-        s3_receipt = boto_client.put_object(
-            Bucket=bucket_name, Key=s3_obj_name, Body=record_json
-        )
-        print(f"Created S3 object: {s3_obj_name}")
+    for (s3_obj_name, _), s3_receipt in _map_ordered(put_worker, s3_objs, max_workers):
+        if max_workers == 1:
+            print(f"Created S3 object: {s3_obj_name}")
         l_s3_receipts.append(s3_receipt)
+    if max_workers > 1:
+        print(
+            f"Created {len(l_s3_receipts)} S3 objects "
+            f"for {len(ds.records)} records "
+            f"in {time.time() - start_time:.1f} sec."
+        )
     return l_s3_receipts
 
 
@@ -228,7 +1316,7 @@ def write_s3_object(
     bucket_name: str,
     folder_name: str,
     file_name: str,
-    data: str,
+    data: Union[str, bytes],
 ) -> dict:
     """
     Write an object to S3.
@@ -252,7 +1340,11 @@ def write_s3_object(
 
 
 def read_s3_object(
-    boto_client: boto3.client, bucket_name: str, folder_name: str, file_name: str
+    boto_client: boto3.client,
+    bucket_name: str,
+    folder_name: str,
+    file_name: str,
+    cache: Union[S3ObjectCache, None] = None,
 ) -> str:
     """
     Read an object to S3.
@@ -261,6 +1353,8 @@ def read_s3_object(
     :param boto_client: The boto3.client object.
     :param bucket_name: The bucket name.
     :param folder_name: The folder name within the bucket.
+    :param cache: The local object cache, if any.
+        If specified, the object is downloaded only if it has changed.
     :return: the object string.
     """
     if not folder_name.endswith("/"):
@@ -269,8 +1363,31 @@ def read_s3_object(
     if not folder_name.endswith("/"):
         folder_name += "/"
 
-    s3_obj_name = folder_name + file_name
+    return read_s3_object_bytes(
+        boto_client, bucket_name, folder_name, file_name, cache
+    ).decode("utf-8")
 
-    response = boto_client.get_object(Bucket=bucket_name, Key=s3_obj_name)
-    str_data = response["Body"].read().decode("utf-8")
-    return str_data
+
+def read_s3_object_bytes(
+    boto_client: boto3.client,
+    bucket_name: str,
+    folder_name: str,
+    file_name: str,
+    cache: Union[S3ObjectCache, None] = None,
+) -> bytes:
+    """
+    Read a binary object, such as a Parquet file, from S3.
+
+    :param boto_client: The boto3.client object.
+    :param bucket_name: The bucket name.
+    :param folder_name: The folder name within the bucket.
+    :param file_name: The object name.
+    :param cache: The local object cache, if any.
+        If specified, the object is downloaded only if it has changed.
+    :return: the object bytes.
+    """
+    if not folder_name.endswith("/"):
+        folder_name += "/"
+    s3_obj_name = folder_name + file_name
+    response = get_s3_object_cached(boto_client, bucket_name, s3_obj_name, cache)
+    return response["Body"]
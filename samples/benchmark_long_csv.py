@@ -0,0 +1,217 @@
+# # benchmark_long_csv
+
+"""This sample benchmarks loading long portfolio history CSVs into datasets.
+
+The benchmark compares init_vbase_dataset_from_long_csv()
+with the reference implementation that filters the rows for each timestamp
+and with init_vbase_dataset_from_long_parquet(),
+verifies that all produce identical records,
+and prints the scaling curve as the number of time periods grows.
+The benchmark runs locally and does not require vBase or AWS access.
+"""
+
+
+# ## Imports
+
+from io import StringIO
+import random
+import time
+import pandas as pd
+
+from vbase import VBaseDataset
+
+from aws_utils import (
+    convert_long_csv_to_parquet,
+    infer_long_csv_dtypes,
+    init_vbase_dataset_from_long_csv,
+    init_vbase_dataset_from_long_parquet,
+    iter_long_csv_records,
+)
+
+
+# ## Configuration
+
+# The number of symbols in each portfolio.
+N_SYMS = 500
+
+# The numbers of time periods to benchmark.
+L_N_PERIODS = [10, 50, 100, 250, 500, 1000, 2500]
+
+# The reference implementation is quadratic,
+# so only run it for histories up to this number of periods.
+MAX_REFERENCE_PERIODS = 500
+
+
+# ## Setup
+
+
+def create_dataset() -> VBaseDataset:
+    """
+    Create an empty portfolio dataset.
+    The dataset is only loaded locally, so no vBase client is needed.
+
+    :return: The dataset object.
+    """
+    return VBaseDataset(
+        None,
+        init_dict={
+            "name": "benchmark_strategy",
+            "owner": "0xA401F59d7190E4448Eb60691E3bc78f1Ef03e88C",
+            "record_type_name": "VBaseStringObject",
+            "records": [],
+        },
+    )
+
+
+def create_long_csv(n_periods: int) -> str:
+    """
+    Create a random long portfolio history CSV.
+
+    :param n_periods: The number of time periods.
+    :return: The long CSV string.
+    """
+    random.seed(1234)
+    timestamps = pd.date_range("2014-01-01 20:00:00", periods=n_periods, tz="UTC")
+    syms = [f"SYM{i}" for i in range(N_SYMS)]
+    df_long = pd.DataFrame(
+        {
+            "t": [str(t) for t in timestamps for _ in syms],
+            "sym": syms * n_periods,
+            "wt": [
+                round(random.random() * 2 - 1, 4) for _ in range(n_periods * N_SYMS)
+            ],
+        }
+    )
+    return df_long.to_csv(index=False)
+
+
+def init_vbase_dataset_from_long_csv_reference(
+    ds: VBaseDataset, csv_long: str
+) -> VBaseDataset:
+    """
+    Reference implementation that filters the rows for each timestamp.
+    Its runtime is proportional to the number of rows times the number of periods.
+
+    :param ds: The vBaseDataset object to initialize.
+    :param csv_long: The long CSV string.
+    """
+    df_ds = pd.read_csv(StringIO(csv_long))
+    for timestamp in df_ds.iloc[:, 0].unique():
+        df_record = df_ds[df_ds.iloc[:, 0] == timestamp].iloc[:, 1:]
+        ds.records.append(ds.record_type(df_record.to_csv(index=False)))
+        ds.timestamps.append(str(pd.Timestamp(timestamp).tz_convert("UTC")))
+    return ds
+
+
+# ## Edge Cases
+
+# Timestamps with and without fractional seconds.
+CSV_LONG_MIXED_PRECISION = """t,sym,wt
+2024-06-18 14:52:16+00:00,SPY,0.93
+2024-06-18 14:52:16+00:00,TSLA,-0.12
+2024-06-18 14:52:26.123456+00:00,SPY,-0.63
+2024-06-18 14:52:26.123456+00:00,TSLA,-0.77
+"""
+
+# Integer and float weights, and symbols that look like numbers.
+# Records that only hold integer weights or numeric symbols
+# must be formatted with the types of the whole history.
+CSV_LONG_MIXED_TYPES = """t,sym,wt
+2024-06-18 14:52:16+00:00,007,1
+2024-06-18 14:52:16+00:00,SPY,2
+2024-06-18 14:52:26+00:00,007,1.5
+2024-06-18 14:52:26+00:00,009,2
+"""
+
+
+def check_long_csv_loaders(csv_long: str):
+    """
+    Check that the long CSV loaders produce records identical to the reference.
+    The records must be identical for their CIDs to match the commitments.
+
+    :param csv_long: The long CSV string.
+    """
+    ds_reference = init_vbase_dataset_from_long_csv_reference(
+        create_dataset(), csv_long
+    )
+    ds_groupby = init_vbase_dataset_from_long_csv(create_dataset(), csv_long)
+    assert [r.data for r in ds_groupby.records] == [
+        r.data for r in ds_reference.records
+    ]
+    assert ds_groupby.timestamps == ds_reference.timestamps
+
+    # Stream the long CSV with small chunks so that the types are merged.
+    dtypes = infer_long_csv_dtypes(StringIO(csv_long), chunk_rows=1)
+    l_streamed = list(iter_long_csv_records(StringIO(csv_long), dtypes))
+    assert [csv_record for _, csv_record in l_streamed] == [
+        r.data for r in ds_reference.records
+    ]
+    assert [timestamp for timestamp, _ in l_streamed] == ds_reference.timestamps
+
+    ds_parquet = init_vbase_dataset_from_long_parquet(
+        create_dataset(), convert_long_csv_to_parquet(csv_long)
+    )
+    assert [r.data for r in ds_parquet.records] == [
+        r.data for r in ds_reference.records
+    ]
+    assert ds_parquet.timestamps == ds_reference.timestamps
+
+
+# ## Benchmark
+
+
+def benchmark_long_csv_loaders(n_periods: int) -> str:
+    """
+    Benchmark the long CSV loaders for a random portfolio history.
+
+    :param n_periods: The number of time periods.
+    :return: The tab-separated benchmark row.
+    """
+    csv_long = create_long_csv(n_periods)
+
+    start_time = time.time()
+    ds = init_vbase_dataset_from_long_csv(create_dataset(), csv_long)
+    elapsed_time = time.time() - start_time
+    assert len(ds.records) == n_periods
+
+    parquet_long = convert_long_csv_to_parquet(csv_long)
+    start_time = time.time()
+    ds_parquet = init_vbase_dataset_from_long_parquet(create_dataset(), parquet_long)
+    elapsed_time_parquet = time.time() - start_time
+    assert [r.data for r in ds.records] == [r.data for r in ds_parquet.records]
+    assert ds.timestamps == ds_parquet.timestamps
+
+    reference_sec = "-"
+    if n_periods <= MAX_REFERENCE_PERIODS:
+        start_time = time.time()
+        ds_reference = init_vbase_dataset_from_long_csv_reference(
+            create_dataset(), csv_long
+        )
+        reference_sec = f"{time.time() - start_time:.3f}"
+        # The records must be identical for their CIDs to match the commitments.
+        assert [r.data for r in ds.records] == [r.data for r in ds_reference.records]
+        assert ds.timestamps == ds_reference.timestamps
+
+    return (
+        f"{n_periods}\t{n_periods * N_SYMS}\t{reference_sec}\t{elapsed_time:.3f}"
+        f"\t{elapsed_time_parquet:.3f}\t{len(csv_long)}\t{len(parquet_long)}"
+    )
+
+
+def main():
+    """
+    Check the loaders on the edge cases and print the scaling curve.
+    """
+    check_long_csv_loaders(CSV_LONG_MIXED_PRECISION)
+    check_long_csv_loaders(CSV_LONG_MIXED_TYPES)
+
+    print(
+        "periods\trows\treference_sec\tgroupby_sec\tparquet_sec"
+        "\tcsv_bytes\tparquet_bytes"
+    )
+    for n_periods in L_N_PERIODS:
+        print(benchmark_long_csv_loaders(n_periods))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,566 @@
+"""
+Commitment service utilities
+
+Extensions of the forwarder commitment service for high-throughput posting.
+"""
+
+import copy
+import random
+import threading
+import time
+import weakref
+from typing import List, Tuple, Union
+import requests
+
+from vbase import ForwarderCommitmentService, VBaseDataset
+from vbase.core.forwarder_commitment_service import RequestType
+from vbase.utils.crypto_utils import add_int_uint256
+
+# The default maximum number of in-flight commitments per signer.
+SIGNER_MAX_IN_FLIGHT = 8
+
+# The default number of times a request rejected after an earlier failure
+# is re-sequenced with a new nonce.
+SIGNER_MAX_RESEQUENCE_RETRIES = 2
+
+# The default sustained forwarder request rate per API key in requests per second
+# and the burst size.
+FORWARDER_RATE_LIMIT = 20.0
+FORWARDER_RATE_BURST = 20
+
+# The initial and maximum forwarder concurrency per API key.
+FORWARDER_INITIAL_CONCURRENCY = 4
+FORWARDER_MAX_CONCURRENCY = 64
+
+# The ratio of latency to the baseline latency that signals forwarder overload.
+FORWARDER_LATENCY_TOLERANCE = 2.0
+
+# The forwarder retry settings.
+FORWARDER_MAX_RETRIES = 5
+FORWARDER_BASE_BACKOFF_SEC = 0.5
+FORWARDER_MAX_BACKOFF_SEC = 30.0
+
+
+class _SignerSequencer:
+    """
+    Allocates forwarder nonces for a signer shared by all threads in the process.
+
+    Nonces are allocated locally from the last nonce reported by the forwarder.
+    A failed request may leave a gap that invalidates all later nonces,
+    so the first failure starts a new epoch:
+    the sequencer waits for the in-flight requests to complete,
+    reloads the nonce from the forwarder and continues from it.
+    """
+
+    def __init__(self, max_in_flight: int):
+        """
+        :param max_in_flight: The maximum number of in-flight requests.
+        """
+        self.max_in_flight = max_in_flight
+        self.signature_data = None
+        self.epoch = 0
+        self._cond = threading.Condition()
+        self._next_nonce = None
+        self._next_dispatch_nonce = None
+        self._n_in_flight = 0
+
+    def allocate(self, service: ForwarderCommitmentService) -> tuple:
+        """
+        Allocate the next nonce, reloading the nonce after failures.
+
+        :param service: The service used to load signature data.
+        :return: A tuple of the nonce, the epoch and a copy of the signature data.
+        """
+        with self._cond:
+            while self._n_in_flight >= self.max_in_flight or (
+                self.signature_data is None and self._n_in_flight > 0
+            ):
+                self._cond.wait()
+            if self.signature_data is None:
+                signature_data = service.load_signature_data()
+                self._next_nonce = signature_data["nonce"]
+                self._next_dispatch_nonce = self._next_nonce
+                self.signature_data = signature_data
+            nonce = self._next_nonce
+            self._next_nonce += 1
+            self._n_in_flight += 1
+            return nonce, self.epoch, copy.deepcopy(self.signature_data)
+
+    def wait_for_turn(self, nonce: int, epoch: int):
+        """
+        Wait for the requests with lower nonces to be sent,
+        so the forwarder receives requests in nonce order.
+        Each allocated nonce is either dispatched or fails,
+        and a failure starts a new epoch that releases the waiting requests,
+        so a request never waits on a lower nonce that will not be sent.
+
+        :param nonce: The request nonce.
+        :param epoch: The request epoch.
+        """
+        with self._cond:
+            self._cond.wait_for(
+                lambda: epoch != self.epoch or self._next_dispatch_nonce >= nonce
+            )
+
+    def mark_dispatched(self, nonce: int, epoch: int):
+        """
+        Record that a request is being sent.
+
+        :param nonce: The request nonce.
+        :param epoch: The request epoch.
+        """
+        with self._cond:
+            if epoch == self.epoch:
+                self._next_dispatch_nonce = max(self._next_dispatch_nonce, nonce + 1)
+            self._cond.notify_all()
+
+    def complete(self):
+        """
+        Record a successful request.
+        """
+        with self._cond:
+            self._n_in_flight -= 1
+            self._cond.notify_all()
+
+    def fail(self, epoch: int):
+        """
+        Record a failed request and start a new epoch
+        unless an earlier failure already ended the request epoch.
+
+        :param epoch: The request epoch.
+        """
+        with self._cond:
+            self._n_in_flight -= 1
+            if epoch == self.epoch:
+                self.epoch += 1
+                self.signature_data = None
+            self._cond.notify_all()
+
+
+def _get_status_code(e: Exception) -> Union[int, None]:
+    """
+    Get the HTTP status code of a failed request.
+
+    :param e: The request exception.
+    :return: The status code or None if the request got no response.
+    """
+    response = getattr(e, "response", None)
+    return None if response is None else response.status_code
+
+
+# Sequencers by (forwarder URL, signer address).
+_signer_sequencers = {}
+_signer_sequencers_lock = threading.Lock()
+
+
+class SequencedForwarderCommitmentService(ForwarderCommitmentService):
+    """
+    A forwarder commitment service that posts concurrently from a single signer.
+
+    ForwarderCommitmentService tracks its nonce in the object,
+    so concurrent commitments from a signer reuse nonces and fail.
+    This service allocates nonces from a sequencer shared by all services
+    for the signer in the process,
+    so up to max_in_flight commitments are in flight for the signer.
+    Requests are sent in nonce order.
+    Requests the forwarder rejects with a client error,
+    e.g., because an earlier failure left a nonce gap
+    or because they reached the forwarder out of order,
+    are re-sequenced with new nonces and retried.
+    Other failures, including server errors, are not retried,
+    since those requests may have been executed
+    and resending them with new nonces could commit the records twice.
+    """
+
+    # The forwarder arguments are passed through.
+    # pylint: disable=too-many-arguments,too-many-positional-arguments
+    def __init__(
+        self,
+        forwarder_url: str,
+        api_key: str,
+        private_key: Union[str, None] = None,
+        max_in_flight: int = SIGNER_MAX_IN_FLIGHT,
+        max_resequence_retries: int = SIGNER_MAX_RESEQUENCE_RETRIES,
+    ):
+        """
+        :param forwarder_url: The forwarder URL.
+        :param api_key: The API key used to authenticate to the forwarder.
+        :param private_key: User's private key.
+        :param max_in_flight: The maximum number of in-flight commitments
+            for the signer. The first service created for a signer sets the limit.
+        :param max_resequence_retries: The maximum number of times a commitment
+            rejected after an earlier failure is retried.
+        """
+        # The per-request nonce and signature data are thread-local,
+        # so the base class methods can be called from several threads.
+        self._local = threading.local()
+        super().__init__(forwarder_url, api_key, private_key)
+        self.max_resequence_retries = max_resequence_retries
+        with _signer_sequencers_lock:
+            key = (forwarder_url, self.get_default_user().lower())
+            if key not in _signer_sequencers:
+                _signer_sequencers[key] = _SignerSequencer(max_in_flight)
+            self._sequencer = _signer_sequencers[key]
+
+    @property
+    def _nonce(self) -> Union[int, None]:
+        return getattr(self._local, "nonce", None)
+
+    @_nonce.setter
+    def _nonce(self, nonce: Union[int, None]):
+        self._local.nonce = nonce
+
+    @property
+    def _signature_data(self) -> Union[dict, None]:
+        signature_data = getattr(self._local, "signature_data", None)
+        if signature_data is None and hasattr(self, "_sequencer"):
+            # Threads that have not posted use the signer's signature data.
+            signature_data = self._sequencer.signature_data
+        return signature_data
+
+    @_signature_data.setter
+    def _signature_data(self, signature_data: Union[dict, None]):
+        self._local.signature_data = signature_data
+
+    def load_signature_data(self) -> dict:
+        """
+        Load the signer's signature data and next nonce from the forwarder.
+
+        :return: The signature data.
+        """
+        signature_data = self._call_forwarder_api("signature-data")
+        if not isinstance(signature_data, dict):
+            raise ValueError("Unexpected signature_data")
+        if "domain" not in signature_data:
+            raise ValueError("Missing domain field of signature_data")
+        if "chainId" not in signature_data["domain"]:
+            raise ValueError('Missing chainId field of signature_data["domain"]')
+        return signature_data
+
+    def _call_forwarder_api(
+        self,
+        api: str,
+        request_type: RequestType = RequestType.GET,
+        params: Union[dict, None] = None,
+        data: Union[dict, None] = None,
+    ) -> Union[dict, str, None]:
+        if api == "execute":
+            self._sequencer.wait_for_turn(self._nonce, self._local.epoch)
+            self._sequencer.mark_dispatched(self._nonce, self._local.epoch)
+        return super()._call_forwarder_api(api, request_type, params, data)
+
+    def _post_execute(self, fn_name: str, args: []):
+        for i_attempt in range(self.max_resequence_retries + 1):
+            nonce, epoch, signature_data = self._sequencer.allocate(self)
+            self._nonce = nonce
+            self._signature_data = signature_data
+            self._local.epoch = epoch
+            try:
+                receipt = super()._post_execute(fn_name, args)
+            except requests.HTTPError as e:
+                # Retry requests rejected because of an earlier failure's nonce gap
+                # or because they reached the forwarder out of order.
+                # A server error does not prove that the request was not executed,
+                # so it is not retried even if an earlier failure ended its epoch.
+                self._sequencer.fail(epoch)
+                status_code = _get_status_code(e)
+                is_rejected = status_code is not None and 400 <= status_code < 500
+                if is_rejected and i_attempt < self.max_resequence_retries:
+                    continue
+                raise
+            except Exception:
+                self._sequencer.fail(epoch)
+                raise
+            self._sequencer.complete()
+            return receipt
+        # The loop either returns or raises.
+        raise AssertionError("Unreachable")
+
+
+# pylint: disable-next=too-few-public-methods
+class TokenBucket:
+    """
+    A thread-safe token bucket that limits the request rate.
+    """
+
+    def __init__(self, rate: float, burst: int):
+        """
+        :param rate: The sustained rate in tokens per second.
+        :param burst: The maximum number of tokens available at once.
+        """
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._last_time = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """
+        Take a token, waiting until one is available.
+        """
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(
+                    self.burst, self._tokens + (now - self._last_time) * self.rate
+                )
+                self._last_time = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait_sec = (1 - self._tokens) / self.rate
+            time.sleep(wait_sec)
+
+
+# The limiter keeps its settings and adaptive state.
+# pylint: disable-next=too-many-instance-attributes
+class AdaptiveConcurrencyLimiter:
+    """
+    A thread-safe concurrency limit adjusted by additive increase
+    and multiplicative decrease (AIMD).
+
+    Each successful request that is not slow grows the limit
+    by about one request per limit's worth of completions.
+    A rejection, server error or slow request halves the limit,
+    at most once per latency window, so a burst of failures
+    from one overload episode shrinks the limit once.
+    A request is slow if its latency exceeds the tolerance times
+    the lowest recent latency for its API.
+    """
+
+    # The limiter settings are independent knobs.
+    # pylint: disable=too-many-arguments,too-many-positional-arguments
+    def __init__(
+        self,
+        initial_limit: int = FORWARDER_INITIAL_CONCURRENCY,
+        min_limit: int = 1,
+        max_limit: int = FORWARDER_MAX_CONCURRENCY,
+        latency_tolerance: float = FORWARDER_LATENCY_TOLERANCE,
+        decrease_factor: float = 0.5,
+    ):
+        """
+        :param initial_limit: The initial concurrency limit.
+        :param min_limit: The minimum concurrency limit.
+        :param max_limit: The maximum concurrency limit.
+        :param latency_tolerance: The latency over the baseline latency
+            that signals overload.
+        :param decrease_factor: The factor applied to the limit on overload.
+        """
+        self.limit = float(initial_limit)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.latency_tolerance = latency_tolerance
+        self.decrease_factor = decrease_factor
+        self._n_in_flight = 0
+        self._baseline_latencies = {}
+        self._last_decrease_time = 0.0
+        self._cond = threading.Condition()
+
+    def acquire(self):
+        """
+        Wait for a request slot.
+        """
+        with self._cond:
+            while self._n_in_flight >= int(self.limit):
+                self._cond.wait()
+            self._n_in_flight += 1
+
+    def release(self, api: str, latency: Union[float, None], is_overloaded: bool):
+        """
+        Release a request slot and adjust the limit.
+
+        :param api: The API called, which has its own baseline latency.
+        :param latency: The latency of a successful request in seconds
+            or None if the request failed.
+        :param is_overloaded: True if the server rejected the request
+            for load or failed with a server error.
+        """
+        with self._cond:
+            self._n_in_flight -= 1
+            now = time.monotonic()
+            if latency is not None:
+                baseline = self._baseline_latencies.get(api, latency)
+                # Let the baseline drift up slowly so it tracks changing conditions.
+                baseline = min(latency, baseline * 1.01)
+                self._baseline_latencies[api] = baseline
+                is_overloaded = latency > baseline * self.latency_tolerance
+            if is_overloaded:
+                # Decrease once per latency window.
+                window = max(self._baseline_latencies.values(), default=0.0)
+                if now - self._last_decrease_time > window:
+                    self.limit = max(self.min_limit, self.limit * self.decrease_factor)
+                    self._last_decrease_time = now
+            elif latency is not None:
+                self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+            self._cond.notify_all()
+
+
+# Rate controls by forwarder API key, shared by all services using the key.
+_api_key_rate_controls = {}
+_api_key_rate_controls_lock = threading.Lock()
+
+
+def _get_api_key_rate_controls(
+    api_key: str, rate: float, burst: int
+) -> Tuple[TokenBucket, AdaptiveConcurrencyLimiter]:
+    """
+    Get the token bucket and concurrency limiter for an API key.
+    The first caller for a key sets the rate and burst.
+
+    :param api_key: The forwarder API key.
+    :param rate: The sustained request rate in requests per second.
+    :param burst: The request burst size.
+    :return: A tuple of the token bucket and the concurrency limiter.
+    """
+    with _api_key_rate_controls_lock:
+        if api_key not in _api_key_rate_controls:
+            _api_key_rate_controls[api_key] = (
+                TokenBucket(rate, burst),
+                AdaptiveConcurrencyLimiter(),
+            )
+        return _api_key_rate_controls[api_key]
+
+
+class AdaptiveForwarderCommitmentService(SequencedForwarderCommitmentService):
+    """
+    A sequenced forwarder commitment service that adapts to forwarder load.
+
+    All services using an API key in the process share a token bucket,
+    which caps the key's request rate,
+    and an adaptive concurrency limiter,
+    which backs off when the forwarder slows down or rejects requests.
+    Throttled and unavailable responses (429 and 503) are retried
+    after exponential backoff with full jitter.
+    Other server and transport errors are retried only for read requests,
+    since a failed commitment may have been executed.
+    """
+
+    # The forwarder arguments are passed through.
+    # pylint: disable=too-many-arguments,too-many-positional-arguments
+    def __init__(
+        self,
+        forwarder_url: str,
+        api_key: str,
+        private_key: Union[str, None] = None,
+        max_in_flight: int = SIGNER_MAX_IN_FLIGHT,
+        rate: float = FORWARDER_RATE_LIMIT,
+        burst: int = FORWARDER_RATE_BURST,
+        max_retries: int = FORWARDER_MAX_RETRIES,
+    ):
+        """
+        :param forwarder_url: The forwarder URL.
+        :param api_key: The API key used to authenticate to the forwarder.
+        :param private_key: User's private key.
+        :param max_in_flight: The maximum number of in-flight commitments
+            for the signer.
+        :param rate: The sustained request rate for the API key
+            in requests per second.
+        :param burst: The request burst size for the API key.
+        :param max_retries: The maximum number of retries per request.
+        """
+        super().__init__(forwarder_url, api_key, private_key, max_in_flight)
+        self.max_retries = max_retries
+        self._token_bucket, self._limiter = _get_api_key_rate_controls(
+            api_key, rate, burst
+        )
+
+    def _call_forwarder_api(
+        self,
+        api: str,
+        request_type: RequestType = RequestType.GET,
+        params: Union[dict, None] = None,
+        data: Union[dict, None] = None,
+    ) -> Union[dict, str, None]:
+        if api == "execute":
+            # Requests take rate and concurrency slots in nonce order:
+            # a request waits until the lower nonces have taken their slots
+            # however long the rate limit holds them up,
+            # so a request waiting for a slot never overtakes a lower nonce.
+            self._sequencer.wait_for_turn(self._nonce, self._local.epoch)
+        for i_attempt in range(self.max_retries + 1):
+            self._token_bucket.acquire()
+            self._limiter.acquire()
+            if api == "execute" and i_attempt == 0:
+                self._sequencer.mark_dispatched(self._nonce, self._local.epoch)
+            start_time = time.monotonic()
+            try:
+                # pylint: disable-next=bad-super-call
+                response_data = super(
+                    SequencedForwarderCommitmentService, self
+                )._call_forwarder_api(api, request_type, params, data)
+            except requests.RequestException as e:
+                status_code = _get_status_code(e)
+                self._limiter.release(
+                    api,
+                    None,
+                    status_code is None or status_code == 429 or status_code >= 500,
+                )
+                is_retryable = status_code in (429, 503) or (
+                    request_type == RequestType.GET
+                    and (status_code is None or status_code >= 500)
+                )
+                if not is_retryable or i_attempt == self.max_retries:
+                    raise
+                time.sleep(
+                    random.uniform(
+                        0,
+                        min(
+                            FORWARDER_MAX_BACKOFF_SEC,
+                            FORWARDER_BASE_BACKOFF_SEC * 2**i_attempt,
+                        ),
+                    )
+                )
+                continue
+            self._limiter.release(api, time.monotonic() - start_time, False)
+            return response_data
+        # The loop either returns or raises.
+        raise AssertionError("Unreachable")
+
+
+# Locks for datasets updated from several threads.
+_dataset_locks = weakref.WeakKeyDictionary()
+_dataset_locks_lock = threading.Lock()
+
+
+def _get_dataset_lock(ds: VBaseDataset) -> threading.Lock:
+    """
+    Get the lock for updating a dataset.
+
+    :param ds: The vBaseDataset object.
+    :return: The lock.
+    """
+    with _dataset_locks_lock:
+        if ds not in _dataset_locks:
+            _dataset_locks[ds] = threading.Lock()
+        return _dataset_locks[ds]
+
+
+def add_records_concurrently(ds: VBaseDataset, l_record_data: List[any]) -> List[dict]:
+    """
+    Add records to a dataset from one of several threads.
+
+    VBaseDataset.add_record() updates the dataset without locking,
+    so threads sharing a dataset must not call it concurrently.
+    This function commits the records without holding a lock,
+    so commitments from several threads are in flight together,
+    and then adds the committed records to the dataset under a lock.
+    Records committed by different threads are added in completion order;
+    restoring timestamps from the index orders them by commitment time.
+
+    :param ds: The vBaseDataset object.
+    :param l_record_data: The list of records' data.
+    :return: The commitment receipts for the records.
+    """
+    records = [ds.record_type(record_data) for record_data in l_record_data]
+    object_cids = [record.get_cid() for record in records]
+    if len(records) == 1:
+        receipts = [ds.vbc.add_set_object(ds.cid, object_cids[0])]
+    else:
+        receipts = ds.vbc.add_set_objects_batch(ds.cid, object_cids)
+    with _get_dataset_lock(ds):
+        # Replicate VBaseDataset.add_record() bookkeeping.
+        for record, object_cid, receipt in zip(records, object_cids, receipts):
+            ds.object_cid_sum = add_int_uint256(ds.object_cid_sum, object_cid)
+            ds.records.append(record)
+            ds.timestamps.append(str(receipt["timestamp"]))
+    return receipts
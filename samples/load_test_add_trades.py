@@ -0,0 +1,367 @@
+# # load_test_add_trades
+
+"""This sample is a load generator for posting trade records.
+
+It generalizes add_trades_parallel to a configurable number of users and trades
+and posts trades either open-loop at a target rate
+or closed-loop with a fixed number of requests in flight.
+After an optional warmup, it measures add_record() latency percentiles
+and sustained throughput and prints the report as JSON.
+
+Example:
+    python load_test_add_trades.py --users 20 --trades-per-user 100 --concurrency 20
+
+Set VBASE_COMMITMENT_SERVICE_CLASS to LocalCommitmentService
+to measure the client without network access.
+"""
+
+
+# ## Imports
+
+import argparse
+from datetime import datetime
+import json
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Union
+from dotenv import load_dotenv
+import pandas as pd
+
+from vbase import (
+    VBaseDataset,
+    VBaseJsonObject,
+)
+
+from commitment_utils import add_records_concurrently
+from local_commitment_service import create_vbase_client_from_env
+from utils import create_test_private_key
+
+
+# ## Configuration
+
+# The default number of users, each with a strategy dataset.
+N_USERS = 5
+
+# The default number of trades per user.
+N_TRADES = 10
+
+# The default trade record size in bytes.
+PAYLOAD_SIZE = 64
+
+# The maximum number of requests in flight for open-loop runs.
+MAX_OPEN_LOOP_CONCURRENCY = 256
+
+# The reported latency percentiles.
+L_PERCENTILES = [50, 90, 99]
+
+
+# ## Setup
+
+
+def parse_args(argv: Union[List[str], None] = None) -> argparse.Namespace:
+    """
+    Parse the command line arguments.
+
+    :param argv: The arguments. Defaults to sys.argv.
+    :return: The parsed arguments.
+    """
+    parser = argparse.ArgumentParser(description=__doc__.split("\n", 1)[0])
+    parser.add_argument(
+        "--users", type=int, default=N_USERS, help="number of users and datasets"
+    )
+    parser.add_argument(
+        "--trades-per-user",
+        type=int,
+        default=N_TRADES,
+        help="trades to post per user; 0 posts until the duration elapses",
+    )
+    parser.add_argument(
+        "--rate",
+        type=float,
+        default=None,
+        help="open-loop target rate in trades/sec. across all users",
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=None,
+        help="closed-loop number of requests in flight; defaults to the number of users",
+    )
+    parser.add_argument(
+        "--warmup",
+        type=float,
+        default=0.0,
+        help="seconds of trades excluded from the measurements",
+    )
+    parser.add_argument(
+        "--duration",
+        type=float,
+        default=None,
+        help="measured seconds after the warmup; defaults to running all trades",
+    )
+    parser.add_argument(
+        "--payload-size",
+        type=int,
+        default=PAYLOAD_SIZE,
+        help="trade record size in bytes",
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=1,
+        help="trades committed per request; 1 uses add_record()",
+    )
+    parser.add_argument(
+        "--signer-concurrency",
+        type=int,
+        default=1,
+        help="in-flight requests per user using a sequenced forwarder service",
+    )
+    parser.add_argument(
+        "--adaptive",
+        action="store_true",
+        help="adapt the forwarder request rate and concurrency to its load",
+    )
+    parser.add_argument(
+        "--seed", type=int, default=1234, help="seed for accounts and trades"
+    )
+    args = parser.parse_args(argv)
+    if args.trades_per_user == 0 and args.duration is None:
+        parser.error("--duration is required if --trades-per-user is 0")
+    if args.rate is not None and args.concurrency is not None:
+        parser.error("--rate and --concurrency are mutually exclusive")
+    if args.rate is None and args.concurrency is None:
+        args.concurrency = args.users
+    return args
+
+
+def create_trade(i_trade: int, payload_size: int, rng: random.Random) -> str:
+    """
+    Create a JSON trade record padded to the payload size.
+
+    :param i_trade: The trade index.
+    :param payload_size: The record size in bytes.
+        Records are never shorter than the trade fields.
+    :param rng: The random number generator for trade sizes.
+    :return: The trade record.
+    """
+    trade = {
+        "trade_id": i_trade,
+        "symbol": "ETHUSD",
+        # Create a random trade in [-1, 1].
+        "size": round(rng.random() * 2 - 1, 2),
+        "pad": "",
+    }
+    trade["pad"] = "x" * max(0, payload_size - len(json.dumps(trade)))
+    return json.dumps(trade)
+
+
+def create_strategy_datasets(args: argparse.Namespace) -> List[VBaseDataset]:
+    """
+    Create a strategy dataset for each user.
+
+    :param args: The parsed arguments.
+    :return: The datasets.
+    """
+    run_id = datetime.now().strftime("%Y%m%d%H%M%S")
+
+    def create_strategy_dataset(i_user: int) -> VBaseDataset:
+        vbc = create_vbase_client_from_env(
+            create_test_private_key(args.seed, i_user),
+            sequenced=args.signer_concurrency > 1,
+            adaptive=args.adaptive,
+        )
+        return VBaseDataset(vbc, f"user{i_user}_strategy{run_id}", VBaseJsonObject)
+
+    with ThreadPoolExecutor(max_workers=min(args.users, 32)) as executor:
+        return list(executor.map(create_strategy_dataset, range(args.users)))
+
+
+# ## Load Generation
+
+
+# The load keeps its settings, synchronization and measurements.
+# pylint: disable-next=too-many-instance-attributes
+class TradeLoad:
+    """
+    Posts trades round-robin across user datasets and records request latencies.
+    Trades for a user are posted sequentially, as a signer's requests
+    must not race each other, unless signer concurrency is enabled
+    and the signer's nonces are sequenced.
+    """
+
+    def __init__(self, l_datasets: List[VBaseDataset], args: argparse.Namespace):
+        """
+        :param l_datasets: The user datasets.
+        :param args: The parsed arguments.
+        """
+        self.l_datasets = l_datasets
+        self.args = args
+        self._user_semaphores = [
+            threading.BoundedSemaphore(args.signer_concurrency) for _ in l_datasets
+        ]
+        self._user_locks = [threading.Lock() for _ in l_datasets]
+        self._rngs = [random.Random(args.seed + i) for i in range(len(l_datasets))]
+        self._lock = threading.Lock()
+        self.l_samples = []
+        self.n_errors = 0
+        self.start_time = None
+        self.end_time = None
+
+    def iter_trades(self):
+        """
+        Iterate over the (user index, first trade index, number of trades) requests.
+        """
+        i_trade = 0
+        while self.args.trades_per_user == 0 or i_trade < self.args.trades_per_user:
+            n_trades = self.args.batch_size
+            if self.args.trades_per_user > 0:
+                n_trades = min(n_trades, self.args.trades_per_user - i_trade)
+            for i_user in range(len(self.l_datasets)):
+                yield i_user, i_trade, n_trades
+            i_trade += n_trades
+
+    def post_trades(
+        self, i_user: int, i_trade: int, n_trades: int, scheduled_time: float
+    ):
+        """
+        Post trades in a request and record its latency.
+
+        :param i_user: The user index.
+        :param i_trade: The first trade index.
+        :param n_trades: The number of trades.
+        :param scheduled_time: The time the trades were due to be posted.
+        """
+        with self._user_semaphores[i_user]:
+            with self._user_locks[i_user]:
+                trades = [
+                    create_trade(i, self.args.payload_size, self._rngs[i_user])
+                    for i in range(i_trade, i_trade + n_trades)
+                ]
+            request_time = time.perf_counter()
+            try:
+                if self.args.signer_concurrency > 1:
+                    add_records_concurrently(self.l_datasets[i_user], trades)
+                elif self.args.batch_size == 1:
+                    self.l_datasets[i_user].add_record(trades[0])
+                else:
+                    self.l_datasets[i_user].add_records_batch(trades)
+                is_error = False
+            # Failures are counted rather than ending the run.
+            # pylint: disable-next=broad-exception-caught
+            except Exception as e:
+                print(f"add_record() failed: {e}", file=sys.stderr)
+                is_error = True
+            end_time = time.perf_counter()
+        with self._lock:
+            if is_error:
+                self.n_errors += 1
+            else:
+                self.l_samples.append(
+                    (scheduled_time, end_time, end_time - request_time, n_trades)
+                )
+
+    def run(self):
+        """
+        Post the trades until all are posted or the duration elapses.
+        """
+        args = self.args
+        max_workers = (
+            args.concurrency
+            if args.rate is None
+            else min(MAX_OPEN_LOOP_CONCURRENCY, args.users * args.signer_concurrency)
+        )
+        end_time = None if args.duration is None else args.warmup + args.duration
+        # Closed-loop runs admit a new request whenever one completes.
+        semaphore = threading.BoundedSemaphore(max_workers)
+        self.start_time = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            n_posted = 0
+            for i_user, i_trade, n_trades in self.iter_trades():
+                if args.rate is None:
+                    semaphore.acquire()  # pylint: disable=consider-using-with
+                    scheduled_time = time.perf_counter()
+                else:
+                    # Open-loop runs post on schedule regardless of completions,
+                    # so queueing delays are part of the response times.
+                    scheduled_time = self.start_time + n_posted / args.rate
+                    time.sleep(max(0.0, scheduled_time - time.perf_counter()))
+                if (
+                    end_time is not None
+                    and scheduled_time - self.start_time >= end_time
+                ):
+                    break
+                future = executor.submit(
+                    self.post_trades, i_user, i_trade, n_trades, scheduled_time
+                )
+                n_posted += n_trades
+                if args.rate is None:
+                    future.add_done_callback(lambda _: semaphore.release())
+        self.end_time = time.perf_counter()
+
+    def create_report(self) -> dict:
+        """
+        Create the load test report from the measured requests.
+        Latencies are per request, which is per trade unless trades are batched.
+
+        :return: The report.
+        """
+        args = self.args
+        measure_start_time = self.start_time + args.warmup
+        df = pd.DataFrame(
+            self.l_samples,
+            columns=["scheduled_time", "end_time", "latency", "n_trades"],
+        )
+        df = df[df["scheduled_time"] >= measure_start_time].assign(
+            response_time=lambda d: d["end_time"] - d["scheduled_time"]
+        )
+        n_trades = int(df["n_trades"].sum())
+        measure_sec = (
+            df["end_time"].max() if len(df) > 0 else self.end_time
+        ) - measure_start_time
+
+        def summarize(s: pd.Series) -> dict:
+            if len(s) == 0:
+                return {}
+            summary = {f"p{p}": s.quantile(p / 100) for p in L_PERCENTILES}
+            summary["max"] = s.max()
+            summary["mean"] = s.mean()
+            return {k: round(float(v), 6) for k, v in summary.items()}
+
+        report = {
+            "config": vars(args),
+            "mode": "closed_loop" if args.rate is None else "open_loop",
+            "requests": len(df),
+            "trades": n_trades,
+            "errors": self.n_errors,
+            "measured_sec": round(measure_sec, 3),
+            "trades_per_min": (
+                round(n_trades / measure_sec * 60, 3) if measure_sec > 0 else None
+            ),
+            "add_record_latency_sec": summarize(df["latency"]),
+        }
+        if args.rate is not None:
+            # Response times include the time trades waited to be posted.
+            report["response_time_sec"] = summarize(df["response_time"])
+        return report
+
+
+def main(argv: Union[List[str], None] = None):
+    """
+    Run the load test and print the report.
+
+    :param argv: The arguments. Defaults to sys.argv.
+    """
+    args = parse_args(argv)
+    load_dotenv(verbose=False, override=True)
+    l_datasets = create_strategy_datasets(args)
+    load = TradeLoad(l_datasets, args)
+    load.run()
+    print(json.dumps(load.create_report(), indent=2))
+
+
+if __name__ == "__main__":
+    main()
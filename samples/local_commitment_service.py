@@ -0,0 +1,647 @@
+"""
+Local commitment and indexing services
+
+In-process stand-ins for the vBase forwarder and indexing service.
+The services keep commitments in a local ledger,
+assign deterministic timestamps
+and answer the indexing queries used to restore timestamps and verify datasets.
+Latency and errors can be injected to benchmark and regression-test
+client-side throughput without any network.
+"""
+
+import hashlib
+import os
+import random
+import threading
+import time
+from typing import List, Union
+import pandas as pd
+import requests
+from dotenv import load_dotenv
+from eth_account import Account
+
+from vbase import (
+    ForwarderCommitmentService,
+    IndexingService,
+    VBaseClient,
+    VBaseDataset,
+)
+from vbase.core.commitment_service import CommitmentService
+from vbase.core.web3_commitment_service import Web3CommitmentService
+from vbase.utils.crypto_utils import add_int_uint256, hash_typed_values
+
+from commitment_utils import (
+    AdaptiveForwarderCommitmentService,
+    SequencedForwarderCommitmentService,
+)
+
+# The chain ID reported in local commitment receipts.
+LOCAL_CHAIN_ID = 31337
+
+# The timestamp of the first local commitment.
+LOCAL_START_TIMESTAMP = "2024-01-01 00:00:00+00:00"
+
+# The default user for local services created without a private key.
+LOCAL_DEFAULT_ADDRESS = "0xA401F59d7190E4448Eb60691E3bc78f1Ef03e88C"
+
+
+# The ledger keeps separate indices for each query.
+# pylint: disable-next=too-many-instance-attributes
+class LocalLedger:
+    """
+    An in-process ledger of commitments shared by local services.
+
+    Each transaction advances the ledger clock by a fixed step,
+    so timestamps are deterministic for a given sequence of transactions.
+    Transactions that commit a batch of objects share a timestamp
+    as the objects in a block do.
+    The ledger is thread-safe.
+    """
+
+    def __init__(
+        self,
+        start_timestamp: str = LOCAL_START_TIMESTAMP,
+        timestamp_step_sec: int = 1,
+    ):
+        """
+        :param start_timestamp: The timestamp of the first transaction.
+        :param timestamp_step_sec: The number of seconds between transactions.
+        """
+        self._lock = threading.Lock()
+        self._next_timestamp = int(pd.Timestamp(start_timestamp).timestamp())
+        self._timestamp_step_sec = timestamp_step_sec
+        self._n_transactions = 0
+        # Users are keyed by their lowercase addresses.
+        self._user_sets = {}
+        self._user_set_cid_sums = {}
+        self._user_objects = set()
+        self._user_set_object_cid_sums = {}
+        # Receipts by user and by (user, set CID) in commitment order,
+        # which is timestamp order.
+        self._set_receipts = {}
+        self._object_receipts = {}
+        self._set_object_receipts = {}
+        # Object receipts by object CID for object queries.
+        self._object_cid_receipts = {}
+
+    def _begin_transaction(self) -> dict:
+        """
+        Start a transaction.
+        Must be called under the lock.
+
+        :return: The transaction fields shared by its receipts.
+        """
+        timestamp = self._next_timestamp
+        self._next_timestamp += self._timestamp_step_sec
+        self._n_transactions += 1
+        return {
+            "transactionHash": "0x"
+            + hashlib.sha3_256(str(self._n_transactions).encode("utf-8")).hexdigest(),
+            "timestamp": timestamp,
+        }
+
+    def add_set(self, user: str, set_cid: str) -> dict:
+        """
+        Record a set commitment.
+
+        :param user: The user address.
+        :param set_cid: The set CID.
+        :return: The set receipt or an empty dictionary if the set exists.
+        """
+        with self._lock:
+            user_sets = self._user_sets.setdefault(user.lower(), set())
+            if set_cid in user_sets:
+                # As with the contract, adding an existing set is a no-op.
+                return {}
+            tx = self._begin_transaction()
+            user_sets.add(set_cid)
+            self._user_set_cid_sums[user.lower()] = add_int_uint256(
+                self._user_set_cid_sums.get(user.lower(), 0), set_cid
+            )
+            receipt = {
+                "chainId": LOCAL_CHAIN_ID,
+                "transactionHash": tx["transactionHash"],
+                "user": user,
+                "setCid": set_cid,
+                "timestamp": Web3CommitmentService.convert_timestamp_chain_to_str(
+                    tx["timestamp"]
+                ),
+            }
+            self._set_receipts.setdefault(user.lower(), []).append(receipt)
+            return receipt
+
+    def add_objects(
+        self, user: str, set_cids: List[Union[str, None]], object_cids: List[str]
+    ) -> List[dict]:
+        """
+        Record object commitments in a single transaction.
+
+        :param user: The user address.
+        :param set_cids: The set CIDs for the objects or None for objects without sets.
+        :param object_cids: The object CIDs.
+        :return: The object receipts.
+        """
+        with self._lock:
+            tx = self._begin_transaction()
+            str_timestamp = Web3CommitmentService.convert_timestamp_chain_to_str(
+                tx["timestamp"]
+            )
+            receipts = []
+            for set_cid, object_cid in zip(set_cids, object_cids):
+                self._user_objects.add((user.lower(), object_cid, tx["timestamp"]))
+                receipt = {
+                    "chainId": LOCAL_CHAIN_ID,
+                    "transactionHash": tx["transactionHash"],
+                    "user": user,
+                    "objectCid": object_cid,
+                    "timestamp": str_timestamp,
+                }
+                self._object_receipts.setdefault(user.lower(), []).append(receipt)
+                self._object_cid_receipts.setdefault(object_cid, []).append(receipt)
+                if set_cid is not None:
+                    receipt = {**receipt, "setCid": set_cid}
+                    key = (user.lower(), set_cid)
+                    self._user_set_object_cid_sums[key] = add_int_uint256(
+                        self._user_set_object_cid_sums.get(key, 0), object_cid
+                    )
+                    self._set_object_receipts.setdefault(key, []).append(receipt)
+                receipts.append(receipt)
+            return receipts
+
+    def user_set_exists(self, user: str, set_cid: str) -> bool:
+        """
+        Check whether a set exists for a user.
+
+        :param user: The user address.
+        :param set_cid: The set CID.
+        :return: True if the set exists; False otherwise.
+        """
+        with self._lock:
+            return set_cid in self._user_sets.get(user.lower(), set())
+
+    def verify_user_sets(self, user: str, user_set_cid_sum: str) -> bool:
+        """
+        Verify the sum of set CIDs for a user.
+
+        :param user: The user address.
+        :param user_set_cid_sum: The sum of all set CIDs for the user.
+        :return: True if the sum matches; False otherwise.
+        """
+        with self._lock:
+            return self._user_set_cid_sums.get(user.lower(), 0) == int(
+                user_set_cid_sum, 16
+            )
+
+    def verify_user_object(self, user: str, object_cid: str, timestamp: str) -> bool:
+        """
+        Verify an object commitment.
+
+        :param user: The user address.
+        :param object_cid: The object CID.
+        :param timestamp: The commitment timestamp.
+        :return: True if the commitment exists; False otherwise.
+        """
+        chain_timestamp = Web3CommitmentService.convert_timestamp_str_to_chain(
+            timestamp
+        )
+        with self._lock:
+            return (user.lower(), object_cid, chain_timestamp) in self._user_objects
+
+    def verify_user_set_objects(
+        self, user: str, set_cid: str, user_set_object_cid_sum: str
+    ) -> bool:
+        """
+        Verify the sum of object CIDs for a user set.
+
+        :param user: The user address.
+        :param set_cid: The set CID.
+        :param user_set_object_cid_sum: The sum of all object CIDs for the user set.
+        :return: True if the sum matches; False otherwise.
+        """
+        with self._lock:
+            return self._user_set_object_cid_sums.get(
+                (user.lower(), set_cid), 0
+            ) == int(user_set_object_cid_sum, 16)
+
+    def find_user_sets(self, user: str) -> List[dict]:
+        """
+        Find set receipts for a user.
+
+        :param user: The user address.
+        :return: The receipts in timestamp order.
+        """
+        with self._lock:
+            return list(self._set_receipts.get(user.lower(), []))
+
+    def find_user_objects(self, user: str) -> List[dict]:
+        """
+        Find object receipts for a user.
+
+        :param user: The user address.
+        :return: The receipts in timestamp order.
+        """
+        with self._lock:
+            return list(self._object_receipts.get(user.lower(), []))
+
+    def find_user_set_objects(self, user: str, set_cid: str) -> List[dict]:
+        """
+        Find set object receipts for a user set.
+
+        :param user: The user address.
+        :param set_cid: The set CID.
+        :return: The receipts in timestamp order.
+        """
+        with self._lock:
+            return list(self._set_object_receipts.get((user.lower(), set_cid), []))
+
+    def find_objects(self, object_cids: List[str]) -> List[dict]:
+        """
+        Find object receipts for object CIDs.
+
+        :param object_cids: The object CIDs.
+        :return: The receipts in timestamp order.
+        """
+        with self._lock:
+            receipts = [
+                receipt
+                for object_cid in set(object_cids)
+                for receipt in self._object_cid_receipts.get(object_cid, [])
+            ]
+        return sorted(receipts, key=lambda receipt: receipt["timestamp"])
+
+
+# The process-wide ledger shared by services created from the environment.
+_local_ledger = LocalLedger()
+
+
+# pylint: disable-next=too-few-public-methods
+class _FaultInjector:
+    """
+    Injects latency and errors into service requests.
+    """
+
+    def __init__(
+        self, latency_sec: float, error_rate: float, seed: Union[int, None] = None
+    ):
+        """
+        :param latency_sec: The latency added to each request in seconds.
+        :param error_rate: The probability that a request fails.
+        :param seed: The random seed for reproducible errors, if any.
+        """
+        self.latency_sec = latency_sec
+        self.error_rate = error_rate
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def __call__(self, request_name: str):
+        """
+        Simulate a request.
+        Errors are raised before requests take effect,
+        so failed requests can be retried safely.
+
+        :param request_name: The request name for error messages.
+        """
+        if self.latency_sec > 0:
+            time.sleep(self.latency_sec)
+        if self.error_rate > 0:
+            with self._lock:
+                fail = self._random.random() < self.error_rate
+            if fail:
+                raise requests.HTTPError(f"Injected error: {request_name}")
+
+
+class LocalCommitmentService(CommitmentService):
+    """
+    An in-process commitment service backed by a LocalLedger.
+    Mirrors the ForwarderCommitmentService receipts.
+    """
+
+    # The service has many optional settings for fault injection.
+    # pylint: disable=too-many-arguments,too-many-positional-arguments
+    def __init__(
+        self,
+        private_key: Union[str, None] = None,
+        ledger: Union[LocalLedger, None] = None,
+        latency_sec: float = 0.0,
+        error_rate: float = 0.0,
+        seed: Union[int, None] = None,
+    ):
+        """
+        :param private_key: The user's private key, if any.
+            If not specified, commitments are made by LOCAL_DEFAULT_ADDRESS.
+        :param ledger: The ledger. Defaults to the process-wide ledger.
+        :param latency_sec: The latency added to each request in seconds.
+        :param error_rate: The probability that a request fails
+            with requests.HTTPError as a forwarder request would.
+        :param seed: The random seed for reproducible errors, if any.
+        """
+        self.ledger = _local_ledger if ledger is None else ledger
+        self.private_key = private_key
+        self._user = (
+            LOCAL_DEFAULT_ADDRESS
+            if private_key is None
+            # pylint: disable-next=no-value-for-parameter
+            else Account.from_key(private_key).address
+        )
+        self._inject_faults = _FaultInjector(latency_sec, error_rate, seed)
+
+    @staticmethod
+    def get_init_args_from_env(dotenv_path: Union[str, None] = None) -> dict:
+        if dotenv_path is not None:
+            load_dotenv(dotenv_path, verbose=True, override=True)
+        return {
+            "private_key": os.getenv("VBASE_COMMITMENT_SERVICE_PRIVATE_KEY"),
+            "latency_sec": float(
+                os.getenv("LOCAL_COMMITMENT_SERVICE_LATENCY_SEC", "0")
+            ),
+            "error_rate": float(os.getenv("LOCAL_COMMITMENT_SERVICE_ERROR_RATE", "0")),
+        }
+
+    @staticmethod
+    def create_instance_from_env(
+        dotenv_path: Union[str, None] = None,
+    ) -> "LocalCommitmentService":
+        return LocalCommitmentService(
+            **LocalCommitmentService.get_init_args_from_env(dotenv_path)
+        )
+
+    def get_default_user(self) -> str:
+        return self._user
+
+    @staticmethod
+    def convert_timestamp_str_to_chain(ts: str) -> int:
+        return Web3CommitmentService.convert_timestamp_str_to_chain(ts)
+
+    @staticmethod
+    def convert_timestamp_chain_to_str(ts: int) -> str:
+        return Web3CommitmentService.convert_timestamp_chain_to_str(ts)
+
+    @staticmethod
+    def get_named_set_cid(name: str) -> str:
+        return hash_typed_values(abi_types=["string"], values=[name])
+
+    def _create_receipt(self, receipt: dict) -> dict:
+        """
+        Create a commitment receipt from a ledger receipt.
+
+        :param receipt: The ledger receipt.
+        :return: The commitment receipt as returned by ForwarderCommitmentService.
+        """
+        receipt = dict(receipt)
+        receipt["userAddress"] = receipt["user"]
+        return receipt
+
+    def add_set(self, set_cid: str) -> dict:
+        self._inject_faults("add_set")
+        receipt = self.ledger.add_set(self._user, set_cid)
+        if not receipt:
+            return {}
+        receipt = self._create_receipt(receipt)
+        # Set receipts carry no timestamps as forwarder set receipts.
+        del receipt["timestamp"]
+        return receipt
+
+    def user_set_exists(self, user: str, set_cid: str) -> bool:
+        self._inject_faults("user_set_exists")
+        return self.ledger.user_set_exists(user, set_cid)
+
+    def verify_user_sets(self, user: str, user_set_cid_sum: str) -> bool:
+        self._inject_faults("verify_user_sets")
+        return self.ledger.verify_user_sets(user, user_set_cid_sum)
+
+    def add_object(self, object_cid: str) -> dict:
+        self._inject_faults("add_object")
+        return self._create_receipt(
+            self.ledger.add_objects(self._user, [None], [object_cid])[0]
+        )
+
+    def verify_user_object(self, user: str, object_cid: str, timestamp: str) -> bool:
+        self._inject_faults("verify_user_object")
+        return self.ledger.verify_user_object(user, object_cid, timestamp)
+
+    def add_set_object(self, set_cid: str, object_cid: str) -> dict:
+        self._inject_faults("add_set_object")
+        return self._create_receipt(
+            self.ledger.add_objects(self._user, [set_cid], [object_cid])[0]
+        )
+
+    def add_sets_objects_batch(
+        self, set_cids: List[str], object_cids: List[str]
+    ) -> List[dict]:
+        self._inject_faults("add_sets_objects_batch")
+        return [
+            self._create_receipt(receipt)
+            for receipt in self.ledger.add_objects(self._user, set_cids, object_cids)
+        ]
+
+    def add_set_objects_batch(self, set_cid: str, object_cids: List[str]) -> List[dict]:
+        return self.add_sets_objects_batch([set_cid] * len(object_cids), object_cids)
+
+    def verify_user_set_objects(
+        self, user: str, set_cid: str, user_set_object_cid_sum: str
+    ) -> bool:
+        self._inject_faults("verify_user_set_objects")
+        return self.ledger.verify_user_set_objects(
+            user, set_cid, user_set_object_cid_sum
+        )
+
+
+class LocalIndexingService(IndexingService):
+    """
+    An in-process indexing service backed by a LocalLedger.
+    Mirrors the Web3HTTPIndexingService receipts.
+    """
+
+    def __init__(
+        self,
+        ledger: Union[LocalLedger, None] = None,
+        latency_sec: float = 0.0,
+        error_rate: float = 0.0,
+        seed: Union[int, None] = None,
+    ):
+        """
+        :param ledger: The ledger. Defaults to the process-wide ledger.
+        :param latency_sec: The latency added to each query in seconds.
+        :param error_rate: The probability that a query fails.
+        :param seed: The random seed for reproducible errors, if any.
+        """
+        self.ledger = _local_ledger if ledger is None else ledger
+        self._inject_faults = _FaultInjector(latency_sec, error_rate, seed)
+
+    def find_user_sets(self, user: str) -> List[dict]:
+        self._inject_faults("find_user_sets")
+        return self.ledger.find_user_sets(user)
+
+    def find_user_objects(self, user: str, return_set_cids=False) -> List[dict]:
+        self._inject_faults("find_user_objects")
+        receipts = self.ledger.find_user_objects(user)
+        if return_set_cids:
+            receipts = self._add_set_cids(receipts)
+        return receipts
+
+    def find_user_set_objects(self, user: str, set_cid: str) -> List[dict]:
+        self._inject_faults("find_user_set_objects")
+        return self.ledger.find_user_set_objects(user, set_cid)
+
+    def find_last_user_set_object(self, user: str, set_cid: str) -> Union[dict, None]:
+        receipts = self.find_user_set_objects(user, set_cid)
+        return receipts[-1] if len(receipts) > 0 else None
+
+    def find_objects(self, object_cids: List[str], return_set_cids=False) -> List[dict]:
+        self._inject_faults("find_objects")
+        receipts = self.ledger.find_objects(object_cids)
+        if return_set_cids:
+            receipts = self._add_set_cids(receipts)
+        return receipts
+
+    def find_object(self, object_cid: str, return_set_cids=False) -> List[dict]:
+        return self.find_objects([object_cid], return_set_cids)
+
+    def find_last_object(
+        self, object_cid: str, return_set_cid=False
+    ) -> Union[dict, None]:
+        receipts = self.find_object(object_cid, return_set_cids=return_set_cid)
+        return receipts[-1] if len(receipts) > 0 else None
+
+    def _add_set_cids(self, receipts: List[dict]) -> List[dict]:
+        """
+        Add set CIDs to object receipts for objects committed to sets.
+
+        :param receipts: The object receipts.
+        :return: The receipts with setCid fields where available.
+        """
+        # Map the set object commitments of each user to their sets once
+        # rather than scanning all sets for each receipt.
+        set_cids = {}
+        for user in {receipt["user"] for receipt in receipts}:
+            for set_receipt in self.ledger.find_user_sets(user):
+                for set_object_receipt in self.ledger.find_user_set_objects(
+                    user, set_receipt["setCid"]
+                ):
+                    key = (
+                        set_object_receipt["transactionHash"],
+                        set_object_receipt["objectCid"],
+                    )
+                    set_cids[key] = set_object_receipt["setCid"]
+        return [
+            (
+                {**receipt, "setCid": set_cids[key]}
+                if (key := (receipt["transactionHash"], receipt["objectCid"]))
+                in set_cids
+                else receipt
+            )
+            for receipt in receipts
+        ]
+
+
+def is_local_commitment_service_enabled() -> bool:
+    """
+    Check whether the environment selects the local commitment service.
+
+    :return: True if VBASE_COMMITMENT_SERVICE_CLASS is "LocalCommitmentService".
+    """
+    return os.getenv("VBASE_COMMITMENT_SERVICE_CLASS") == "LocalCommitmentService"
+
+
+def create_commitment_service_from_env(
+    private_key: Union[str, None] = None,
+    sequenced: bool = False,
+    adaptive: bool = False,
+) -> CommitmentService:
+    """
+    Create a commitment service using the environment variables.
+
+    If VBASE_COMMITMENT_SERVICE_CLASS is "LocalCommitmentService",
+    a LocalCommitmentService using the process-wide ledger is created
+    with the latency and error rate in LOCAL_COMMITMENT_SERVICE_LATENCY_SEC
+    and LOCAL_COMMITMENT_SERVICE_ERROR_RATE.
+    Otherwise, a ForwarderCommitmentService is created
+    using VBASE_FORWARDER_URL and VBASE_API_KEY.
+
+    :param private_key: The user's private key.
+        Defaults to VBASE_COMMITMENT_SERVICE_PRIVATE_KEY.
+    :param sequenced: If True, create a SequencedForwarderCommitmentService
+        that supports concurrent commitments from the signer.
+        The local service always supports concurrent commitments.
+    :param adaptive: If True, create an AdaptiveForwarderCommitmentService
+        that also adapts its request rate and concurrency to forwarder load.
+    :return: The commitment service.
+    """
+    if private_key is None:
+        private_key = os.getenv("VBASE_COMMITMENT_SERVICE_PRIVATE_KEY")
+    if is_local_commitment_service_enabled():
+        init_args = LocalCommitmentService.get_init_args_from_env()
+        init_args["private_key"] = private_key
+        return LocalCommitmentService(**init_args)
+    if adaptive:
+        service_class = AdaptiveForwarderCommitmentService
+    elif sequenced:
+        service_class = SequencedForwarderCommitmentService
+    else:
+        service_class = ForwarderCommitmentService
+    return service_class(
+        os.getenv("VBASE_FORWARDER_URL"),
+        os.getenv("VBASE_API_KEY"),
+        private_key,
+    )
+
+
+def create_vbase_client_from_env(
+    private_key: Union[str, None] = None,
+    sequenced: bool = False,
+    adaptive: bool = False,
+) -> VBaseClient:
+    """
+    Create a vBase client using the environment variables.
+    If the local commitment service is not selected, no private key is given
+    and neither sequencing nor adaptation is requested,
+    the client is created by VBaseClient.create_instance_from_env().
+    See create_commitment_service_from_env() for the other settings.
+
+    :param private_key: The user's private key, if any.
+    :param sequenced: If True, support concurrent commitments from the signer.
+    :param adaptive: If True, adapt to forwarder load.
+    :return: The VBaseClient object.
+    """
+    if (
+        private_key is None
+        and not sequenced
+        and not adaptive
+        and not is_local_commitment_service_enabled()
+    ):
+        return VBaseClient.create_instance_from_env()
+    return VBaseClient(
+        create_commitment_service_from_env(private_key, sequenced, adaptive)
+    )
+
+
+def create_local_indexing_service(vbc: VBaseClient) -> Union[IndexingService, None]:
+    """
+    Create the local indexing service for a client using a local commitment service.
+    Library utilities that take an indexing service default to the one
+    for the client's commitment service, which does not exist for local services.
+
+    :param vbc: The VBaseClient object.
+    :return: The local indexing service,
+        or None if the client uses another commitment service.
+    """
+    commitment_service = vbc.commitment_service
+    if isinstance(commitment_service, LocalCommitmentService):
+        return LocalIndexingService(commitment_service.ledger)
+    return None
+
+
+def init_local_indexing_service(ds: VBaseDataset) -> VBaseDataset:
+    """
+    Use the local indexing service for a dataset using a local commitment service.
+    Datasets create indexing services for forwarders automatically,
+    but local services must be set explicitly.
+    Datasets using other commitment services are not changed.
+
+    :param ds: The vBaseDataset object.
+    :return: The dataset.
+    """
+    indexing_service = create_local_indexing_service(ds.vbc)
+    if indexing_service is not None:
+        ds.indexing_service = indexing_service
+    return ds
@@ -0,0 +1,426 @@
+"""
+Outbox utilities
+
+A durable local journal of dataset records between their generation,
+commitment and storage.
+Each record moves through the states generated, committed and stored,
+so after a crash a producer resumes the records that were in flight
+instead of reconciling the dataset against its objects and commitments.
+"""
+
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+from collections import Counter, defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Union
+import boto3
+
+from vbase import IndexingService, VBaseDataset
+from vbase.utils.crypto_utils import add_int_uint256
+
+from aws_utils import S3_MAX_WORKERS, write_s3_object
+from utils import RECORDS_BATCH_SIZE
+
+# Default outbox journal directory.
+OUTBOX_DIR_NAME = os.path.join(
+    os.path.expanduser("~"), ".cache", "vbase_samples", "outbox"
+)
+
+# Record states.
+OUTBOX_STATE_GENERATED = "generated"
+OUTBOX_STATE_COMMITTED = "committed"
+OUTBOX_STATE_STORED = "stored"
+
+_OUTBOX_COLUMNS = [
+    "seq",
+    "dataset_name",
+    "object_name",
+    "data",
+    "cid",
+    "state",
+    "receipt",
+]
+
+
+class RecordOutbox:
+    """
+    A SQLite journal of dataset records and their states.
+
+    Each record is keyed by its dataset and object name,
+    so regenerating a journaled record does not add it again.
+    State changes are committed to the journal before the next stage starts:
+    a record is journaled before it is committed
+    and its receipt is journaled before its object is written.
+    The journal uses write-ahead logging and may be shared by several threads.
+    """
+
+    def __init__(self, file_name: str):
+        """
+        :param file_name: The journal file name.
+        """
+        self.file_name = file_name
+        os.makedirs(os.path.dirname(os.path.abspath(file_name)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(file_name, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        # Sync every transaction, so journaled states survive power loss.
+        self._conn.execute("PRAGMA synchronous=FULL")
+        with self._conn:
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS records (
+                    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                    dataset_name TEXT NOT NULL,
+                    object_name TEXT NOT NULL,
+                    data TEXT NOT NULL,
+                    cid TEXT NOT NULL,
+                    state TEXT NOT NULL,
+                    receipt TEXT,
+                    updated_time REAL NOT NULL,
+                    UNIQUE (dataset_name, object_name)
+                )
+                """
+            )
+
+    def add_generated(
+        self, dataset_name: str, object_name: str, record_data: any, cid: str
+    ) -> Union[int, None]:
+        """
+        Journal a generated record.
+
+        :param dataset_name: The dataset name.
+        :param object_name: The object name of the record.
+        :param record_data: The JSON-serializable record datum.
+        :param cid: The record CID.
+        :return: The record sequence number,
+            or None if the record had already been journaled.
+        """
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                "INSERT OR IGNORE INTO records "
+                "(dataset_name, object_name, data, cid, state, updated_time) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    dataset_name,
+                    object_name,
+                    json.dumps(record_data),
+                    cid,
+                    OUTBOX_STATE_GENERATED,
+                    time.time(),
+                ),
+            )
+            return cursor.lastrowid if cursor.rowcount == 1 else None
+
+    def mark_committed(self, l_seqs: List[int], receipts: List[dict]):
+        """
+        Journal the commitments of records.
+
+        :param l_seqs: The record sequence numbers.
+        :param receipts: The commitment receipts.
+        """
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "UPDATE records SET state = ?, receipt = ?, updated_time = ? "
+                "WHERE seq = ?",
+                [
+                    (OUTBOX_STATE_COMMITTED, json.dumps(receipt, default=str), now, seq)
+                    for seq, receipt in zip(l_seqs, receipts)
+                ],
+            )
+
+    def mark_stored(self, seq: int):
+        """
+        Journal the storage of a record object.
+
+        :param seq: The record sequence number.
+        """
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE records SET state = ?, updated_time = ? WHERE seq = ?",
+                (OUTBOX_STATE_STORED, time.time(), seq),
+            )
+
+    def get_records(
+        self, dataset_name: str, l_states: Union[List[str], None] = None
+    ) -> List[dict]:
+        """
+        Get the journaled records of a dataset in the order they were generated.
+
+        :param dataset_name: The dataset name.
+        :param l_states: The record states to get. Defaults to all states.
+        :return: The records with their sequence numbers, object names,
+            data, CIDs, states and receipts.
+        """
+        sql = f"SELECT {', '.join(_OUTBOX_COLUMNS)} FROM records WHERE dataset_name = ?"
+        params = [dataset_name]
+        if l_states is not None:
+            sql += f" AND state IN ({', '.join('?' * len(l_states))})"
+            params.extend(l_states)
+        with self._lock:
+            rows = self._conn.execute(sql + " ORDER BY seq", params).fetchall()
+        records = []
+        for row in rows:
+            record = dict(zip(_OUTBOX_COLUMNS, row))
+            record["data"] = json.loads(record["data"])
+            if record["receipt"] is not None:
+                record["receipt"] = json.loads(record["receipt"])
+            records.append(record)
+        return records
+
+    def get_state_counts(self, dataset_name: str) -> dict:
+        """
+        Count the journaled records of a dataset by state.
+
+        :param dataset_name: The dataset name.
+        :return: The number of records in each state.
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT state, COUNT(*) FROM records "
+                "WHERE dataset_name = ? GROUP BY state",
+                (dataset_name,),
+            ).fetchall()
+        return dict(rows)
+
+    def close(self):
+        """
+        Close the journal.
+        """
+        with self._lock:
+            self._conn.close()
+
+
+# The pipeline keeps its stages, their queues and failures.
+# pylint: disable-next=too-many-instance-attributes
+class OutboxPipeline:
+    """
+    Commits journaled records and writes their objects to object storage.
+
+    Records are journaled as they are generated,
+    committed in batches in generation order by a commit thread,
+    and written by storage workers once their commitments are journaled,
+    so generation, commitment and storage run concurrently
+    while each object is written after its commitment.
+    Call resume() before submitting records to finish the records
+    that a previous run left in flight.
+    """
+
+    # The pipeline settings are independent knobs.
+    # pylint: disable=too-many-arguments,too-many-positional-arguments
+    def __init__(
+        self,
+        ds: VBaseDataset,
+        outbox: RecordOutbox,
+        boto_client: boto3.client,
+        bucket_name: str,
+        batch_size: int = RECORDS_BATCH_SIZE,
+        max_storage_workers: int = S3_MAX_WORKERS,
+        indexing_service: Union[IndexingService, None] = None,
+    ):
+        """
+        :param ds: The vBaseDataset object.
+        :param outbox: The record journal.
+        :param boto_client: The boto3.client object.
+        :param bucket_name: The bucket name.
+        :param batch_size: The maximum number of records per commit request.
+        :param max_storage_workers: The maximum number of concurrent object writes.
+        :param indexing_service: The indexing service used by resume()
+            to find commitments that were not journaled.
+            Defaults to the dataset's indexing service
+            or the one for its commitment service.
+        """
+        if indexing_service is not None:
+            ds.indexing_service = indexing_service
+        self.ds = ds
+        self.outbox = outbox
+        self.boto_client = boto_client
+        self.bucket_name = bucket_name
+        self.batch_size = batch_size
+        self._commit_queue = queue.Queue()
+        self._storage_executor = ThreadPoolExecutor(max_workers=max_storage_workers)
+        self._storage_futures = []
+        self._commit_error = None
+        self._commit_thread = threading.Thread(target=self._run_committer, daemon=True)
+        self._commit_thread.start()
+
+    def _add_dataset_records(self, l_records: List[dict]):
+        """
+        Add committed records to the dataset object.
+
+        :param l_records: The journaled records with their receipts.
+        """
+        for record in l_records:
+            self.ds.object_cid_sum = add_int_uint256(
+                self.ds.object_cid_sum, record["cid"]
+            )
+            self.ds.records.append(self.ds.record_type(record["data"]))
+            self.ds.timestamps.append(str(record["receipt"]["timestamp"]))
+
+    def _reconcile_generated(self, l_generated: List[dict]) -> List[dict]:
+        """
+        Find the commitments of generated records
+        that were committed before the previous run could journal them.
+        Only records left in the generated state are looked up,
+        using a single query of the dataset commitments.
+
+        :param l_generated: The records in the generated state.
+        :return: The records that had been committed, with their receipts.
+        """
+        l_journaled = self.outbox.get_records(
+            self.ds.name, [OUTBOX_STATE_COMMITTED, OUTBOX_STATE_STORED]
+        )
+        journaled_cids = Counter(record["cid"].lower() for record in l_journaled)
+        # Commitments not matched by journaled records, by CID in commitment order.
+        # CIDs are matched in lowercase, since indexers may return them in either case.
+        unjournaled = defaultdict(deque)
+        for receipt in self.ds.get_commitment_receipts():
+            cid = receipt["objectCid"].lower()
+            if journaled_cids[cid] > 0:
+                journaled_cids[cid] -= 1
+            else:
+                unjournaled[cid].append(receipt)
+        l_committed = []
+        for record in l_generated:
+            receipts = unjournaled.get(record["cid"].lower())
+            if receipts:
+                record["receipt"] = receipts.popleft()
+                l_committed.append(record)
+        if len(l_committed) > 0:
+            self.outbox.mark_committed(
+                [record["seq"] for record in l_committed],
+                [record["receipt"] for record in l_committed],
+            )
+        return l_committed
+
+    def resume(self) -> int:
+        """
+        Restore the committed records of the dataset from the journal
+        and resume the records left in flight by a previous run.
+
+        :return: The number of resumed records.
+        """
+        l_generated = self.outbox.get_records(self.ds.name, [OUTBOX_STATE_GENERATED])
+        if len(l_generated) > 0:
+            self._reconcile_generated(l_generated)
+        n_resumed = 0
+        for record in self.outbox.get_records(self.ds.name):
+            if record["state"] == OUTBOX_STATE_GENERATED:
+                self._commit_queue.put(record)
+                n_resumed += 1
+                continue
+            self._add_dataset_records([record])
+            if record["state"] == OUTBOX_STATE_COMMITTED:
+                self._store(record)
+                n_resumed += 1
+        return n_resumed
+
+    def submit(self, record_data: any, folder_name: str, file_name: str) -> bool:
+        """
+        Journal a generated record and queue it for commitment and storage.
+
+        :param record_data: The JSON-serializable record datum.
+        :param folder_name: The folder name within the bucket.
+        :param file_name: The object file name.
+        :return: True if the record was submitted;
+            False if the record had already been journaled.
+        """
+        if not folder_name.endswith("/"):
+            folder_name += "/"
+        object_name = folder_name + file_name
+        cid = self.ds.record_type(record_data).get_cid()
+        seq = self.outbox.add_generated(self.ds.name, object_name, record_data, cid)
+        if seq is None:
+            return False
+        self._commit_queue.put(
+            {
+                "seq": seq,
+                "object_name": object_name,
+                "data": record_data,
+                "cid": cid,
+            }
+        )
+        return True
+
+    def _store(self, record: dict):
+        """
+        Start writing a committed record object.
+
+        :param record: The journaled record with its receipt.
+        """
+
+        def store():
+            folder_name, file_name = record["object_name"].rsplit("/", 1)
+            data = record["data"]
+            write_s3_object(
+                self.boto_client,
+                self.bucket_name,
+                folder_name,
+                file_name,
+                data if isinstance(data, str) else json.dumps(data),
+            )
+            self.outbox.mark_stored(record["seq"])
+
+        self._storage_futures.append(self._storage_executor.submit(store))
+
+    def _commit_batch(self, batch: List[dict]):
+        """
+        Commit a batch of records, journal the commitments and start the writes.
+
+        :param batch: The journaled records.
+        """
+        l_record_data = [record["data"] for record in batch]
+        if len(batch) == 1:
+            receipts = [self.ds.add_record(l_record_data[0])]
+        else:
+            receipts = self.ds.add_records_batch(l_record_data)
+        self.outbox.mark_committed([record["seq"] for record in batch], receipts)
+        for record, receipt in zip(batch, receipts):
+            record["receipt"] = receipt
+            self._store(record)
+
+    def _run_committer(self):
+        """
+        Commit queued records in order.
+        """
+        while True:
+            batch = [self._commit_queue.get()]
+            if batch[0] is None:
+                return
+            # Take all records queued while the previous commit was in flight.
+            while len(batch) < self.batch_size and not self._commit_queue.empty():
+                record = self._commit_queue.get_nowait()
+                if record is None:
+                    # Requeue the sentinel to stop after this batch.
+                    self._commit_queue.put(None)
+                    break
+                batch.append(record)
+            if self._commit_error is not None:
+                # Later records must not be committed ahead of the failed records.
+                # These remain journaled as generated for the next run.
+                continue
+            try:
+                self._commit_batch(batch)
+            # Failures are raised by join().
+            # pylint: disable-next=broad-exception-caught
+            except Exception as e:
+                self._commit_error = e
+
+    def join(self):
+        """
+        Wait for all submitted records to be committed and written.
+        Records that failed remain journaled and are resumed by the next run.
+        """
+        self._commit_queue.put(None)
+        self._commit_thread.join()
+        errors = [f.exception() for f in self._storage_futures]
+        self._storage_executor.shutdown(wait=True)
+        if self._commit_error is not None:
+            raise self._commit_error
+        for error in errors:
+            if error is not None:
+                raise error
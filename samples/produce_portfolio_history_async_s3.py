@@ -0,0 +1,159 @@
+# # produce_portfolio_history_async_s3
+
+"""This sample creates tamper-proof portfolio track records
+for several strategies using an asyncio pipeline.
+
+Portfolios are generated, committed and saved concurrently,
+so one process keeps many commitments in flight.
+The records of each strategy are committed and saved
+in the order in which they are generated.
+This example builds on produce_portfolio_history_json_s3.py
+and omits redundant comments.
+"""
+
+
+# ## Imports
+
+import asyncio
+from datetime import datetime
+import json
+import random
+import time
+from dotenv import load_dotenv
+
+from vbase import (
+    VBaseDatasetAsync,
+    VBaseJsonObject,
+)
+
+from async_utils import ASYNC_MAX_IN_FLIGHT, AsyncRecordPipeline
+from local_commitment_service import create_vbase_client_from_env
+from storage_utils import create_storage_client_from_env
+
+
+# ## Configuration
+
+# The trader's sovereign cryptographic identity.
+PK = "0xabfc6c981e4e9f1f26175bc40aef73248d467617309c5e04e83da34171999076"
+
+# The strategy names.
+N_STRATEGIES = 4
+L_STRATEGY_NAMES = [
+    f"strategy{i}_" + datetime.now().strftime("%Y%m%d%H%M%S")
+    for i in range(N_STRATEGIES)
+]
+
+# Additional configuration.
+BUCKET_NAME = "vbase-test"
+N_TIME_PERIODS = 100
+FOLDER_NAME = "samples/portfolio_history/"
+
+
+# ## Setup
+
+# Load the information necessary to call vBase APIs.
+# Set VBASE_COMMITMENT_SERVICE_CLASS to LocalCommitmentService to run offline.
+load_dotenv(verbose=True, override=True)
+
+# Connect to the object storage, S3 by default.
+# Set STORAGE_BACKEND to run against a local directory or memory.
+boto_client = create_storage_client_from_env()
+
+# Connect to vBase.
+# The strategy datasets share the signer and commit concurrently,
+# so the signer's nonces must be sequenced.
+vbc = create_vbase_client_from_env(PK, sequenced=True)
+
+
+# ## Create and Stamp Portfolios
+
+
+async def generate_portfolios(strategy_name: str):
+    """
+    Generate random portfolios for a strategy.
+
+    :param strategy_name: The strategy name.
+    """
+    rng = random.Random(strategy_name)
+    for i_period in range(N_TIME_PERIODS):
+        # Yield to other producers as a real data source would.
+        await asyncio.sleep(0)
+        yield i_period, json.dumps(
+            {
+                "SPY": round(rng.random() * 2 - 1, 2),
+                "TSLA": round(rng.random() * 2 - 1, 2),
+                "BTCUSD": round(rng.random() * 2 - 1, 2),
+                "JPM:CDS:5": round(rng.random() * 2 - 1, 2),
+            }
+        )
+
+
+async def produce_strategy(
+    pipeline: AsyncRecordPipeline, ds: VBaseDatasetAsync
+) -> list:
+    """
+    Generate and submit the portfolios for a strategy.
+
+    :param pipeline: The record pipeline.
+    :param ds: The strategy dataset.
+    :return: The generated portfolios in order.
+    """
+    ports = []
+    async for i_period, port in generate_portfolios(ds.name):
+        ports.append(port)
+        await pipeline.submit(
+            ds, port, FOLDER_NAME + ds.name, f"portfolio_{i_period}.json"
+        )
+    return ports
+
+
+async def main():
+    """
+    Create the strategy datasets and stamp their portfolio histories.
+    """
+    l_datasets = await asyncio.gather(
+        *[
+            VBaseDatasetAsync.create(vbc, name=name, record_type=VBaseJsonObject)
+            for name in L_STRATEGY_NAMES
+        ]
+    )
+    print(f"Created datasets: {[ds.name for ds in l_datasets]}")
+
+    pipeline = AsyncRecordPipeline(
+        boto_client,
+        BUCKET_NAME,
+        max_in_flight=ASYNC_MAX_IN_FLIGHT,
+        concurrent_signers=True,
+    )
+    start_time = time.time()
+    l_ports = await asyncio.gather(
+        *[produce_strategy(pipeline, ds) for ds in l_datasets]
+    )
+    results = await pipeline.join()
+    elapsed_time = time.time() - start_time
+    pipeline.close()
+
+    n_records = sum(result["n_records"] for result in results)
+    n_failed = sum(result["n_failed"] for result in results)
+    print(f"Records: {n_records}, errors: {n_failed}")
+    print(f"Time elapsed (sec.): {elapsed_time}")
+    print(f"Throughput (records/min.): {n_records / elapsed_time * 60}")
+    for result in results:
+        if result["error"] is not None:
+            raise result["error"]
+
+    # Check that each strategy kept its generation order.
+    for ds, ports in zip(l_datasets, l_ports):
+        assert [r.data for r in ds.records] == ports
+        assert ds.timestamps == sorted(ds.timestamps)
+        assert (await ds.verify_commitments_async())[0]
+        print(f"Strategy info: name = {ds.name}, owner = {ds.owner}")
+
+    print(
+        "Data saved to: "
+        "http://vbase-test.s3-website-us-east-1.amazonaws.com/?prefix="
+        f"{FOLDER_NAME}"
+    )
+
+
+asyncio.run(main())
@@ -1,6 +1,10 @@
 # # Strategy Stamper Demo
 
 """This sample creates a tamper-proof portfolio track record.
+
+Portfolios are journaled in a local outbox as they are generated,
+so a run interrupted between committing a portfolio and saving it
+can be rerun with the same strategy name to finish the portfolios in flight.
 """
 
 
@@ -22,9 +26,11 @@ from vbase import (
 )
 
 from aws_utils import (
-    create_s3_client_from_env,
+    convert_long_csv_to_parquet,
     write_s3_object,
 )
+from outbox_utils import OUTBOX_DIR_NAME, OutboxPipeline, RecordOutbox
+from storage_utils import create_storage_client_from_env
 
 
 # ## Configuration
@@ -33,7 +39,10 @@ from aws_utils import (
 PRIVATE_KEY = "0xabfc6c981e4e9f1f26175bc40aef73248d467617309c5e04e83da34171999076"
 
 # The strategy name.
-STRATEGY_NAME = "strategy" + datetime.now().strftime("%Y%m%d%H%M%S")
+# Set STRATEGY_NAME to rerun an interrupted strategy.
+STRATEGY_NAME = os.environ.get(
+    "STRATEGY_NAME", "strategy" + datetime.now().strftime("%Y%m%d%H%M%S")
+)
 
 # Additional configuration.
 BUCKET_NAME = "vbase-test"
@@ -42,6 +51,10 @@ FOLDER_NAME = "samples/portfolio_history/"
 STRATEGY_FOLDER_NAME = FOLDER_NAME + STRATEGY_NAME
 ADDRESS = "0xA401F59d7190E4448Eb60691E3bc78f1Ef03e88C"
 
+# The outbox journaling each portfolio through generation, commitment and storage.
+# The journal is kept in the local cache directory for reruns of the strategy.
+OUTBOX_FILE_NAME = os.path.join(OUTBOX_DIR_NAME, STRATEGY_NAME + "_outbox.db")
+
 
 # ## Setup
 
@@ -59,8 +72,9 @@ vbc = VBaseClient(
     )
 )
 
-# Connect to AWS.
-boto_client = create_s3_client_from_env()
+# Connect to the object storage, S3 by default.
+# Set STORAGE_BACKEND to run against a local directory or memory.
+boto_client = create_storage_client_from_env()
 
 
 # ## Create and Stamp Portfolios
@@ -69,10 +83,17 @@ boto_client = create_s3_client_from_env()
 ds_strategy = VBaseDataset(vbc, STRATEGY_NAME, VBaseStringObject)
 print(f"Created dataset: {pprint.pformat(ds_strategy.to_dict())}")
 
+# Journal the portfolios so an interrupted run can be resumed.
+# Portfolios are committed in order and each is saved after its commitment,
+# while later portfolios are generated and committed concurrently.
+outbox = RecordOutbox(OUTBOX_FILE_NAME)
+pipeline = OutboxPipeline(ds_strategy, outbox, boto_client, BUCKET_NAME)
+print(f"Resumed portfolios: {pipeline.resume()}")
+
 # Create sample portfolios.
+# The portfolios are seeded, so a rerun regenerates the journaled portfolios,
+# which are not stamped again.
 random.seed(1234)
-l_port_csvs = []
-l_timestamps = []
 for i_trade in range(N_TIME_PERIODS):
     # Create a random portfolio in [-1, 1].
     # We can use any identifier for which returns can be verified.
@@ -82,22 +103,17 @@ for i_trade in range(N_TIME_PERIODS):
             "wt": [round(random.random() * 2 - 1, 2) for _ in range(4)],
         }
     ).to_csv(index=False)
-    l_port_csvs.append(port_csv)
     print(f"Portfolio:\n{port_csv}")
 
-    # Add the portfolio to the vBase dataset object.
-    receipt = ds_strategy.add_record(port_csv)
-    print(f"Stamp receipt: {pprint.pformat(receipt)}")
-    l_timestamps.append(receipt["timestamp"])
-
-    # Save the portfolio.
-    write_s3_object(
-        boto_client,
-        BUCKET_NAME,
-        STRATEGY_FOLDER_NAME,
-        f"portfolio_{i_trade}.csv",
-        port_csv,
-    )
+    # Journal the portfolio, then stamp and save it.
+    pipeline.submit(port_csv, STRATEGY_FOLDER_NAME, f"portfolio_{i_trade}.csv")
+
+# Wait for all portfolios to be stamped and saved.
+pipeline.join()
+print(f"Outbox states: {outbox.get_state_counts(STRATEGY_NAME)}")
+outbox.close()
+l_port_csvs = [record.data for record in ds_strategy.records]
+l_timestamps = ds_strategy.timestamps
 
 # Create a long portfolio history CSV.
 # We could create it from the above DataFrames,
@@ -120,6 +136,17 @@ write_s3_object(
     csv_ports_long,
 )
 
+# Save the long portfolio history as Parquet.
+# Parquet is smaller and faster to parse than CSV for long histories
+# and rebuilds the same portfolio records.
+write_s3_object(
+    boto_client,
+    BUCKET_NAME,
+    STRATEGY_FOLDER_NAME,
+    "portfolio_long.parquet",
+    convert_long_csv_to_parquet(csv_ports_long),
+)
+
 # Display the shareable portfolio history URL.
 print(
     "Data saved to: "
@@ -21,9 +21,9 @@ from vbase import (
 )
 
 from aws_utils import (
-    create_s3_client_from_env,
     write_s3_object,
 )
+from storage_utils import create_storage_client_from_env
 
 
 # ## Configuration
@@ -49,8 +49,9 @@ load_dotenv(verbose=True, override=True)
 forwarder_url = os.environ.get("VBASE_FORWARDER_URL")
 api_key = os.environ.get("VBASE_API_KEY")
 
-# Connect to AWS.
-boto_client = create_s3_client_from_env()
+# Connect to the object storage, S3 by default.
+# Set STORAGE_BACKEND to run against a local directory or memory.
+boto_client = create_storage_client_from_env()
 
 # Connect to vBase.
 vbc = VBaseClient(
@@ -0,0 +1,281 @@
+"""
+Provenance restoration utilities
+
+Copies dataset folders and restores the commitment timestamps of dataset objects
+that lost their metadata when they were copied or migrated.
+Large folders are split into key ranges that are copied,
+downloaded and hashed in parallel,
+and objects are matched to commitments by CID,
+so the copy may reorder, rename or duplicate the original objects.
+"""
+
+import csv
+import os
+import tempfile
+import time
+from collections import defaultdict, deque
+from itertools import islice
+from typing import Iterator, List, Tuple, Union
+import boto3
+
+from vbase import VBaseDataset
+
+from aws_utils import (
+    S3_MAX_RETRIES,
+    S3_MAX_WORKERS,
+    S3ObjectCache,
+    S3_MULTIPART_COPY_THRESHOLD,
+    _map_ordered,
+    copy_s3_object,
+    get_s3_object_cached,
+    iter_s3_objects,
+)
+
+# The default number of objects in a key range shard.
+PROVENANCE_SHARD_SIZE = 1000
+
+# Manifest object states.
+# The object matches a commitment not matched by another object.
+PROVENANCE_RESTORED = "restored"
+# The object is another copy of an object matched to a commitment.
+PROVENANCE_DUPLICATE = "duplicate"
+# No commitment was found for the object.
+PROVENANCE_MISSING = "missing"
+
+_MANIFEST_COLUMNS = ["key", "object_cid", "timestamp", "transaction_hash", "status"]
+
+
+def _iter_key_range_shards(
+    s3_objs: Iterator[dict], shard_size: int
+) -> Iterator[List[dict]]:
+    """
+    Split a listing into shards of consecutive keys.
+
+    :param s3_objs: The listing metadata dictionaries in key order.
+    :param shard_size: The number of objects in a shard.
+    :return: The iterator over shards.
+    """
+    while True:
+        shard = list(islice(s3_objs, shard_size))
+        if len(shard) == 0:
+            return
+        yield shard
+
+
+# Sharded copies take the source and destination locations and job options.
+# pylint: disable-next=too-many-arguments,too-many-positional-arguments
+def copy_s3_folder_in_shards(
+    boto_client: boto3.client,
+    source_bucket_name: str,
+    source_folder_name: str,
+    destination_bucket_name: str,
+    destination_folder_name: str,
+    shard_size: int = PROVENANCE_SHARD_SIZE,
+    max_workers: int = S3_MAX_WORKERS,
+    start_after: Union[str, None] = None,
+    multipart_threshold: int = S3_MULTIPART_COPY_THRESHOLD,
+) -> dict:
+    """
+    Copy a folder using key range shards copied in parallel.
+
+    The source listing is split into shards of consecutive keys,
+    and each worker copies the objects of a shard server-side.
+    Shards complete in key order, so all keys up to the last key
+    of the summary have been copied.
+    If a copy fails, the key to resume from is printed
+    and can be passed as start_after to continue the copy.
+
+    :param boto_client: The boto3.client object.
+    :param source_bucket_name: The source bucket name.
+    :param source_folder_name: The folder name within the source bucket.
+    :param destination_bucket_name: The destination bucket name.
+    :param destination_folder_name: The folder name within the destination bucket.
+    :param shard_size: The number of objects in a key range shard.
+    :param max_workers: The number of shards copied in parallel.
+    :param start_after: The source key after which to start copying, if any.
+    :param multipart_threshold: The minimum object size for multipart copies.
+    :return: The copy summary with the numbers of objects, bytes and shards copied,
+        the elapsed time, and the last source key copied.
+    """
+    # Ensure the folder names end with a "/".
+    if not source_folder_name.endswith("/"):
+        source_folder_name += "/"
+    if not destination_folder_name.endswith("/"):
+        destination_folder_name += "/"
+
+    def copy_shard(shard: List[dict]):
+        for s3_obj in shard:
+            copy_s3_object(
+                boto_client,
+                source_bucket_name,
+                s3_obj["Key"],
+                destination_bucket_name,
+                destination_folder_name + s3_obj["Key"][len(source_folder_name) :],
+                s3_obj["Size"],
+                multipart_threshold,
+            )
+
+    summary = {
+        "n_objects": 0,
+        "n_bytes": 0,
+        "n_shards": 0,
+        "elapsed_time": 0.0,
+        "last_key": start_after,
+    }
+    start_time = time.time()
+    try:
+        for shard, _ in _map_ordered(
+            copy_shard,
+            _iter_key_range_shards(
+                iter_s3_objects(
+                    boto_client,
+                    source_bucket_name,
+                    source_folder_name,
+                    start_after=start_after,
+                ),
+                shard_size,
+            ),
+            max_workers,
+        ):
+            summary["n_objects"] += len(shard)
+            summary["n_bytes"] += sum(s3_obj["Size"] for s3_obj in shard)
+            summary["n_shards"] += 1
+            summary["last_key"] = shard[-1]["Key"]
+    except Exception:
+        print(f"Copy failed. Resume the copy with start_after = {summary['last_key']}")
+        raise
+    summary["elapsed_time"] = time.time() - start_time
+    return summary
+
+
+# Provenance restoration takes the dataset, storage location and job options.
+# pylint: disable-next=too-many-arguments,too-many-positional-arguments,too-many-locals
+def restore_s3_folder_provenance(
+    ds: VBaseDataset,
+    boto_client: boto3.client,
+    bucket_name: str,
+    folder_name: str,
+    manifest_file_name: str,
+    shard_size: int = PROVENANCE_SHARD_SIZE,
+    max_workers: int = S3_MAX_WORKERS,
+    cache: Union[S3ObjectCache, None] = None,
+    progress_interval: Union[int, None] = 100,
+) -> dict:
+    """
+    Restore the provenance of the objects in a copied folder
+    and write the restored manifest.
+
+    The dataset commitments are fetched once
+    and indexed by CID in commitment order.
+    The folder listing is split into shards of consecutive keys,
+    and the workers download and hash the shards in parallel.
+    Shards are matched in key order as they complete,
+    so each object is matched with a hash lookup
+    and the restoration is linear in the number of objects and commitments.
+    The i-th copy of an object in key order is matched to the i-th commitment
+    of its CID, and extra copies are marked as duplicates of the first commitment.
+
+    The manifest is a CSV file with the key, object CID, commitment timestamp,
+    transaction hash and status of each object.
+    It is written to a temporary file and renamed once complete.
+
+    :param ds: The vBaseDataset object for the original dataset.
+    :param boto_client: The boto3.client object.
+    :param bucket_name: The bucket name.
+    :param folder_name: The folder name within the bucket.
+    :param manifest_file_name: The restored manifest file name.
+    :param shard_size: The number of objects in a key range shard.
+    :param max_workers: The number of shards processed in parallel.
+    :param cache: The local object cache, if any.
+    :param progress_interval: The number of shards between progress reports.
+        If None, progress is not reported.
+    :return: The restoration summary with the numbers of objects,
+        of restored, duplicate and missing objects,
+        and of commitments not matched by any object.
+    """
+    # Index the commitments by CID.
+    cid_receipts = defaultdict(deque)
+    first_receipts = {}
+    n_commitments = 0
+    for receipt in ds.get_commitment_receipts():
+        cid = receipt["objectCid"].lower()
+        cid_receipts[cid].append(receipt)
+        first_receipts.setdefault(cid, receipt)
+        n_commitments += 1
+
+    def hash_shard(shard: List[dict]) -> List[Tuple[str, str]]:
+        l_key_cids = []
+        for s3_obj in shard:
+            response = get_s3_object_cached(
+                boto_client, bucket_name, s3_obj, cache, S3_MAX_RETRIES
+            )
+            # Parse the object data as the record type loads its serialized data,
+            # e.g., integer records are stored as decimal strings.
+            record = ds.record_type(
+                init_dict={"data": response["Body"].decode("utf-8")}
+            )
+            l_key_cids.append((s3_obj["Key"], record.get_cid().lower()))
+        return l_key_cids
+
+    summary = {
+        PROVENANCE_RESTORED: 0,
+        PROVENANCE_DUPLICATE: 0,
+        PROVENANCE_MISSING: 0,
+    }
+    start_time = time.time()
+    n_shards = 0
+    manifest_dir = os.path.dirname(os.path.abspath(manifest_file_name))
+    fd, tmp_file_name = tempfile.mkstemp(dir=manifest_dir, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(_MANIFEST_COLUMNS)
+            for _, l_key_cids in _map_ordered(
+                hash_shard,
+                _iter_key_range_shards(
+                    iter_s3_objects(boto_client, bucket_name, folder_name),
+                    shard_size,
+                ),
+                max_workers,
+            ):
+                for key, cid in l_key_cids:
+                    receipts = cid_receipts.get(cid)
+                    if receipts:
+                        receipt = receipts.popleft()
+                        status = PROVENANCE_RESTORED
+                    elif cid in first_receipts:
+                        receipt = first_receipts[cid]
+                        status = PROVENANCE_DUPLICATE
+                    else:
+                        receipt = {"timestamp": None, "transactionHash": None}
+                        status = PROVENANCE_MISSING
+                    summary[status] += 1
+                    writer.writerow(
+                        [
+                            key,
+                            cid,
+                            receipt["timestamp"],
+                            receipt["transactionHash"],
+                            status,
+                        ]
+                    )
+                n_shards += 1
+                if progress_interval is not None and n_shards % progress_interval == 0:
+                    n_objs = sum(summary.values())
+                    print(
+                        f"Restored {n_objs} objects "
+                        f"({n_objs / (time.time() - start_time):.1f} objects/sec.)"
+                    )
+        os.replace(tmp_file_name, manifest_file_name)
+    except BaseException:
+        os.remove(tmp_file_name)
+        raise
+
+    return {
+        "n_objects": sum(summary.values()),
+        "n_restored": summary[PROVENANCE_RESTORED],
+        "n_duplicates": summary[PROVENANCE_DUPLICATE],
+        "n_missing": summary[PROVENANCE_MISSING],
+        "n_unmatched_commitments": n_commitments - summary[PROVENANCE_RESTORED],
+        "elapsed_time": time.time() - start_time,
+    }
@@ -0,0 +1,343 @@
+"""
+Receipt cache utilities
+
+A persistent local cache of commitment receipts.
+Commitments are append-only, and a receipt never changes once its block is final,
+so repeated verification of the same datasets can be served from local disk
+with at most a check for the latest commitment.
+
+The cache file is not authenticated, and anyone who can write to it
+can change the cached receipts and timestamps.
+Cached receipts are therefore safe for verification only
+if each record timestamp is then checked on chain,
+as utils.verify_and_collect() and utils.verify_dataset_with_checkpoint() do
+unless verify_objects is False.
+Otherwise, use the cache for display only.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import List, Tuple, Union
+
+import pandas as pd
+from vbase import IndexingService, VBaseDataset
+
+# Default receipt cache file.
+RECEIPT_CACHE_FILE_NAME = os.path.join(
+    os.path.expanduser("~"), ".cache", "vbase_samples", "receipts.db"
+)
+
+# Seconds during which a cached set of receipts is served without any query.
+RECEIPT_CACHE_TTL_SEC = 60
+
+# Seconds after a commitment after which its receipt is considered final.
+# Recent receipts may still be dropped by a chain reorganization,
+# so sets with recent receipts are refetched once their TTL expires.
+RECEIPT_FINALITY_SEC = 15 * 60
+
+
+class ReceiptCache:
+    """
+    A SQLite cache of commitment receipts keyed by owner, set CID and object CID.
+
+    The receipts of a set are cached with the time they were fetched
+    and the time by which all of them are final.
+    The cache may be shared by several threads and processes.
+    """
+
+    def __init__(
+        self,
+        file_name: str = RECEIPT_CACHE_FILE_NAME,
+        ttl_sec: float = RECEIPT_CACHE_TTL_SEC,
+        finality_sec: float = RECEIPT_FINALITY_SEC,
+    ):
+        """
+        :param file_name: The cache file name.
+        :param ttl_sec: Seconds during which cached receipts are served
+            without any query.
+        :param finality_sec: Seconds after which a receipt is final.
+        """
+        self.file_name = file_name
+        self.ttl_sec = ttl_sec
+        self.finality_sec = finality_sec
+        os.makedirs(os.path.dirname(os.path.abspath(file_name)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(file_name, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        with self._conn:
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS receipts (
+                    user TEXT NOT NULL,
+                    set_cid TEXT NOT NULL,
+                    i_receipt INTEGER NOT NULL,
+                    object_cid TEXT NOT NULL,
+                    receipt TEXT NOT NULL,
+                    PRIMARY KEY (user, set_cid, i_receipt)
+                )
+                """
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS receipts_object_cid "
+                "ON receipts (user, set_cid, object_cid)"
+            )
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS sets (
+                    user TEXT NOT NULL,
+                    set_cid TEXT NOT NULL,
+                    fetched_time REAL NOT NULL,
+                    final_time REAL NOT NULL,
+                    PRIMARY KEY (user, set_cid)
+                )
+                """
+            )
+
+    @staticmethod
+    def _get_key(user: str, set_cid: str) -> Tuple[str, str]:
+        """
+        Get the cache key for a set.
+        Indexers may return addresses and CIDs in either case.
+
+        :param user: The set owner.
+        :param set_cid: The set CID.
+        :return: The cache key.
+        """
+        return user.lower(), set_cid.lower()
+
+    def get_set_receipts(
+        self, user: str, set_cid: str
+    ) -> Union[Tuple[List[dict], float, float], None]:
+        """
+        Get the cached receipts for a set.
+
+        :param user: The set owner.
+        :param set_cid: The set CID.
+        :return: A tuple of the receipts in commitment order,
+            the time they were fetched and the time by which all are final,
+            or None if the set is not cached.
+        """
+        key = self._get_key(user, set_cid)
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT fetched_time, final_time FROM sets "
+                "WHERE user = ? AND set_cid = ?",
+                key,
+            ).fetchone()
+            if row is None:
+                return None
+            rows = self._conn.execute(
+                "SELECT receipt FROM receipts "
+                "WHERE user = ? AND set_cid = ? ORDER BY i_receipt",
+                key,
+            ).fetchall()
+        return [json.loads(receipt) for (receipt,) in rows], row[0], row[1]
+
+    def get_object_receipts(
+        self, user: str, set_cid: str, object_cid: str
+    ) -> List[dict]:
+        """
+        Get the cached receipts for an object in a set.
+        An object that is not cached may have been committed since the set was cached.
+
+        :param user: The set owner.
+        :param set_cid: The set CID.
+        :param object_cid: The object CID.
+        :return: The receipts in commitment order.
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT receipt FROM receipts "
+                "WHERE user = ? AND set_cid = ? AND object_cid = ? ORDER BY i_receipt",
+                (*self._get_key(user, set_cid), object_cid.lower()),
+            ).fetchall()
+        return [json.loads(receipt) for (receipt,) in rows]
+
+    def put_set_receipts(self, user: str, set_cid: str, receipts: List[dict]):
+        """
+        Cache the receipts for a set, replacing any cached receipts.
+
+        :param user: The set owner.
+        :param set_cid: The set CID.
+        :param receipts: The receipts in commitment order.
+        """
+        key = self._get_key(user, set_cid)
+        final_time = (
+            max(pd.Timestamp(r["timestamp"]).timestamp() for r in receipts)
+            + self.finality_sec
+            if len(receipts) > 0
+            else 0.0
+        )
+        with self._lock, self._conn:
+            self._conn.execute(
+                "DELETE FROM receipts WHERE user = ? AND set_cid = ?", key
+            )
+            self._conn.executemany(
+                "INSERT INTO receipts VALUES (?, ?, ?, ?, ?)",
+                [
+                    (*key, i, r["objectCid"].lower(), json.dumps(r, default=str))
+                    for i, r in enumerate(receipts)
+                ],
+            )
+            self._conn.execute(
+                "INSERT OR REPLACE INTO sets VALUES (?, ?, ?, ?)",
+                (*key, time.time(), final_time),
+            )
+
+    def touch_set(self, user: str, set_cid: str):
+        """
+        Mark the cached receipts for a set as fetched now.
+
+        :param user: The set owner.
+        :param set_cid: The set CID.
+        """
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE sets SET fetched_time = ? WHERE user = ? AND set_cid = ?",
+                (time.time(), *self._get_key(user, set_cid)),
+            )
+
+    def invalidate_set(self, user: str, set_cid: str):
+        """
+        Drop the cached receipts for a set,
+        e.g., after committing to the set.
+
+        :param user: The set owner.
+        :param set_cid: The set CID.
+        """
+        key = self._get_key(user, set_cid)
+        with self._lock, self._conn:
+            self._conn.execute(
+                "DELETE FROM receipts WHERE user = ? AND set_cid = ?", key
+            )
+            self._conn.execute("DELETE FROM sets WHERE user = ? AND set_cid = ?", key)
+
+    def close(self):
+        """
+        Close the cache.
+        """
+        with self._lock:
+            self._conn.close()
+
+
+def _is_last_receipt_cached(receipts: List[dict], last_receipt: dict) -> bool:
+    """
+    Check whether the latest commitment of a set is among the cached receipts.
+
+    :param receipts: The cached receipts in commitment order.
+    :param last_receipt: The latest receipt for the set.
+    :return: True if the latest receipt is the last cached receipt
+        or shares its timestamp and transaction.
+    """
+    for receipt in reversed(receipts):
+        if receipt["timestamp"] != last_receipt["timestamp"]:
+            break
+        if (
+            receipt["transactionHash"] == last_receipt["transactionHash"]
+            and receipt["objectCid"] == last_receipt["objectCid"]
+        ):
+            return True
+    return False
+
+
+class CachedIndexingService(IndexingService):
+    """
+    An indexing service that serves set receipts from a ReceiptCache.
+
+    Cached set receipts are served without a query within the cache TTL.
+    Once the TTL expires, sets whose receipts are all final
+    are served from the cache if the latest commitment is cached,
+    which takes a single query for the last set object.
+    Sets with recent receipts, or with new commitments, are refetched.
+    Other queries are passed through.
+    """
+
+    def __init__(self, indexing_service: IndexingService, cache: ReceiptCache):
+        """
+        :param indexing_service: The underlying indexing service.
+        :param cache: The receipt cache.
+        """
+        self.indexing_service = indexing_service
+        self.cache = cache
+
+    def find_user_sets(self, user: str) -> List[dict]:
+        return self.indexing_service.find_user_sets(user)
+
+    def find_user_objects(self, user: str, return_set_cids=False) -> List[dict]:
+        return self.indexing_service.find_user_objects(user, return_set_cids)
+
+    def find_user_set_objects(self, user: str, set_cid: str) -> List[dict]:
+        cached = self.cache.get_set_receipts(user, set_cid)
+        if cached is not None:
+            receipts, fetched_time, final_time = cached
+            now = time.time()
+            if now - fetched_time < self.cache.ttl_sec:
+                return receipts
+            if now >= final_time:
+                last_receipt = self.indexing_service.find_last_user_set_object(
+                    user, set_cid
+                )
+                if (last_receipt is None and len(receipts) == 0) or (
+                    last_receipt is not None
+                    and _is_last_receipt_cached(receipts, last_receipt)
+                ):
+                    self.cache.touch_set(user, set_cid)
+                    return receipts
+        receipts = self.indexing_service.find_user_set_objects(user, set_cid)
+        self.cache.put_set_receipts(user, set_cid, receipts)
+        return receipts
+
+    def find_last_user_set_object(self, user: str, set_cid: str) -> Union[dict, None]:
+        receipts = self.find_user_set_objects(user, set_cid)
+        return receipts[-1] if len(receipts) > 0 else None
+
+    def find_objects(self, object_cids: List[str], return_set_cids=False) -> List[dict]:
+        return self.indexing_service.find_objects(object_cids, return_set_cids)
+
+    def find_object(self, object_cid: str, return_set_cids=False) -> List[dict]:
+        return self.indexing_service.find_object(object_cid, return_set_cids)
+
+    def find_last_object(
+        self, object_cid: str, return_set_cid=False
+    ) -> Union[dict, None]:
+        return self.indexing_service.find_last_object(object_cid, return_set_cid)
+
+
+def init_cached_indexing_service(
+    ds: VBaseDataset,
+    cache: ReceiptCache,
+    indexing_service: Union[IndexingService, None] = None,
+) -> VBaseDataset:
+    """
+    Serve a dataset's commitment receipts from a receipt cache.
+    get_commitment_receipts(), try_restore_timestamps_from_index()
+    and utils.verify_and_collect() then use the cache.
+
+    The cache serves receipts without a query within its TTL,
+    so it should be used for reads only.
+    The cached receipts are not authenticated,
+    so verification must check the record timestamps on chain.
+    Write paths such as utils.add_records_idempotent()
+    should query the underlying indexing service
+    to see the commitments made since the set was cached.
+
+    :param ds: The vBaseDataset object.
+    :param cache: The receipt cache.
+    :param indexing_service: The underlying indexing service.
+        Defaults to the dataset's indexing service
+        or the one for its commitment service.
+    :return: The dataset.
+    """
+    if isinstance(ds.indexing_service, CachedIndexingService):
+        return ds
+    if indexing_service is None:
+        indexing_service = ds.indexing_service
+    if indexing_service is None:
+        indexing_service = IndexingService.create_instance_from_commitment_service(
+            ds.vbc.commitment_service
+        )
+    ds.indexing_service = CachedIndexingService(indexing_service, cache)
+    return ds
@@ -6,7 +6,9 @@ after loss during copying or other transformations.
 """
 
 from datetime import datetime
+import os
 import pprint
+import tempfile
 
 from vbase import (
     VBaseClient,
@@ -15,11 +17,11 @@ from vbase import (
 )
 
 from aws_utils import (
-    create_s3_client_from_env,
-    copy_s3_bucket,
     init_vbase_dataset_from_s3_objects,
     print_s3_objects,
 )
+from provenance_utils import copy_s3_folder_in_shards, restore_s3_folder_provenance
+from storage_utils import create_storage_client_from_env
 
 
 # ## Configuration
@@ -35,14 +37,19 @@ SET_NAME = "restore_dataset_provenance_set_" + datetime.now().strftime("%Y%m%d%H
 FOLDER_NAME = "restore_dataset_provenance/" + SET_NAME
 COPY_FOLDER_NAME = FOLDER_NAME + "_copy"
 
+# The restored manifest file for the copy.
+# The manifest is written to the temporary directory and removed once displayed.
+MANIFEST_FILE_NAME = os.path.join(tempfile.gettempdir(), SET_NAME + "_manifest.csv")
+
 
 # ## Setup
 
 # Initialize vBase using environment variables.
 vbc = VBaseClient.create_instance_from_env()
 
-# Create an AWS client using environment variables.
-boto_client = create_s3_client_from_env()
+# Connect to the object storage, S3 by default.
+# Set STORAGE_BACKEND to run against a local directory or memory.
+boto_client = create_storage_client_from_env()
 
 
 # ## Source Dataset
@@ -61,6 +68,8 @@ for i in seq:
     print(f"Created dataset record {i}, receipt:\n{pprint.pformat(vbase_receipt)}")
     # Store the object after the commitment has been made
     # to ensure that the commitment timestamp precedes the object timestamp.
+    # Producers that must survive a crash between the two steps
+    # can journal records with outbox_utils.OutboxPipeline.
     s3_receipt = boto_client.put_object(
         Bucket=BUCKET_NAME, Key=s3_obj_name, Body=str(i)
     )
@@ -79,13 +88,17 @@ print(ds.get_pd_data_frame())
 # ## Dataset Copy
 
 # Copy the folder to another folder, losing the timestamps.
-copy_s3_bucket(
-    boto_client=boto_client,
-    source_bucket_name=BUCKET_NAME,
-    source_folder_name=FOLDER_NAME,
-    destination_bucket_name=BUCKET_NAME,
-    destination_folder_name=COPY_FOLDER_NAME,
+# The folder is split into key ranges that are copied in parallel,
+# so this scales to migrations of millions of objects.
+copy_summary = copy_s3_folder_in_shards(
+    boto_client,
+    BUCKET_NAME,
+    FOLDER_NAME,
+    BUCKET_NAME,
+    COPY_FOLDER_NAME,
+    shard_size=2,
 )
+print(f"Copy summary:\n{pprint.pformat(copy_summary)}")
 
 # Display the copy objects as a time series.
 print("Copy S3 objects:")
@@ -121,3 +134,23 @@ pprint.pprint(ds_copy.get_pd_data_frame())
 
 # Verify the records again.
 assert ds_copy.verify_commitments()[0]
+
+
+# ## Parallel Restoration
+
+# Restore the provenance of the copy without loading it into a dataset.
+# The copy is split into key ranges that are downloaded and hashed in parallel,
+# and objects are matched to commitments by CID,
+# so this scales to copies of millions of objects
+# that may be reordered, renamed or duplicated.
+summary = restore_s3_folder_provenance(
+    ds, boto_client, BUCKET_NAME, COPY_FOLDER_NAME, MANIFEST_FILE_NAME, shard_size=2
+)
+print(f"Restoration summary:\n{pprint.pformat(summary)}")
+assert summary["n_restored"] == len(seq)
+assert summary["n_missing"] == 0 and summary["n_unmatched_commitments"] == 0
+
+# The manifest lists the restored timestamp of each object.
+with open(MANIFEST_FILE_NAME, encoding="utf-8") as f:
+    print(f"Restored manifest:\n{f.read()}")
+os.remove(MANIFEST_FILE_NAME)
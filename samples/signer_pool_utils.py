@@ -0,0 +1,308 @@
+"""
+Signer pool utilities
+
+A logical dataset whose commitments are sharded across several signing accounts.
+Each account commits its share of the records to its own dataset
+with the logical dataset name,
+so a single high-frequency strategy is not limited by one account's throughput.
+Verifiers merge the accounts' receipts back into one ordered history.
+"""
+
+import bisect
+import threading
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Tuple, Type, Union
+
+from vbase import IndexingService, VBaseClient, VBaseDataset, VBaseObject
+from vbase.core.vbase_object import VBASE_OBJECT_TYPES
+
+# Signer selection strategies.
+SIGNER_POOL_ROUND_ROBIN = "round_robin"
+SIGNER_POOL_LEAST_LOADED = "least_loaded"
+
+
+# The pool keeps its shards, selection state and the merged history.
+# pylint: disable-next=too-many-instance-attributes
+class SignerPoolDataset:
+    """
+    A dataset whose records are committed by a pool of signers.
+
+    Records are assigned to signers round-robin or to the signer
+    with the fewest commitments in flight.
+    Each signer commits its records sequentially to its shard dataset,
+    while different signers commit concurrently.
+    The pool keeps the merged history ordered by commitment timestamp,
+    with ties broken by the order in which records were added.
+    """
+
+    # The constructor mirrors VBaseDataset with the added pool settings.
+    # pylint: disable=too-many-arguments,too-many-positional-arguments
+    def __init__(
+        self,
+        l_vbc: List[VBaseClient],
+        name: Union[str, None] = None,
+        record_type: Union[Type[VBaseObject], None] = None,
+        init_dict: Union[dict, None] = None,
+        strategy: str = SIGNER_POOL_ROUND_ROBIN,
+        indexing_service: Union[IndexingService, None] = None,
+    ):
+        """
+        :param l_vbc: The vBase clients.
+            To create a new dataset, specify a client for each signer.
+            To open an existing dataset, a single client suffices.
+        :param name: The name of the new dataset.
+        :param record_type: The type of dataset records.
+        :param init_dict: Dictionary dataset representation.
+            If specified, an existing dataset is opened for verification.
+        :param strategy: The signer selection strategy:
+            SIGNER_POOL_ROUND_ROBIN or SIGNER_POOL_LEAST_LOADED.
+        :param indexing_service: The indexing service for the signers' commitments.
+            Defaults to the one for the commitment service of the first client.
+        """
+        if strategy not in (SIGNER_POOL_ROUND_ROBIN, SIGNER_POOL_LEAST_LOADED):
+            raise ValueError(f"Unknown signer selection strategy: {strategy}")
+        self.l_vbc = l_vbc
+        self.strategy = strategy
+        self.indexing_service = indexing_service
+        self.records = []
+        self.timestamps = []
+        # The signer of each record.
+        self.record_owners = []
+        # The record sort keys of timestamps and the order in which records were added,
+        # which breaks timestamp ties.
+        self._keys = []
+        self._lock = threading.Lock()
+        self._next_seq = 0
+        self._next_shard = 0
+
+        if name is not None:
+            self.name = name
+            self.record_type = record_type
+            self.record_type_name = record_type.__name__
+            with ThreadPoolExecutor(max_workers=len(l_vbc)) as executor:
+                self.l_shards = list(
+                    executor.map(
+                        lambda vbc: VBaseDataset(vbc, name, record_type), l_vbc
+                    )
+                )
+            self.owners = [ds.owner for ds in self.l_shards]
+            self._shard_locks = [threading.Lock() for _ in self.l_shards]
+            self._shard_loads = [0] * len(self.l_shards)
+        else:
+            self.name = init_dict["name"]
+            self.record_type_name = init_dict["record_type_name"]
+            self.record_type = VBASE_OBJECT_TYPES[self.record_type_name]
+            self.owners = init_dict["owners"]
+            self.l_shards = None
+            self.records = [
+                self.record_type(init_dict=record_init_dict)
+                for record_init_dict in init_dict["records"]
+            ]
+            self._keys = [(None, (i, 0)) for i in range(len(self.records))]
+            self._next_seq = len(self.records)
+            # Timestamps and signers are optional.
+            # These can be restored from commitment receipts.
+            if "timestamps" in init_dict:
+                self.timestamps = init_dict["timestamps"]
+                self.record_owners = init_dict["record_owners"]
+
+    def _acquire_shard(self) -> Tuple[int, int]:
+        """
+        Select a signer for a commitment.
+
+        :return: A tuple of the shard index and the commitment sequence number.
+        """
+        with self._lock:
+            if self.strategy == SIGNER_POOL_ROUND_ROBIN:
+                i_shard = self._next_shard
+                self._next_shard = (self._next_shard + 1) % len(self.l_shards)
+            else:
+                i_shard = min(
+                    range(len(self.l_shards)), key=lambda i: self._shard_loads[i]
+                )
+            self._shard_loads[i_shard] += 1
+            seq = self._next_seq
+            self._next_seq += 1
+        return i_shard, seq
+
+    def _add_committed_records(
+        self, records: List[VBaseObject], receipts: List[dict], owner: str, seq: int
+    ):
+        """
+        Merge committed records into the ordered history.
+
+        :param records: The committed records.
+        :param receipts: The commitment receipts.
+        :param owner: The signer.
+        :param seq: The sequence number of the first record.
+        """
+        with self._lock:
+            for i, (record, receipt) in enumerate(zip(records, receipts)):
+                key = (str(receipt["timestamp"]), (seq, i))
+                # Records mostly complete in order, so insertion is near the end.
+                pos = bisect.bisect(self._keys, key)
+                self._keys.insert(pos, key)
+                self.records.insert(pos, record)
+                self.timestamps.insert(pos, key[0])
+                self.record_owners.insert(pos, owner)
+
+    def _sort_records(self):
+        """
+        Order records by timestamp and the order in which they were added.
+        """
+        keys = [
+            (timestamp, key[1]) for timestamp, key in zip(self.timestamps, self._keys)
+        ]
+        order = sorted(range(len(self.records)), key=lambda i: keys[i])
+        self.records = [self.records[i] for i in order]
+        self.timestamps = [self.timestamps[i] for i in order]
+        self.record_owners = [self.record_owners[i] for i in order]
+        self._keys = [keys[i] for i in order]
+
+    def add_records_batch(self, record_data_list: List[any]) -> List[dict]:
+        """
+        Add a batch of records using one of the signers.
+        May be called from several threads.
+
+        :param record_data_list: The list of records' data.
+        :return: The commitment receipts.
+        """
+        i_shard, seq = self._acquire_shard()
+        try:
+            with self._shard_locks[i_shard]:
+                shard = self.l_shards[i_shard]
+                if len(record_data_list) == 1:
+                    receipts = [shard.add_record(record_data_list[0])]
+                else:
+                    receipts = shard.add_records_batch(record_data_list)
+        finally:
+            with self._lock:
+                self._shard_loads[i_shard] -= 1
+        records = [self.record_type(record_data) for record_data in record_data_list]
+        self._add_committed_records(records, receipts, shard.owner, seq)
+        return receipts
+
+    def add_record(self, record_data: any) -> dict:
+        """
+        Add a record using one of the signers.
+        May be called from several threads.
+
+        :param record_data: The record datum.
+        :return: The commitment receipt.
+        """
+        return self.add_records_batch([record_data])[0]
+
+    def to_dict(self) -> dict:
+        """
+        Return dictionary representation of the dataset.
+
+        :return: The dictionary representation of the dataset.
+        """
+        with self._lock:
+            return {
+                "name": self.name,
+                "owners": self.owners,
+                "record_type_name": self.record_type_name,
+                "records": [record.__dict__ for record in self.records],
+                "record_owners": self.record_owners,
+                "timestamps": self.timestamps,
+            }
+
+    def _create_owner_dataset(
+        self, owner: str, l_inds: Union[List[int], None] = None
+    ) -> VBaseDataset:
+        """
+        Create a read-only dataset for a signer's records.
+
+        :param owner: The signer.
+        :param l_inds: The indices of the signer's records, if any.
+        :return: The signer's dataset.
+        """
+        init_dict = {
+            "name": self.name,
+            "owner": owner,
+            "record_type_name": self.record_type_name,
+            "records": [],
+        }
+        if l_inds is not None:
+            init_dict["records"] = [self.records[i].__dict__ for i in l_inds]
+            init_dict["timestamps"] = [self.timestamps[i] for i in l_inds]
+        ds = VBaseDataset(self.l_vbc[0], init_dict=init_dict)
+        if self.indexing_service is not None:
+            ds.indexing_service = self.indexing_service
+        return ds
+
+    def try_restore_timestamps_from_index(self) -> Tuple[bool, List[str]]:
+        """
+        Restore the signers and timestamps of the records
+        by merging the signers' commitment receipts,
+        and order the records by timestamp.
+        Records with identical CIDs are paired with receipts in order.
+        CIDs are matched in lowercase, since indexers may return them in either case.
+        The merge is linear in the number of records and receipts.
+
+        :return: A tuple containing success and log:
+            - success: True if all records have been found in the index
+                and timestamps restored; False otherwise.
+            - l_log: A list log of verification explaining any failures.
+        """
+        # Map each CID to its record indices in order.
+        cid_inds = defaultdict(deque)
+        for i, record in enumerate(self.records):
+            cid_inds[record.get_cid().lower()].append(i)
+
+        l_receipts = []
+        for owner in self.owners:
+            for receipt in self._create_owner_dataset(owner).get_commitment_receipts():
+                l_receipts.append((owner, receipt))
+        l_receipts.sort(key=lambda x: x[1]["timestamp"])
+
+        self.timestamps = [None] * len(self.records)
+        self.record_owners = [None] * len(self.records)
+        for owner, receipt in l_receipts:
+            inds = cid_inds.get(receipt["objectCid"].lower())
+            if inds:
+                i = inds.popleft()
+                self.timestamps[i] = str(receipt["timestamp"])
+                self.record_owners[i] = owner
+
+        l_log = [
+            "Invalid record: "
+            "Record commitment not found: "
+            f"object_cid = {self.records[i].get_cid()}"
+            for inds in cid_inds.values()
+            for i in inds
+        ]
+        if len(l_log) == 0:
+            with self._lock:
+                self._sort_records()
+        return len(l_log) == 0, l_log
+
+    def verify_commitments(self) -> Tuple[bool, List[str]]:
+        """
+        Verify commitments for all records.
+        Each signer's records must comprise all commitments to its dataset,
+        so no signer's records can be omitted or added.
+
+        :return: A tuple containing success and log:
+            - success: True if all record commitments have been verified;
+                False otherwise.
+            - l_log: A list log of verification explaining any failures.
+        """
+        if len(self.timestamps) != len(self.records) or None in self.timestamps:
+            return False, ["Invalid records: Timestamps have not been restored."]
+        owner_inds = {owner: [] for owner in self.owners}
+        for i, owner in enumerate(self.record_owners):
+            if owner not in owner_inds:
+                return False, [f"Invalid records: Unknown signer: owner = {owner}"]
+            owner_inds[owner].append(i)
+        success = True
+        l_log = []
+        for owner, l_inds in owner_inds.items():
+            owner_success, owner_log = self._create_owner_dataset(
+                owner, l_inds
+            ).verify_commitments()
+            success = success and owner_success
+            l_log.extend(owner_log)
+        return success, l_log
@@ -0,0 +1,586 @@
+"""
+Storage utilities
+
+Storage backends implement the subset of the boto3 S3 client API
+used by the samples and aws_utils,
+so a backend can be passed wherever a boto3.client object is expected.
+This lets the producer and verifier samples run against S3,
+a local directory or memory,
+for example, to benchmark hashing and verification without network noise.
+"""
+
+from abc import ABC, abstractmethod
+from datetime import datetime, timezone
+import hashlib
+from itertools import islice
+import mmap
+import os
+import tempfile
+import threading
+from typing import Iterator, List, Union
+import boto3
+from botocore.exceptions import ClientError
+from dotenv import load_dotenv
+
+from aws_utils import create_s3_client_from_env
+
+# Backends mirror the boto3 S3 client API, including its argument names.
+# pylint: disable=invalid-name,too-many-arguments,too-many-positional-arguments
+
+# Default directory for the local storage backend.
+STORAGE_LOCAL_DIR = os.path.join(
+    os.path.expanduser("~"), ".cache", "vbase_samples", "storage"
+)
+
+
+class StorageBody:
+    """
+    An object body returned by get_object().
+    Mirrors the read() and iter_chunks() methods of the botocore StreamingBody.
+    """
+
+    def __init__(self, data: Union[bytes, mmap.mmap]):
+        """
+        :param data: The object data as bytes or a memory map.
+        """
+        self._data = data
+        self._pos = 0
+
+    def read(self, amt: Union[int, None] = None) -> bytes:
+        """
+        Read the object data.
+
+        :param amt: The maximum number of bytes to read, if any.
+            If not specified, the rest of the data is read.
+        :return: The data read.
+        """
+        end = len(self._data) if amt is None else min(self._pos + amt, len(self._data))
+        data = self._data[self._pos : end]
+        self._pos = end
+        return data
+
+    def iter_chunks(self, chunk_size: int = 1024) -> Iterator[bytes]:
+        """
+        Iterate over the object data in chunks.
+
+        :param chunk_size: The chunk size.
+        :return: The iterator over chunks.
+        """
+        while True:
+            chunk = self.read(chunk_size)
+            if len(chunk) == 0:
+                return
+            yield chunk
+
+    def close(self):
+        """
+        Release the object data.
+        """
+        if isinstance(self._data, mmap.mmap):
+            self._data.close()
+        self._data = b""
+        self._pos = 0
+
+
+def _create_no_such_key_error(operation_name: str, key: str) -> ClientError:
+    """
+    Create the error S3 returns for a missing object.
+
+    :param operation_name: The S3 operation name.
+    :param key: The object key.
+    :return: The error.
+    """
+    # HeadObject responses have no body, so S3 reports the HTTP status code.
+    code = "404" if operation_name == "HeadObject" else "NoSuchKey"
+    return ClientError(
+        {
+            "Error": {
+                "Code": code,
+                "Message": f"The specified key does not exist: {key}",
+            }
+        },
+        operation_name,
+    )
+
+
+def _to_bytes(body: Union[str, bytes]) -> bytes:
+    """
+    Convert an object body passed to put_object() to bytes.
+
+    :param body: The object body as a string, bytes or a readable file-like object.
+    :return: The object bytes.
+    """
+    if hasattr(body, "read"):
+        body = body.read()
+    if isinstance(body, str):
+        body = body.encode("utf-8")
+    return bytes(body)
+
+
+class StoragePaginator:  # pylint: disable=too-few-public-methods
+    """
+    A list_objects_v2 paginator for storage backends.
+    Mirrors the paginate() method of the boto3 paginator.
+    """
+
+    def __init__(self, backend: "StorageBackend"):
+        """
+        :param backend: The storage backend.
+        """
+        self.backend = backend
+
+    def paginate(
+        self,
+        Bucket: str,
+        Prefix: str = "",
+        StartAfter: Union[str, None] = None,
+        PaginationConfig: Union[dict, None] = None,
+    ) -> Iterator[dict]:
+        """
+        Iterate over listing pages.
+
+        The objects are listed lazily in key order and split into pages,
+        so each page only lists the objects in it.
+
+        :param Bucket: The bucket name.
+        :param Prefix: The key prefix.
+        :param StartAfter: The key after which to start listing, if any.
+        :param PaginationConfig: The pagination configuration, if any.
+            Supports "PageSize" and "StartingToken".
+        :return: The iterator over list_objects_v2 responses.
+        """
+        if PaginationConfig is None:
+            PaginationConfig = {}
+        page_size = PaginationConfig.get("PageSize", 1000)
+        token = PaginationConfig.get("StartingToken")
+        objs = self.backend.iter_objects(
+            Bucket, Prefix, token if token is not None else StartAfter
+        )
+        # List one more object than a page holds to tell whether the page is the last.
+        objs_page = list(islice(objs, page_size + 1))
+        while True:
+            page = self.backend.create_list_page(objs_page, Bucket, Prefix, page_size)
+            yield page
+            if not page["IsTruncated"]:
+                return
+            # The extra object starts the next page.
+            objs_page = objs_page[page_size:] + list(islice(objs, page_size))
+
+
+class StorageBackend(ABC):
+    """
+    Base class for storage backends.
+
+    Subclasses implement listing, reading, writing and copying objects;
+    the base class implements the boto3 S3 client methods on top of them.
+    Keys are listed in lexicographic order as S3 lists them.
+    Missing objects raise the botocore ClientError S3 raises.
+    """
+
+    @abstractmethod
+    def iter_objects(
+        self, bucket_name: str, prefix: str, start_after: Union[str, None] = None
+    ) -> Iterator[dict]:
+        """
+        List objects lazily in key order.
+
+        :param bucket_name: The bucket name.
+        :param prefix: The key prefix.
+        :param start_after: The key after which to start listing, if any.
+        :return: The iterator over object metadata dictionaries sorted by key
+            with Key, LastModified, ETag and Size fields.
+        """
+
+    @abstractmethod
+    def head_object(self, Bucket: str, Key: str) -> dict:
+        """
+        Get object metadata.
+
+        :param Bucket: The bucket name.
+        :param Key: The object key.
+        :return: The object metadata with ETag, LastModified and ContentLength fields.
+        """
+
+    @abstractmethod
+    def get_object(self, Bucket: str, Key: str) -> dict:
+        """
+        Get an object.
+
+        :param Bucket: The bucket name.
+        :param Key: The object key.
+        :return: The object metadata with the StorageBody object in the Body field.
+        """
+
+    @abstractmethod
+    def put_object(self, Bucket: str, Key: str, Body: Union[str, bytes]) -> dict:
+        """
+        Write an object.
+
+        :param Bucket: The bucket name.
+        :param Key: The object key.
+        :param Body: The object body as a string, bytes or a readable file-like object.
+        :return: The operation receipt with the ETag field.
+        """
+
+    def copy_object(self, Bucket: str, Key: str, CopySource: dict) -> dict:
+        """
+        Copy an object.
+
+        :param Bucket: The destination bucket name.
+        :param Key: The destination object key.
+        :param CopySource: The source object with Bucket and Key fields.
+        :return: The operation receipt with the CopyObjectResult field.
+        """
+        response = self.get_object(Bucket=CopySource["Bucket"], Key=CopySource["Key"])
+        receipt = self.put_object(Bucket=Bucket, Key=Key, Body=response["Body"].read())
+        head = self.head_object(Bucket=Bucket, Key=Key)
+        return {
+            "CopyObjectResult": {
+                "ETag": receipt["ETag"],
+                "LastModified": head["LastModified"],
+            }
+        }
+
+    def copy(self, CopySource: dict, Bucket: str, Key: str, Config=None):
+        """
+        Copy an object using a managed transfer.
+        Storage backends have no multipart copies, so this is copy_object().
+
+        :param CopySource: The source object with Bucket and Key fields.
+        :param Bucket: The destination bucket name.
+        :param Key: The destination object key.
+        :param Config: The boto3 TransferConfig object, which is ignored.
+        """
+        _ = Config
+        self.copy_object(Bucket=Bucket, Key=Key, CopySource=CopySource)
+
+    @staticmethod
+    def create_list_page(
+        objs: List[dict],
+        bucket_name: str,
+        prefix: str,
+        max_keys: int,
+    ) -> dict:
+        """
+        Create a list_objects_v2 response page.
+
+        :param objs: The object metadata dictionaries sorted by key
+            starting with the first object in the page.
+            The page is truncated if there are more than max_keys objects.
+        :param bucket_name: The bucket name.
+        :param prefix: The key prefix.
+        :param max_keys: The maximum number of objects in the page.
+        :return: The list_objects_v2 response.
+            The continuation token is the last key in the page.
+        """
+        contents = objs[:max_keys]
+        page = {
+            "Name": bucket_name,
+            "Prefix": prefix,
+            "KeyCount": len(contents),
+            "MaxKeys": max_keys,
+            "IsTruncated": len(objs) > max_keys,
+        }
+        if len(contents) > 0:
+            page["Contents"] = contents
+        if page["IsTruncated"]:
+            page["NextContinuationToken"] = contents[-1]["Key"]
+        return page
+
+    def list_objects_v2(
+        self,
+        Bucket: str,
+        Prefix: str = "",
+        StartAfter: Union[str, None] = None,
+        ContinuationToken: Union[str, None] = None,
+        MaxKeys: int = 1000,
+    ) -> dict:
+        """
+        List a page of objects.
+
+        :param Bucket: The bucket name.
+        :param Prefix: The key prefix.
+        :param StartAfter: The key after which to start listing, if any.
+        :param ContinuationToken: The continuation token, if any.
+            As with S3, StartAfter is ignored if the token is specified.
+        :param MaxKeys: The maximum number of objects in the page.
+        :return: The list_objects_v2 response.
+        """
+        objs = self.iter_objects(
+            Bucket,
+            Prefix,
+            ContinuationToken if ContinuationToken is not None else StartAfter,
+        )
+        return self.create_list_page(
+            list(islice(objs, MaxKeys + 1)), Bucket, Prefix, MaxKeys
+        )
+
+    def get_paginator(self, operation_name: str) -> StoragePaginator:
+        """
+        Get a paginator.
+
+        :param operation_name: The operation name. Only list_objects_v2 is supported.
+        :return: The paginator.
+        """
+        if operation_name != "list_objects_v2":
+            raise NotImplementedError(f"Unsupported paginator: {operation_name}")
+        return StoragePaginator(self)
+
+
+class LocalStorageBackend(StorageBackend):
+    """
+    A storage backend that stores objects as files in a local directory.
+
+    Buckets are subdirectories of the root directory
+    and keys are paths within the bucket directory.
+    Writes are atomic, so readers never see partially written objects.
+    ETags are derived from the file modification time and size,
+    so they change whenever an object is rewritten
+    without reading the file to list it.
+    """
+
+    def __init__(self, root_dir: str = STORAGE_LOCAL_DIR, use_mmap: bool = False):
+        """
+        :param root_dir: The root directory.
+        :param use_mmap: If True, objects are read using memory maps,
+            so streamed reads do not copy the whole file into memory.
+        """
+        self.root_dir = root_dir
+        self.use_mmap = use_mmap
+
+    def _get_path(self, bucket_name: str, key: str) -> str:
+        """
+        Get the file path for an object.
+
+        :param bucket_name: The bucket name.
+        :param key: The object key.
+        :return: The file path.
+        """
+        return os.path.join(self.root_dir, bucket_name, *key.split("/"))
+
+    @staticmethod
+    def _get_metadata(key: str, stat: os.stat_result) -> dict:
+        """
+        Get object metadata from the file status.
+
+        :param key: The object key.
+        :param stat: The file status.
+        :return: The object metadata dictionary.
+        """
+        return {
+            "Key": key,
+            "LastModified": datetime.fromtimestamp(stat.st_mtime, tz=timezone.utc),
+            "ETag": f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"',
+            "Size": stat.st_size,
+        }
+
+    def _iter_dir_objects(
+        self, dir_path: str, dir_key: str, prefix: str, start_after: Union[str, None]
+    ) -> Iterator[dict]:
+        """
+        List the objects in a directory lazily in key order.
+
+        Directory entries are visited in the order of their key prefixes,
+        i.e., with a trailing "/" for subdirectories,
+        so a depth-first walk lists the keys in lexicographic order.
+        Subdirectories whose keys all fall outside the listing are not walked.
+
+        :param dir_path: The directory path.
+        :param dir_key: The key prefix of the directory, ending with "/" unless empty.
+        :param prefix: The listing key prefix.
+        :param start_after: The key after which to start listing, if any.
+        :return: The iterator over object metadata dictionaries sorted by key.
+        """
+        try:
+            with os.scandir(dir_path) as it:
+                entries = [
+                    (dir_key + entry.name + ("/" if entry.is_dir() else ""), entry)
+                    for entry in it
+                ]
+        except FileNotFoundError:
+            return
+        entries.sort(key=lambda entry: entry[0])
+        for key, entry in entries:
+            if key.endswith("/"):
+                # Skip subdirectories with no keys with the prefix or after start_after.
+                if not (key.startswith(prefix) or prefix.startswith(key)):
+                    continue
+                if (
+                    start_after is not None
+                    and key < start_after
+                    and not start_after.startswith(key)
+                ):
+                    continue
+                yield from self._iter_dir_objects(entry.path, key, prefix, start_after)
+            # Skip temporary files of writes in progress.
+            elif (
+                key.startswith(prefix)
+                and (start_after is None or key > start_after)
+                and not entry.name.startswith(".tmp")
+            ):
+                try:
+                    yield self._get_metadata(key, entry.stat())
+                except FileNotFoundError:
+                    # The object was deleted after the directory was scanned.
+                    pass
+
+    def iter_objects(
+        self, bucket_name: str, prefix: str, start_after: Union[str, None] = None
+    ) -> Iterator[dict]:
+        return self._iter_dir_objects(
+            os.path.join(self.root_dir, bucket_name), "", prefix, start_after
+        )
+
+    def head_object(self, Bucket: str, Key: str) -> dict:
+        try:
+            stat = os.stat(self._get_path(Bucket, Key))
+        except FileNotFoundError as e:
+            raise _create_no_such_key_error("HeadObject", Key) from e
+        metadata = self._get_metadata(Key, stat)
+        return {
+            "ETag": metadata["ETag"],
+            "LastModified": metadata["LastModified"],
+            "ContentLength": metadata["Size"],
+        }
+
+    def get_object(self, Bucket: str, Key: str) -> dict:
+        try:
+            with open(self._get_path(Bucket, Key), "rb") as f:
+                stat = os.fstat(f.fileno())
+                # Empty files cannot be memory-mapped.
+                if self.use_mmap and stat.st_size > 0:
+                    data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                else:
+                    data = f.read()
+        except FileNotFoundError as e:
+            raise _create_no_such_key_error("GetObject", Key) from e
+        metadata = self._get_metadata(Key, stat)
+        return {
+            "Body": StorageBody(data),
+            "ETag": metadata["ETag"],
+            "LastModified": metadata["LastModified"],
+            "ContentLength": metadata["Size"],
+        }
+
+    def put_object(self, Bucket: str, Key: str, Body: Union[str, bytes]) -> dict:
+        path = self._get_path(Bucket, Key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write to a temporary file and rename it, so the write is atomic.
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(_to_bytes(Body))
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+        return {"ETag": self._get_metadata(Key, os.stat(path))["ETag"]}
+
+
+class MemoryStorageBackend(StorageBackend):
+    """
+    A storage backend that stores objects in memory.
+    The backend is thread-safe.
+    ETags are MD5 digests of the object data, as for S3 single part uploads.
+    """
+
+    def __init__(self):
+        # Map bucket names to dictionaries mapping keys to objects.
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def iter_objects(
+        self, bucket_name: str, prefix: str, start_after: Union[str, None] = None
+    ) -> Iterator[dict]:
+        # Sort the keys once per listing and get the object metadata lazily.
+        with self._lock:
+            bucket = self._buckets.get(bucket_name, {})
+            keys = sorted(
+                key
+                for key in bucket
+                if key.startswith(prefix) and (start_after is None or key > start_after)
+            )
+        for key in keys:
+            with self._lock:
+                obj = bucket[key]
+            yield {
+                "Key": key,
+                "LastModified": obj["LastModified"],
+                "ETag": obj["ETag"],
+                "Size": len(obj["Body"]),
+            }
+
+    def _get(self, operation_name: str, bucket_name: str, key: str) -> dict:
+        """
+        Get a stored object.
+
+        :param operation_name: The S3 operation name for errors.
+        :param bucket_name: The bucket name.
+        :param key: The object key.
+        :return: The stored object.
+        """
+        with self._lock:
+            obj = self._buckets.get(bucket_name, {}).get(key)
+        if obj is None:
+            raise _create_no_such_key_error(operation_name, key)
+        return obj
+
+    def head_object(self, Bucket: str, Key: str) -> dict:
+        obj = self._get("HeadObject", Bucket, Key)
+        return {
+            "ETag": obj["ETag"],
+            "LastModified": obj["LastModified"],
+            "ContentLength": len(obj["Body"]),
+        }
+
+    def get_object(self, Bucket: str, Key: str) -> dict:
+        obj = self._get("GetObject", Bucket, Key)
+        return {
+            "Body": StorageBody(obj["Body"]),
+            "ETag": obj["ETag"],
+            "LastModified": obj["LastModified"],
+            "ContentLength": len(obj["Body"]),
+        }
+
+    def put_object(self, Bucket: str, Key: str, Body: Union[str, bytes]) -> dict:
+        data = _to_bytes(Body)
+        obj = {
+            "Body": data,
+            "ETag": f'"{hashlib.md5(data).hexdigest()}"',
+            "LastModified": datetime.now(timezone.utc),
+        }
+        with self._lock:
+            self._buckets.setdefault(Bucket, {})[Key] = obj
+        return {"ETag": obj["ETag"]}
+
+
+# The process-wide memory backend,
+# so that producers and verifiers in a process share objects.
+_memory_storage_backend = MemoryStorageBackend()
+
+
+def create_storage_client_from_env() -> Union[boto3.client, StorageBackend]:
+    """
+    Create a storage client using the environment variables.
+
+    STORAGE_BACKEND selects the backend:
+    - "s3" (default): A boto3.client object.
+    - "local": A LocalStorageBackend object
+      with the root directory in STORAGE_LOCAL_DIR
+      and memory-mapped reads if STORAGE_LOCAL_MMAP is "true".
+    - "memory": The process-wide MemoryStorageBackend object.
+
+    :return: The boto3.client or StorageBackend object.
+    """
+    load_dotenv(verbose=True, override=True)
+    backend = os.getenv("STORAGE_BACKEND", "s3").lower()
+    if backend == "s3":
+        return create_s3_client_from_env()
+    if backend == "local":
+        return LocalStorageBackend(
+            os.getenv("STORAGE_LOCAL_DIR", STORAGE_LOCAL_DIR),
+            use_mmap=os.getenv("STORAGE_LOCAL_MMAP", "false").lower() == "true",
+        )
+    if backend == "memory":
+        return _memory_storage_backend
+    raise ValueError(f"Invalid STORAGE_BACKEND: {backend}")
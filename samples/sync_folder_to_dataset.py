@@ -0,0 +1,123 @@
+# # sync_folder_to_dataset
+
+"""This sample stamps the new objects in a storage folder.
+
+It diffs the folder against the dataset commitments
+and commits only the objects that have not been committed,
+which makes it safe to run repeatedly, e.g., from cron.
+A high-water mark saved in the state file
+limits each run to the keys written since the last run.
+
+Example:
+    python sync_folder_to_dataset.py --folder samples/signals --dataset signals
+"""
+
+
+# ## Imports
+
+import argparse
+import json
+from typing import List, Union
+from dotenv import load_dotenv
+
+from vbase import VBaseDataset
+from vbase.core.vbase_object import VBASE_OBJECT_TYPES
+
+from aws_utils import S3_MAX_WORKERS
+from local_commitment_service import (
+    create_local_indexing_service,
+    create_vbase_client_from_env,
+)
+from storage_utils import create_storage_client_from_env
+from sync_utils import sync_s3_folder_to_dataset
+from utils import RECORDS_BATCH_SIZE
+
+
+# ## Configuration
+
+# The default bucket for the samples.
+BUCKET_NAME = "vbase-test"
+
+# The record types whose records load from the object data,
+# e.g., integer records stored as decimal strings.
+# Private and bytes records cannot be loaded from plain object data.
+SYNC_RECORD_TYPES = [
+    "VBaseFloatObject",
+    "VBaseIntObject",
+    "VBaseJsonObject",
+    "VBasePortfolioObject",
+    "VBaseStringObject",
+]
+
+
+# ## Sync
+
+
+def parse_args(argv: Union[List[str], None] = None) -> argparse.Namespace:
+    """
+    Parse the command line arguments.
+
+    :param argv: The arguments. Defaults to sys.argv.
+    :return: The parsed arguments.
+    """
+    parser = argparse.ArgumentParser(description=__doc__.split("\n", 1)[0])
+    parser.add_argument("--bucket", default=BUCKET_NAME, help="bucket name")
+    parser.add_argument("--folder", required=True, help="folder to stamp")
+    parser.add_argument("--dataset", required=True, help="dataset name")
+    parser.add_argument(
+        "--record-type",
+        default="VBaseStringObject",
+        choices=SYNC_RECORD_TYPES,
+        help="dataset record type",
+    )
+    parser.add_argument(
+        "--state-file",
+        default=None,
+        help="high-water mark state file; defaults to <dataset>_sync_state.json",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=S3_MAX_WORKERS,
+        help="concurrent object downloads",
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=RECORDS_BATCH_SIZE,
+        help="objects committed per request",
+    )
+    args = parser.parse_args(argv)
+    if args.state_file is None:
+        args.state_file = f"{args.dataset}_sync_state.json"
+    return args
+
+
+def main(argv: Union[List[str], None] = None):
+    """
+    Stamp the new objects in the folder and print a summary.
+
+    :param argv: The arguments. Defaults to sys.argv.
+    """
+    args = parse_args(argv)
+    # Set VBASE_COMMITMENT_SERVICE_CLASS to LocalCommitmentService to run offline.
+    load_dotenv(verbose=False, override=True)
+    boto_client = create_storage_client_from_env()
+    vbc = create_vbase_client_from_env()
+    ds = VBaseDataset(vbc, args.dataset, VBASE_OBJECT_TYPES[args.record_type])
+    summary = sync_s3_folder_to_dataset(
+        ds,
+        boto_client,
+        args.bucket,
+        args.folder,
+        state_file_name=args.state_file,
+        max_workers=args.workers,
+        batch_size=args.batch_size,
+        # Offline runs index the local commitments.
+        indexing_service=create_local_indexing_service(vbc),
+    )
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+"""
+Folder sync utilities
+
+Stamps the objects that land in an object storage folder
+by committing those that are missing from a dataset.
+"""
+
+from collections import Counter, deque
+from typing import Union
+import boto3
+
+from vbase import IndexingService, VBaseDataset
+
+from aws_utils import S3_MAX_WORKERS, fetch_s3_objects, iter_s3_objects
+from utils import (
+    RECORDS_BATCH_SIZE,
+    add_records_in_batches,
+    load_verification_state,
+    save_verification_state,
+)
+
+
+# Sync jobs take the dataset, storage location and job options.
+# pylint: disable-next=too-many-arguments,too-many-positional-arguments,too-many-locals
+def sync_s3_folder_to_dataset(
+    ds: VBaseDataset,
+    boto_client: boto3.client,
+    bucket_name: str,
+    folder_name: str,
+    state_file_name: Union[str, None] = None,
+    max_workers: int = S3_MAX_WORKERS,
+    batch_size: int = RECORDS_BATCH_SIZE,
+    progress_interval: Union[int, None] = 1000,
+    indexing_service: Union[IndexingService, None] = None,
+) -> dict:
+    """
+    Stamp the objects in a folder that have not yet been committed to a dataset.
+
+    The dataset commitments are fetched once and counted by CID.
+    Objects are listed lazily and downloaded concurrently in key order,
+    and objects whose CIDs have not been committed
+    are committed in order using batch commitments.
+    The last processed key is saved as a high-water mark after each batch,
+    so the next run lists only the keys after it.
+    Objects must be written with increasing keys, e.g., timestamped keys,
+    for the high-water mark to cover all new objects.
+    Delete the state file to diff the whole folder again.
+    An interrupted run is safe to rerun:
+    objects committed after the last saved high-water mark
+    are found among the dataset commitments and are not committed again.
+    The high-water mark also records the number of dataset commitments,
+    so the job should be the only producer committing to the dataset.
+
+    :param ds: The writable vBaseDataset object.
+    :param boto_client: The boto3.client object.
+    :param bucket_name: The bucket name.
+    :param folder_name: The folder name within the bucket.
+    :param state_file_name: The high-water mark state file name, if any.
+        If None, the whole folder is diffed.
+    :param max_workers: The maximum number of concurrent downloads.
+    :param batch_size: The maximum number of records per batch.
+    :param progress_interval: The number of objects between progress reports.
+        If None, progress is not reported.
+    :param indexing_service: The indexing service for the dataset commitments.
+        Defaults to the dataset's indexing service
+        or the one for its commitment service.
+    :return: A summary with the numbers of listed and stamped objects
+        and the high-water mark key.
+    """
+    if indexing_service is not None:
+        ds.indexing_service = indexing_service
+    state = None
+    if state_file_name is not None:
+        state = load_verification_state(state_file_name)
+    location = {
+        "bucket_name": bucket_name,
+        "folder_name": folder_name,
+        "name": ds.name,
+        "owner": ds.owner,
+    }
+    if state is not None and any(state[k] != v for k, v in location.items()):
+        raise ValueError(
+            f"Sync state {state_file_name} is for another folder or dataset: "
+            f"bucket_name = {state['bucket_name']}, "
+            f"folder_name = {state['folder_name']}, "
+            f"name = {state['name']}, owner = {state['owner']}"
+        )
+    start_after = None if state is None else state["last_key"]
+
+    # Commitments made before the high-water mark was saved
+    # belong to the objects up to it, so only later commitments are matched.
+    receipts = ds.get_commitment_receipts()
+    n_covered = 0 if state is None else state["n_commitments"]
+    committed_cids = Counter(
+        receipt["objectCid"].lower() for receipt in receipts[n_covered:]
+    )
+
+    def save_state(last_key: Union[str, None], n_stamped: int):
+        if state_file_name is not None and last_key is not None:
+            save_verification_state(
+                state_file_name,
+                {
+                    **location,
+                    "last_key": last_key,
+                    "n_commitments": len(receipts) + n_stamped,
+                },
+            )
+
+    # Track the keys of the listed objects,
+    # which are downloaded and yielded in listing order.
+    listed_keys = deque()
+
+    def iter_listed_objects():
+        for s3_obj in iter_s3_objects(
+            boto_client, bucket_name, folder_name, start_after=start_after
+        ):
+            listed_keys.append(s3_obj["Key"])
+            yield s3_obj
+
+    n_listed = 0
+    n_stamped = 0
+    l_missing = []
+    # The high-water mark is the last key with all objects up to it committed.
+    last_key = start_after
+    listed_key = None
+    for response in fetch_s3_objects(
+        boto_client,
+        bucket_name,
+        iter_listed_objects(),
+        max_workers=max_workers,
+        progress_interval=progress_interval,
+    ):
+        listed_key = listed_keys.popleft()
+        n_listed += 1
+        # Parse the object data as the record type loads its serialized data,
+        # e.g., integer records are stored as decimal strings.
+        record = ds.record_type(init_dict={"data": response["Body"].decode("utf-8")})
+        cid = record.get_cid().lower()
+        if committed_cids[cid] > 0:
+            committed_cids[cid] -= 1
+        else:
+            l_missing.append(record.data)
+        # Later objects keep downloading while a batch is committed.
+        if len(l_missing) >= batch_size:
+            add_records_in_batches(ds, l_missing, batch_size)
+            n_stamped += len(l_missing)
+            l_missing = []
+            last_key = listed_key
+            save_state(last_key, n_stamped)
+        elif len(l_missing) == 0:
+            last_key = listed_key
+    if len(l_missing) > 0:
+        add_records_in_batches(ds, l_missing, batch_size)
+        n_stamped += len(l_missing)
+        last_key = listed_key
+    save_state(last_key, n_stamped)
+
+    return {"n_listed": n_listed, "n_stamped": n_stamped, "last_key": last_key}
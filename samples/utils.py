@@ -2,7 +2,21 @@
 Common utilities
 """
 
+import hashlib
+import json
 import os
+import tempfile
+from collections import Counter, defaultdict, deque
+from typing import List, Tuple, Union
+
+from vbase import IndexingService, VBaseDataset
+from vbase.core.web3_commitment_service import Web3CommitmentService
+from vbase.utils.crypto_utils import add_int_uint256
+
+# The maximum number of records committed in a single batch request.
+# Larger batches amortize request and transaction overheads
+# but must fit within the forwarder request and block gas limits.
+RECORDS_BATCH_SIZE = 100
 
 
 def get_env_var_or_fail(env_var_name: str) -> str:
@@ -16,3 +30,374 @@ def get_env_var_or_fail(env_var_name: str) -> str:
     if env_var is None:
         raise Exception(f"{env_var_name} environment variable is not set.")
     return env_var
+
+
+def create_test_private_key(seed: int, i_user: int) -> str:
+    """
+    Create a deterministic private key for a test user.
+    Test keys must never hold funds or sign real commitments.
+
+    :param seed: The account seed.
+    :param i_user: The user index.
+    :return: The private key.
+    """
+    return "0x" + hashlib.sha3_256(f"test_user_{seed}_{i_user}".encode()).hexdigest()
+
+
+def load_verification_state(state_file_name: str) -> Union[dict, None]:
+    """
+    Load the dataset verification checkpoint.
+
+    :param state_file_name: The state file name.
+    :return: The checkpoint dictionary or None if no checkpoint exists.
+    """
+    if not os.path.exists(state_file_name):
+        return None
+    with open(state_file_name, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_verification_state(state_file_name: str, state: dict):
+    """
+    Save the dataset verification checkpoint.
+    The file is replaced atomically, so an interrupted run keeps the last checkpoint.
+
+    :param state_file_name: The state file name.
+    :param state: The checkpoint dictionary.
+    """
+    state_dir = os.path.dirname(os.path.abspath(state_file_name))
+    fd, tmp_file_name = tempfile.mkstemp(dir=state_dir, suffix=".tmp")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        json.dump(state, f, indent=2)
+    os.replace(tmp_file_name, state_file_name)
+
+
+def _get_record_receipts(
+    ds: VBaseDataset, l_cids: List[str]
+) -> List[Union[dict, None]]:
+    """
+    Find the commitment receipts for dataset records with a single index query.
+    Receipts are matched using a CID index rather than a scan per record.
+    Records with identical CIDs are paired with their receipts in order.
+    CIDs are matched in lowercase, since indexers may return them in either case.
+
+    :param ds: The vBaseDataset object with loaded records.
+    :param l_cids: The record CIDs.
+    :return: The receipt for each record or None if no receipt was found.
+    """
+    ds.cid = ds.get_set_cid_for_dataset(ds.name)
+    if ds.indexing_service is None:
+        ds.indexing_service = IndexingService.create_instance_from_commitment_service(
+            ds.vbc.commitment_service
+        )
+    receipts = ds.indexing_service.find_user_set_objects(user=ds.owner, set_cid=ds.cid)
+    cid_receipts = defaultdict(deque)
+    for receipt in receipts:
+        cid_receipts[receipt["objectCid"].lower()].append(receipt)
+    l_receipts = []
+    for cid in l_cids:
+        receipts = cid_receipts.get(cid.lower())
+        l_receipts.append(receipts.popleft() if receipts else None)
+    return l_receipts
+
+
+def _verify_records(
+    ds: VBaseDataset,
+    l_cids: List[str],
+    l_receipts: List[Union[dict, None]],
+    n_verified: int,
+    verify_objects: bool,
+) -> Tuple[bool, List[str]]:
+    """
+    Restore timestamps for all records from their receipts
+    and check that the records after the verified records have receipts.
+
+    :param ds: The vBaseDataset object with loaded records.
+    :param l_cids: The record CIDs.
+    :param l_receipts: The record receipts.
+    :param n_verified: The number of verified records.
+    :param verify_objects: If True, also verify the commitment of each record
+        after the verified records with a chain call per record.
+    :return: A tuple containing success and log.
+    """
+    success = True
+    l_log = []
+    if len(ds.timestamps) != len(ds.records):
+        ds.timestamps = [None] * len(ds.records)
+    for i in range(len(ds.records)):
+        if l_receipts[i] is None:
+            l_log.append(
+                "Invalid record: "
+                "Failed to find timestamp for object: "
+                f"owner = {ds.owner}, "
+                f"set_cid = {ds.cid}, "
+                f"object_cid = {l_cids[i]}"
+            )
+            success = False
+            continue
+        ds.timestamps[i] = l_receipts[i]["timestamp"]
+
+        # Verify the record commitment unless it has been verified.
+        if (
+            verify_objects
+            and i >= n_verified
+            and not ds.vbc.verify_user_object(ds.owner, l_cids[i], ds.timestamps[i])
+        ):
+            l_log.append(
+                "Invalid record: "
+                "Failed object verification: "
+                f"owner = {ds.owner}, "
+                f"timestamp = {ds.timestamps[i]}, "
+                f"object_cid = {l_cids[i]}"
+            )
+            success = False
+
+    return success, l_log
+
+
+def _verify_object_set(ds: VBaseDataset, l_cids: List[str]) -> Tuple[bool, List[str]]:
+    """
+    Verify that the records comprise the complete dataset
+    with a single object set commitment check.
+
+    :param ds: The vBaseDataset object with loaded records.
+    :param l_cids: The record CIDs.
+    :return: A tuple containing success and log.
+    """
+    object_cid_sum = 0
+    for cid in l_cids:
+        object_cid_sum = add_int_uint256(object_cid_sum, cid)
+    str_object_cid_sum = str(hex(object_cid_sum))
+    if not ds.vbc.verify_user_set_objects(ds.owner, ds.cid, str_object_cid_sum):
+        return False, [
+            "Invalid records: "
+            "Failed object set verification: "
+            f"owner = {ds.owner}, "
+            f"set_cid = {ds.cid}, "
+            f"str_object_cid_sum = {str_object_cid_sum}"
+        ]
+    return True, []
+
+
+def verify_and_collect(
+    ds: VBaseDataset,
+    verify_objects: bool = True,
+) -> Tuple[bool, List[str], List[Union[dict, None]]]:
+    """
+    Restore timestamps for and verify all dataset records
+    and collect their commitment receipts.
+
+    This fuses try_restore_timestamps_from_index(), verify_commitments()
+    and get_commitment_receipts(), which query the index separately,
+    using a single index query for the whole dataset.
+    Each record is verified by matching its CID to a receipt from that query,
+    and the records are verified against the chain
+    with a single object set commitment check,
+    which fails unless the records are exactly the committed set objects.
+    The set check does not prove when each record was committed,
+    so, as verify_commitments() does, each record timestamp reported by the index
+    is also verified with a chain call per record unless verify_objects is False.
+
+    :param ds: The vBaseDataset object with loaded records.
+    :param verify_objects: If True, verify each record commitment and timestamp
+        with a chain call per record.
+        If False, the record timestamps are those reported by the index
+        and are not verified.
+    :return: A tuple containing success, log and receipts:
+        - success: True if all records have been found in the index
+            and their commitments verified; False otherwise.
+        - l_log: A list log of verification explaining any failures.
+        - l_receipts: The commitment receipt for each record,
+            or None if no receipt was found.
+    """
+    l_cids = [record.get_cid() for record in ds.records]
+    l_receipts = _get_record_receipts(ds, l_cids)
+    success, l_log = _verify_records(ds, l_cids, l_receipts, 0, verify_objects)
+    set_success, set_log = _verify_object_set(ds, l_cids)
+    return success and set_success, l_log + set_log, l_receipts
+
+
+def _get_prefix_digest_entry(cid: str, receipt: Union[dict, None]) -> bytes:
+    """
+    Get the verified prefix digest entry for a record CID and commitment timestamp.
+    Timestamps are hashed as chain timestamps,
+    since indexers may format them differently.
+
+    :param cid: The record CID.
+    :param receipt: The record receipt or None if no receipt was found.
+    :return: The digest entry.
+    """
+    timestamp = (
+        None
+        if receipt is None
+        else Web3CommitmentService.convert_timestamp_str_to_chain(receipt["timestamp"])
+    )
+    return f"{cid.lower()}:{timestamp};".encode("utf-8")
+
+
+def verify_dataset_with_checkpoint(
+    ds: VBaseDataset,
+    state_file_name: str,
+    record_keys: Union[List[str], None] = None,
+    verify_objects: bool = True,
+) -> Tuple[bool, List[str], List[Union[dict, None]]]:
+    """
+    Verify dataset records incrementally using a checkpoint.
+
+    The checkpoint stores the number of verified records,
+    the last verified record key, CID and timestamp,
+    and a digest of the CIDs and timestamps of all verified records.
+    Each run checks that the verified records and their receipt timestamps
+    still hash to the same digest, which is a local computation,
+    and then verifies only the records added since the checkpoint.
+    The completeness of the whole dataset is verified
+    with a single object set commitment check.
+    The checkpoint is updated only if all checks succeed.
+
+    Records must be loaded in a stable order, e.g., by S3 key,
+    and new records must be appended after the verified records.
+    Receipts for all records are collected with a single index query,
+    and the timestamps of all records are restored from the receipts,
+    so the verified records get their commitment timestamps
+    without being verified on chain again.
+
+    :param ds: The vBaseDataset object with loaded records.
+    :param state_file_name: The checkpoint state file name.
+    :param record_keys: The record keys, e.g., S3 object keys, if any.
+        Defaults to record indices.
+    :param verify_objects: If True, verify the commitment and timestamp
+        of each record added since the checkpoint with a chain call per record.
+        See verify_and_collect().
+    :return: A tuple containing success, log and receipts:
+        - success: True if all checks succeeded; False otherwise.
+        - l_log: A list log of verification explaining any failures.
+        - l_receipts: The commitment receipt for each record,
+            or None if no receipt was found.
+            Empty if the records failed the checkpoint checks.
+    """
+    if record_keys is None:
+        record_keys = [str(i) for i in range(len(ds.records))]
+    if len(record_keys) != len(ds.records):
+        return (
+            False,
+            [
+                "Invalid records: "
+                "Record keys do not match records: "
+                f"n_keys = {len(record_keys)}, n_records = {len(ds.records)}"
+            ],
+            [],
+        )
+
+    state = load_verification_state(state_file_name)
+    if state is not None and (state["name"] != ds.name or state["owner"] != ds.owner):
+        raise ValueError(
+            f"Checkpoint {state_file_name} is for another dataset: "
+            f"name = {state['name']}, owner = {state['owner']}"
+        )
+    n_verified = 0 if state is None else state["n_records"]
+
+    l_cids = [record.get_cid() for record in ds.records]
+    l_receipts = _get_record_receipts(ds, l_cids)
+
+    # Check the verified prefix.
+    # The digest covers the verified timestamps,
+    # so receipts served from an index or cache cannot change them.
+    prefix_hash = hashlib.sha3_256()
+    for cid, receipt in zip(l_cids[:n_verified], l_receipts[:n_verified]):
+        prefix_hash.update(_get_prefix_digest_entry(cid, receipt))
+    if n_verified > 0 and (
+        len(l_cids) < n_verified
+        or prefix_hash.hexdigest() != state["prefix_digest"]
+        or record_keys[n_verified - 1] != state["last_key"]
+        or l_cids[n_verified - 1] != state["last_cid"]
+    ):
+        return (
+            False,
+            [
+                "Invalid records: "
+                "Verified records or timestamps changed since the checkpoint: "
+                f"n_records = {n_verified}, "
+                f"last_key = {state['last_key']}, "
+                f"last_cid = {state['last_cid']}"
+            ],
+            [],
+        )
+
+    success, l_log = _verify_records(ds, l_cids, l_receipts, n_verified, verify_objects)
+    set_success, set_log = _verify_object_set(ds, l_cids)
+    success = success and set_success
+    l_log.extend(set_log)
+
+    if success and len(ds.records) > n_verified:
+        for cid, receipt in zip(l_cids[n_verified:], l_receipts[n_verified:]):
+            prefix_hash.update(_get_prefix_digest_entry(cid, receipt))
+        save_verification_state(
+            state_file_name,
+            {
+                "name": ds.name,
+                "owner": ds.owner,
+                "n_records": len(ds.records),
+                "last_key": record_keys[-1],
+                "last_cid": l_cids[-1],
+                "last_timestamp": ds.timestamps[-1],
+                "prefix_digest": prefix_hash.hexdigest(),
+            },
+        )
+    return success, l_log, l_receipts
+
+
+def add_records_in_batches(
+    ds: VBaseDataset,
+    l_record_data: List[any],
+    batch_size: int = RECORDS_BATCH_SIZE,
+) -> List[dict]:
+    """
+    Add records to a dataset using batch commitments.
+    Each batch of records is committed in a single request and transaction
+    instead of a request per record.
+    Records are added in order, and the receipts are the same per-record receipts
+    returned by add_record(), so get_commitment_receipts()
+    and verify_commitments() handle batched records as any other records.
+
+    :param ds: The vBaseDataset object.
+    :param l_record_data: The list of records' data.
+    :param batch_size: The maximum number of records per batch.
+    :return: The commitment receipts for the records.
+    """
+    receipts = []
+    for i in range(0, len(l_record_data), batch_size):
+        receipts.extend(ds.add_records_batch(l_record_data[i : i + batch_size]))
+    return receipts
+
+
+def add_records_idempotent(
+    ds: VBaseDataset,
+    l_record_data: List[any],
+    batch_size: int = RECORDS_BATCH_SIZE,
+) -> List[dict]:
+    """
+    Add the records that have not yet been committed to a dataset.
+
+    The dataset commitments are fetched once and counted by CID,
+    so checking each record is a hash lookup rather than a receipt scan.
+    A record with a CID committed k times is considered committed
+    for its first k occurrences, so identical records are not dropped.
+    The missing records are added in order using batch commitments.
+    Rerunning the function with the same records adds nothing.
+
+    :param ds: The vBaseDataset object.
+    :param l_record_data: The list of records' data.
+    :param batch_size: The maximum number of records per batch.
+    :return: The commitment receipts for the added records.
+    """
+    committed_cids = Counter(
+        receipt["objectCid"].lower() for receipt in ds.get_commitment_receipts()
+    )
+    l_missing = []
+    for record_data in l_record_data:
+        cid = ds.record_type(record_data).get_cid().lower()
+        if committed_cids[cid] > 0:
+            committed_cids[cid] -= 1
+        else:
+            l_missing.append(record_data)
+    return add_records_in_batches(ds, l_missing, batch_size)
@@ -16,10 +16,13 @@ from vbase import (
 )
 
 from aws_utils import (
-    create_s3_client_from_env,
-    read_s3_object,
-    init_vbase_dataset_from_long_csv,
+    init_vbase_dataset_from_long_parquet,
+    init_vbase_dataset_from_s3_long_csv,
+    read_s3_object_bytes,
 )
+from receipt_cache_utils import ReceiptCache, init_cached_indexing_service
+from storage_utils import create_storage_client_from_env
+from utils import verify_and_collect, verify_dataset_with_checkpoint
 
 
 # ## Configuration
@@ -35,18 +38,31 @@ BUCKET_NAME = "vbase-test"
 FOLDER_NAME = "samples/portfolio_history/"
 STRATEGY_FOLDER_NAME = FOLDER_NAME + STRATEGY_NAME
 
+# The long portfolio history format: "csv" or "parquet".
+# Both formats rebuild identical portfolio records.
+LONG_HISTORY_FORMAT = "csv"
+
+# The verification checkpoint file, if any.
+# If specified, each run verifies only the records added since the last run
+# and checks that the previously verified records are unchanged.
+VERIFICATION_STATE_FILE_NAME = None
+
 
 # ## Setup
 
 # Load the information necessary to call vBase APIs.
 assert load_dotenv(verbose=True, override=True)
 
-# Connect to AWS.
-boto_client = create_s3_client_from_env()
+# Connect to the object storage, S3 by default.
+# Set STORAGE_BACKEND to run against a local directory or memory.
+boto_client = create_storage_client_from_env()
 
 # Connect to vBase.
 vbc = VBaseClient.create_instance_from_env()
 
+# Cache commitment receipts locally so that reruns are served from local disk.
+receipt_cache = ReceiptCache()
+
 # Initialize the strategy dataset object.
 ds_strategy = VBaseDataset(
     vbc,
@@ -73,26 +89,47 @@ if "ipykernel" not in sys.modules and "IPython" in sys.modules:
 
 # ## Validate the Portfolio History
 
-# Load the long portfolio history CSV.
-csv_ports_long = read_s3_object(
-    boto_client,
-    BUCKET_NAME,
-    STRATEGY_FOLDER_NAME,
-    "portfolio_long.csv",
-)
-print("Strategy long CSV:\n", csv_ports_long)
-
-# Load the portfolio records.
-ds_strategy = init_vbase_dataset_from_long_csv(ds_strategy, csv_ports_long)
-
-# Restore timestamps using the blockchain stamps.
-assert ds_strategy.try_restore_timestamps_from_index()
-
-# Verify the portfolio records.
-assert ds_strategy.verify_commitments()
+if LONG_HISTORY_FORMAT == "parquet":
+    # Load the portfolio records from the long portfolio history Parquet file.
+    ds_strategy = init_vbase_dataset_from_long_parquet(
+        ds_strategy,
+        read_s3_object_bytes(
+            boto_client, BUCKET_NAME, STRATEGY_FOLDER_NAME, "portfolio_long.parquet"
+        ),
+    )
+else:
+    # Load the portfolio records from the long portfolio history CSV.
+    # The CSV is streamed in chunks and split into portfolios at timestamp boundaries,
+    # so the whole history is never held in memory as a single string.
+    ds_strategy = init_vbase_dataset_from_s3_long_csv(
+        ds_strategy,
+        boto_client,
+        BUCKET_NAME,
+        STRATEGY_FOLDER_NAME,
+        "portfolio_long.csv",
+    )
+print(f"Loaded {len(ds_strategy.records)} portfolio records.")
+
+# Serve the commitment receipts from the local receipt cache.
+# The cache is not authenticated, so the verification below
+# checks each record timestamp on chain or against the checkpoint.
+ds_strategy = init_cached_indexing_service(ds_strategy, receipt_cache)
+
+if VERIFICATION_STATE_FILE_NAME is None:
+    # Restore timestamps using the blockchain stamps,
+    # verify the records and collect their receipts
+    # using a single index query.
+    success, l_log, l_receipts = verify_and_collect(ds_strategy)
+    assert success, l_log
+else:
+    # Verify only the portfolio records added since the last checkpoint.
+    # Each record is identified by its long CSV timestamp.
+    success, l_log, l_receipts = verify_dataset_with_checkpoint(
+        ds_strategy, VERIFICATION_STATE_FILE_NAME, list(ds_strategy.timestamps)
+    )
+    assert success, l_log
 
 # Build and display the verified portfolio records.
-l_receipts = ds_strategy.get_commitment_receipts()
 html = (
     "<table>"
     + "<tr><th>num</th><th>portfolio</th><th>portfolio_hash</th><th>tx</th></tr>"
@@ -20,9 +20,12 @@ from vbase import (
 )
 
 from aws_utils import (
-    create_s3_client_from_env,
+    S3ObjectCache,
     init_vbase_dataset_from_s3_objects,
 )
+from receipt_cache_utils import ReceiptCache, init_cached_indexing_service
+from storage_utils import create_storage_client_from_env
+from utils import verify_and_collect, verify_dataset_with_checkpoint
 
 
 # ## Configuration
@@ -38,18 +41,30 @@ BUCKET_NAME = "vbase-test"
 FOLDER_NAME = "samples/portfolio_history/"
 STRATEGY_FOLDER_NAME = FOLDER_NAME + STRATEGY_NAME
 
+# The verification checkpoint file, if any.
+# If specified, each run verifies only the records added since the last run
+# and checks that the previously verified records are unchanged.
+VERIFICATION_STATE_FILE_NAME = None
+
 
 # ## Setup
 
 # Load the information necessary to call vBase APIs.
 assert load_dotenv(verbose=True, override=True)
 
-# Connect to AWS.
-boto_client = create_s3_client_from_env()
+# Connect to the object storage, S3 by default.
+# Set STORAGE_BACKEND to run against a local directory or memory.
+boto_client = create_storage_client_from_env()
+
+# Cache downloaded objects locally so that reruns only download new or changed objects.
+s3_cache = S3ObjectCache()
 
 # Connect to vBase.
 vbc = VBaseClient.create_instance_from_env()
 
+# Cache commitment receipts locally so that reruns are served from local disk.
+receipt_cache = ReceiptCache()
+
 # Initialize the strategy dataset object.
 ds_strategy = VBaseDataset(
     vbc,
@@ -77,18 +92,37 @@ if "ipykernel" not in sys.modules and "IPython" in sys.modules:
 # ## Validate the Portfolio History
 
 # Load the portfolio records.
+# Keep the object keys from the same listing to identify the records.
+l_keys = []
 ds_strategy = init_vbase_dataset_from_s3_objects(
-    ds_strategy, boto_client, BUCKET_NAME, STRATEGY_FOLDER_NAME
+    ds_strategy,
+    boto_client,
+    BUCKET_NAME,
+    STRATEGY_FOLDER_NAME,
+    cache=s3_cache,
+    record_keys=l_keys,
 )
 
-# Restore timestamps using the blockchain stamps.
-assert ds_strategy.try_restore_timestamps_from_index()
-
-# Verify the portfolio records.
-assert ds_strategy.verify_commitments()
+# Serve the commitment receipts from the local receipt cache.
+# The cache is not authenticated, so the verification below
+# checks each record timestamp on chain or against the checkpoint.
+ds_strategy = init_cached_indexing_service(ds_strategy, receipt_cache)
+
+if VERIFICATION_STATE_FILE_NAME is None:
+    # Restore timestamps using the blockchain stamps,
+    # verify the records and collect their receipts
+    # using a single index query.
+    success, l_log, l_receipts = verify_and_collect(ds_strategy)
+    assert success, l_log
+else:
+    # Verify only the portfolio records added since the last checkpoint.
+    # Records are loaded in S3 key order, so the keys identify the records.
+    success, l_log, l_receipts = verify_dataset_with_checkpoint(
+        ds_strategy, VERIFICATION_STATE_FILE_NAME, l_keys
+    )
+    assert success, l_log
 
 # Build and display the verified portfolio records.
-l_receipts = ds_strategy.get_commitment_receipts()
 html = "<table>"
 html += "<tr><th>num</th><th>portfolio</th><th>portfolio_hash</th><th>tx</th></tr>"
 # Populate the table with data.